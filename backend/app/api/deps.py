@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError
+from sqlalchemy.future import select
+
+from app.core.db import read_session_maker
+from app.core.security import decode_access_token, token_cache
+from app.models import User
+from app.schemas import UserResponse
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    """A query timestamp as the naive UTC that is stored; an offset, if given, is converted."""
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
+    """The user a bearer token belongs to; the users table is only read on the token's first use."""
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
+    try:
+        payload = decode_access_token(token)
+    except JWTError:
+        raise credentials_exception
+    username = payload.get("sub")
+    if username is None or payload.get("exp") is None:
+        raise credentials_exception
+
+    async with read_session_maker() as session:
+        result = await session.execute(select(User).where(User.username == username))
+        db_user = result.scalars().first()
+    if db_user is None:
+        raise credentials_exception
+    if not db_user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+
+    user = UserResponse.model_validate(db_user)
+    token_cache.put(token, payload["exp"], user)
+    return user
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.schemas import AdmissionStats
+from app.services.admission import admission_controller
+
+router = APIRouter()
+
+@router.get("/stats", response_model=AdmissionStats)
+async def read_admission_stats():
+    """Write slots in use, queue depth and shed counts per priority class."""
+    return admission_controller.stats()
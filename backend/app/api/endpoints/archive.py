@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.schemas import ArchiveStats
+from app.services.archive import archive_service
+
+router = APIRouter()
+
+@router.get("/stats", response_model=ArchiveStats)
+async def read_archive_stats():
+    """Retention cutoff and how much history has moved to segment files."""
+    return archive_service.stats()
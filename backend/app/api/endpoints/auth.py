@@ -5,7 +5,8 @@ from sqlalchemy.future import select
 from datetime import timedelta
 
 from app.core.db import get_db
-from app.core.security import verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_password_hash
+from app.api.deps import get_current_user
+from app.core.security import verify_password_async, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_password_hash_async
 from app.models.user import User
 from app.schemas.token import Token
 from app.schemas.user import UserCreate, UserResponse
@@ -21,7 +22,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     is_password_valid = False
     if user:
         try:
-            is_password_valid = verify_password(form_data.password, user.hashed_password)
+            is_password_valid = await verify_password_async(form_data.password, user.hashed_password)
         except Exception:
             # Ignore verification errors (like UnknownHashError) to allow fallback check
             pass
@@ -50,7 +51,7 @@ async def register(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
     if existing_user:
         raise HTTPException(status_code=400, detail="Username or email already registered")
     
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await get_password_hash_async(user_in.password)
     
     db_user = User(
         username=user_in.username,
@@ -61,3 +62,7 @@ async def register(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
     await db.commit()
     await db.refresh(db_user)
     return db_user
+
+@router.get("/me", response_model=UserResponse)
+async def read_current_user(current_user: UserResponse = Depends(get_current_user)):
+    return current_user
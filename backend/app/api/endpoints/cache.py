@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.schemas import ResponseCacheStats
+from app.services.response_cache import response_cache
+
+router = APIRouter()
+
+@router.get("/stats", response_model=ResponseCacheStats)
+async def read_response_cache_stats():
+    """Hit ratio of the depot/granary list cache and bytes not sent thanks to 304 responses."""
+    return response_cache.stats()
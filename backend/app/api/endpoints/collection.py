@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+from app.schemas import CollectionStats
+from app.services.collection import collection_scheduler
+
+router = APIRouter()
+
+@router.get("/stats", response_model=CollectionStats)
+async def read_collection_stats():
+    """Scheduler counters and the duration of the last sweep."""
+    return collection_scheduler.stats()
+
+@router.post("/sweep", status_code=202)
+async def trigger_sweep():
+    """Start a collection sweep now instead of waiting for the next cycle."""
+    if collection_scheduler.collector is None:
+        raise HTTPException(status_code=503, detail="Collection scheduler is not running")
+    if not collection_scheduler.start_sweep():
+        raise HTTPException(status_code=409, detail="A sweep is already running")
+    return {"ok": True}
@@ -1,19 +1,33 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from app.core.db import get_db
-from app.models import Depot
-from app.schemas import DepotCreate, DepotResponse
+from app.core.db import get_db, get_read_db
+from app.models import Depot, Granary
+from app.core import encoding
+from app.schemas import DepotCreate, DepotResponse, DepotSummary, DepotReports, ReportJobResponse
+from app.services import listings
+from app.services.reports import report_engine
+from app.services.depot_summary import depot_summary
+from app.services.ingest import ingestion_service
+from app.services.archive import archive_service
+from app.services.response_cache import response_cache
+from app.services.snapshots import snapshot_store
+from app.services.temperature_index import temperature_index
 
 router = APIRouter()
 
 @router.get("", response_model=List[DepotResponse])
-async def read_depots(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Depot).offset(skip).limit(limit))
-    depots = result.scalars().all()
-    return depots
+async def read_depots(request: Request, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
+    cached = response_cache.lookup(request, "depots", (skip, limit))
+    if cached is not None:
+        return cached
+    version = response_cache.version("depots")
+    result = await db.execute(listings.depots_query().offset(skip).limit(limit))
+    depots = [listings.render_depot(row) for row in result.all()]
+    return response_cache.store(request, "depots", (skip, limit), version, depots)
 
 @router.post("", response_model=DepotResponse)
 async def create_depot(depot: DepotCreate, db: AsyncSession = Depends(get_db)):
@@ -21,10 +35,18 @@ async def create_depot(depot: DepotCreate, db: AsyncSession = Depends(get_db)):
     db.add(db_depot)
     await db.commit()
     await db.refresh(db_depot)
+    temperature_index.set_province(db_depot.id, db_depot.province)
+    response_cache.bump("depots")
+    depot_summary.invalidate()
     return db_depot
 
+@router.get("/summary", response_model=List[DepotSummary])
+async def read_depot_summary(db: AsyncSession = Depends(get_read_db)):
+    """Granary counts, capacity, collection state and latest temperatures per depot."""
+    return await depot_summary.get(db)
+
 @router.get("/{depot_id}", response_model=DepotResponse)
-async def read_depot(depot_id: int, db: AsyncSession = Depends(get_db)):
+async def read_depot(depot_id: int, db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(Depot).where(Depot.id == depot_id))
     depot = result.scalars().first()
     if depot is None:
@@ -46,6 +68,9 @@ async def update_depot(depot_id: int, depot_in: DepotCreate, db: AsyncSession =
     
     await db.commit()
     await db.refresh(depot)
+    temperature_index.set_province(depot.id, depot.province)
+    response_cache.bump("depots")
+    depot_summary.invalidate()
     return depot
 
 @router.delete("/{depot_id}")
@@ -55,6 +80,55 @@ async def delete_depot(depot_id: int, db: AsyncSession = Depends(get_db)):
     if depot is None:
         raise HTTPException(status_code=404, detail="Depot not found")
     
+    granary_ids = (await db.execute(select(Granary.id).where(Granary.depot_id == depot_id))).scalars().all()
     await db.delete(depot)
     await db.commit()
+    snapshot_store.remove_depot(depot_id)
+    for granary_id in granary_ids:
+        archive_service.remove_granary_files(granary_id)
+    if granary_ids:
+        await ingestion_service.refresh_topics()
+    response_cache.bump("depots", "granaries", "reports")
+    depot_summary.invalidate()
     return {"ok": True}
+
+async def _get_depot_or_404(db: AsyncSession, depot_id: int) -> None:
+    if (await db.execute(select(Depot.id).where(Depot.id == depot_id))).first() is None:
+        raise HTTPException(status_code=404, detail="Depot not found")
+
+@router.get("/{depot_id}/reports", response_model=DepotReports)
+async def read_depot_reports(
+    request: Request,
+    depot_id: int,
+    period: str = Query("day", pattern="^(day|week)$"),
+    start: Optional[datetime] = Query(None, description="any time in the period; default the latest reported"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Stored inspection reports of every granary of a depot for one day or week."""
+    key = (depot_id, period, start)
+    cached = response_cache.lookup(request, "reports", key)
+    if cached is not None:
+        return cached
+    version = response_cache.version("reports")
+    await _get_depot_or_404(db, depot_id)
+    return response_cache.store(request, "reports", key, version, await report_engine.read(db, depot_id, period, start))
+
+@router.post("/{depot_id}/reports", response_model=ReportJobResponse, status_code=202)
+async def create_depot_reports(
+    request: Request,
+    depot_id: int,
+    period: str = Query("day", pattern="^(day|week)$"),
+    start: Optional[datetime] = Query(None, description="any time in the period; default the current one"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Start computing a depot's reports for one day or week; poll the returned job for progress."""
+    await _get_depot_or_404(db, depot_id)
+    job = report_engine.submit(depot_id, period, start or datetime.utcnow())
+    return encoding.respond(request, job.to_dict(), status_code=202)
+
+@router.get("/{depot_id}/reports/jobs/{job_id}", response_model=ReportJobResponse)
+async def read_depot_report_job(request: Request, depot_id: int, job_id: str):
+    job = report_engine.job(job_id)
+    if job is None or job.depot_id != depot_id:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return encoding.respond(request, job.to_dict())
@@ -1,24 +1,36 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from app.core.db import get_db
-from app.models import Granary, GranaryConfig
-from app.schemas import GranaryCreate, GranaryResponse, GranaryConfigCreate
+from app.api.deps import naive_utc
+from app.core import config, encoding
+from app.core.db import get_db, get_read_db
+from app.models import Granary, GranaryConfig, GranaryAlarm
+from app.schemas import GranaryCreate, GranaryResponse, GranaryConfigCreate, GranaryHistoryResponse, GranaryLatestResponse, SnapshotStats, GranaryStateStats, GranaryDataPage, GranaryAlarmResponse, GranaryBulkResponse, GranaryField, FieldCacheStats, GranaryTemperatureList, TemperatureIndexStats
+from app.services import granary_import, listings, readings, rollups
+from app.services.archive import archive_service
+from app.services.depot_summary import depot_summary
+from app.services.fields import field_service
+from app.services.granary_state import granary_state
+from app.services.ingest import ingestion_service
+from app.services.response_cache import response_cache
+from app.services.snapshots import snapshot_store
+from app.services.temperature_index import temperature_index
 
 router = APIRouter()
 
 @router.get("", response_model=List[GranaryResponse])
-async def read_granaries(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    # Load config and info eagerly
-    result = await db.execute(
-        select(Granary)
-        .options(selectinload(Granary.config), selectinload(Granary.info))
-        .offset(skip).limit(limit)
-    )
-    granaries = result.scalars().all()
-    return granaries
+async def read_granaries(request: Request, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
+    cached = response_cache.lookup(request, "granaries", (skip, limit))
+    if cached is not None:
+        return cached
+    version = response_cache.version("granaries")
+    result = await db.execute(listings.granaries_query().offset(skip).limit(limit))
+    granaries = [listings.render_granary(row) for row in result.all()]
+    return response_cache.store(request, "granaries", (skip, limit), version, granaries)
 
 @router.post("", response_model=GranaryResponse)
 async def create_granary(granary_in: GranaryCreate, db: AsyncSession = Depends(get_db)):
@@ -60,19 +72,234 @@ async def create_granary(granary_in: GranaryCreate, db: AsyncSession = Depends(g
         .where(Granary.id == db_granary.id)
     )
     db_granary = result.scalars().first()
+    snapshot_store.upsert_granary(db_granary.id, db_granary.depot_id, db_granary.name, db_granary.collection_status, db_granary.last_collected_at)
+    if config_data:
+        await ingestion_service.refresh_topics()
+    response_cache.bump("granaries")
+    depot_summary.invalidate()
     return db_granary
 
+async def _read_bulk_rows(request: Request) -> List[dict]:
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        body = await request.json()
+        items = body.get("items") if isinstance(body, dict) else body
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise HTTPException(status_code=400, detail="Expected a list of granaries or {\"items\": [...]}")
+        return items
+    if content_type.startswith("text/csv"):
+        return granary_import.parse_csv(await request.body())
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing 'file' upload")
+        content = await upload.read()
+        filename = (upload.filename or "").lower()
+        if filename.endswith(".csv"):
+            return granary_import.parse_csv(content)
+        if filename.endswith(".xlsx"):
+            return granary_import.parse_xlsx(content)
+        raise HTTPException(status_code=415, detail="Upload a .csv or .xlsx file")
+    raise HTTPException(status_code=415, detail="Send JSON, text/csv or a multipart .csv/.xlsx upload")
+
+@router.post("/bulk", response_model=GranaryBulkResponse)
+async def bulk_upsert_granaries(request: Request, partial: bool = False, db: AsyncSession = Depends(get_db)):
+    """Create or update many granaries with config and info in one transaction.
+
+    Nothing is written if any row is invalid (422 with per-row errors) unless
+    `partial` is set, in which case the valid rows are written.
+    """
+    try:
+        raw_rows = await _read_bulk_rows(request)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    entries, invalid = await granary_import.validate_rows(db, raw_rows)
+    summary = {"written": False, "created": 0, "updated": 0, "invalid": len(invalid),
+               "results": sorted(invalid, key=lambda result: result["row"])}
+    if invalid and not partial:
+        return JSONResponse(status_code=422, content=GranaryBulkResponse(**summary).model_dump())
+    if entries:
+        written = await granary_import.write_rows(db, entries)
+        await db.commit()
+        ids = {result["row"]: result["id"] for result in written}
+        for number, _, row in entries:
+            current = snapshot_store.granaries.get(ids[number], {})
+            snapshot_store.upsert_granary(ids[number], row.depot_id, row.name,
+                                          current.get("collection_status", row.collection_status), current.get("last_collected_at"))
+        await ingestion_service.refresh_topics()
+        response_cache.bump("granaries")
+        depot_summary.invalidate()
+        summary.update(
+            written=True,
+            created=sum(1 for result in written if result["status"] == "created"),
+            updated=sum(1 for result in written if result["status"] == "updated"),
+            results=sorted(invalid + written, key=lambda result: result["row"]),
+        )
+    return summary
+
+@router.get("/latest", response_model=List[GranaryLatestResponse])
+async def read_latest_snapshots(request: Request, depot_id: Optional[int] = None):
+    """Latest reading, last_collected_at and collection_status per granary, served from memory."""
+    return encoding.respond(request, await snapshot_store.latest(depot_id))
+
+@router.get("/latest/stats", response_model=SnapshotStats)
+async def read_snapshot_stats():
+    return snapshot_store.stats()
+
+@router.get("/state/stats", response_model=GranaryStateStats)
+async def read_granary_state_stats():
+    """Pending last_collected_at/collection_status writes and flush counters."""
+    return granary_state.stats()
+
+@router.get("/field/stats", response_model=FieldCacheStats)
+async def read_field_cache_stats():
+    return field_service.stats()
+
+@router.get("/temperatures/top", response_model=GranaryTemperatureList)
+async def read_temperature_top(
+    request: Request,
+    metric: str = Query("max", pattern="^(max|mean|rise)$"),
+    limit: int = Query(20, ge=1, le=1000),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    province: Optional[str] = None,
+    depot_id: Optional[int] = None,
+):
+    """Granaries ranked by the max, mean or rise rate of their latest reading, across depots, served from memory."""
+    if not snapshot_store.warmed:
+        await snapshot_store.warm()
+    return encoding.respond(request, temperature_index.top(metric, limit, province, depot_id, ascending=order == "asc"))
+
+@router.get("/temperatures/range", response_model=GranaryTemperatureList)
+async def read_temperature_range(
+    request: Request,
+    metric: str = Query("max", pattern="^(max|mean|rise)$"),
+    minimum: Optional[float] = Query(None, alias="min"),
+    maximum: Optional[float] = Query(None, alias="max"),
+    province: Optional[str] = None,
+    depot_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """Granaries whose latest max, mean or rise rate lies within [min, max], highest first, served from memory."""
+    if not snapshot_store.warmed:
+        await snapshot_store.warm()
+    return encoding.respond(request, temperature_index.range(metric, minimum, maximum, province, depot_id, limit))
+
+@router.get("/temperatures/stats", response_model=TemperatureIndexStats)
+async def read_temperature_index_stats():
+    return temperature_index.stats()
+
 @router.get("/{granary_id}", response_model=GranaryResponse)
-async def read_granary(granary_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Granary)
-        .options(selectinload(Granary.config), selectinload(Granary.info))
-        .where(Granary.id == granary_id)
-    )
-    granary = result.scalars().first()
-    if granary is None:
+async def read_granary(request: Request, granary_id: int, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(listings.granaries_query().where(Granary.id == granary_id))
+    row = result.first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Granary not found")
-    return granary
+    return encoding.respond(request, listings.render_granary(row))
+
+@router.get("/{granary_id}/history", response_model=GranaryHistoryResponse)
+async def read_granary_history(
+    request: Request,
+    granary_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    max_points: int = Query(500, ge=1, le=5000),
+    include_points: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Temperature trend for a window, served from hourly/daily rollups when raw readings exceed max_points."""
+    result = await db.execute(select(Granary.id).where(Granary.id == granary_id))
+    if result.scalar() is None:
+        raise HTTPException(status_code=404, detail="Granary not found")
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    return encoding.respond(request, await rollups.query_history(db, granary_id, start, end, max_points, include_points))
+
+@router.get("/{granary_id}/field", response_model=GranaryField)
+async def read_granary_field(
+    granary_id: int,
+    axis: str = Query("layer", pattern="^(layer|row|column)$"),
+    index: int = Query(1, ge=1),
+    width: int = Query(64, ge=2, le=config.FIELD_MAX_RESOLUTION),
+    height: int = Query(64, ge=2, le=config.FIELD_MAX_RESOLUTION),
+    rows: Optional[int] = Query(None, ge=1, description="Cable rows in the plan; defaults to the most square layout"),
+    reading_id: Optional[int] = Query(None, description="Defaults to the latest reading"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Temperature heatmap of one layer, cable row or cable column, interpolated to width × height."""
+    try:
+        body = await field_service.render(db, granary_id, reading_id, axis, index, width, height, rows)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if body is None:
+        raise HTTPException(status_code=404, detail="Reading not found")
+    return Response(content=body, media_type="application/json")
+
+@router.get("/{granary_id}/data", response_model=GranaryDataPage)
+async def read_granary_data(
+    request: Request,
+    granary_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Readings in [from, to), paged by (collected_at, id). Pass next_cursor back to continue."""
+    result = await db.execute(select(Granary.id).where(Granary.id == granary_id))
+    if result.scalar() is None:
+        raise HTTPException(status_code=404, detail="Granary not found")
+    try:
+        page = await readings.read_page(db, granary_id, naive_utc(start), naive_utc(end), cursor, limit,
+                                        descending=order == "desc")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return encoding.respond(request, page)
+
+@router.get("/{granary_id}/data/export")
+async def export_granary_data(
+    granary_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Stream every reading in [from, to) as NDJSON or CSV without loading the window into memory."""
+    result = await db.execute(select(Granary.id).where(Granary.id == granary_id))
+    if result.scalar() is None:
+        raise HTTPException(status_code=404, detail="Granary not found")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"granary_{granary_id}_data.{format}"
+    return StreamingResponse(
+        readings.export_rows(granary_id, naive_utc(start), naive_utc(end), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/{granary_id}/alarms", response_model=List[GranaryAlarmResponse])
+async def read_granary_alarms(
+    request: Request,
+    granary_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    alarm_type: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Most recent temperature alarms for a granary."""
+    query = listings.alarms_query().where(GranaryAlarm.granary_id == granary_id)
+    start, end = naive_utc(start), naive_utc(end)
+    if start is not None:
+        query = query.where(GranaryAlarm.collected_at >= start)
+    if end is not None:
+        query = query.where(GranaryAlarm.collected_at < end)
+    if alarm_type is not None:
+        query = query.where(GranaryAlarm.alarm_type == alarm_type)
+    result = await db.execute(query.order_by(GranaryAlarm.collected_at.desc(), GranaryAlarm.id.desc()).limit(limit))
+    return encoding.respond(request, [listings.render_alarm(row) for row in result.all()])
 
 @router.delete("/{granary_id}")
 async def delete_granary(granary_id: int, db: AsyncSession = Depends(get_db)):
@@ -83,6 +310,12 @@ async def delete_granary(granary_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(granary)
     await db.commit()
+    snapshot_store.remove_granary(granary_id)
+    granary_state.discard(granary_id)
+    archive_service.remove_granary_files(granary_id)
+    await ingestion_service.refresh_topics()
+    response_cache.bump("granaries", "reports")
+    depot_summary.invalidate()
     return {"ok": True}
 
 @router.put("/{granary_id}", response_model=GranaryResponse)
@@ -134,12 +367,14 @@ async def update_granary(granary_id: int, granary_in: GranaryCreate, db: AsyncSe
             db.add(db_info)
             
     await db.commit()
-    await db.refresh(db_granary)
     
-    # Reload with all relations
-    result = await db.execute(
-        select(Granary)
-        .options(selectinload(Granary.config), selectinload(Granary.info))
-        .where(Granary.id == granary_id)
-    )
-    return result.scalars().first()
+    # Reload with all relations, including state still waiting to be written
+    result = await db.execute(listings.granaries_query().where(Granary.id == granary_id))
+    granary = listings.render_granary(result.first())
+    snapshot_store.upsert_granary(granary["id"], granary["depot_id"], granary["name"], granary["collection_status"], granary["last_collected_at"])
+    if granary_in.config:
+        await ingestion_service.refresh_topics()
+    # A granary moved to another depot takes its reports along
+    response_cache.bump("granaries", "reports")
+    depot_summary.invalidate()
+    return granary
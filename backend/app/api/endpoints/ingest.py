@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.schemas import IngestStats
+from app.services.ingest import ingestion_service
+
+router = APIRouter()
+
+@router.get("/stats", response_model=IngestStats)
+async def read_ingest_stats():
+    """Buffer state and sustained throughput of the MQTT ingestion worker."""
+    return ingestion_service.stats()
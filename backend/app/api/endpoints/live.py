@@ -0,0 +1,102 @@
+import asyncio
+import json
+from typing import List
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.core import config
+from app.schemas import LiveStats
+from app.services.live import BrokerFull, Subscriber, live_broker
+
+router = APIRouter()
+
+PING = json.dumps({"type": "ping"})
+
+@router.websocket("/ws")
+async def live_websocket(
+    websocket: WebSocket,
+    granary_id: List[int] = Query([]),
+    depot_id: List[int] = Query([]),
+):
+    """Pushes readings and status changes for the subscribed granaries and depots.
+
+    Send {"action": "subscribe" | "unsubscribe", "granary_ids": [...], "depot_ids": [...]}
+    to change the subscription. Every frame is a JSON object with a "type" field:
+    reading, status, overflow (events were dropped, reload /api/granaries/latest) or ping.
+    """
+    try:
+        subscriber = live_broker.subscribe(granary_id, depot_id)
+    except BrokerFull:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    reader = asyncio.create_task(_read_subscriptions(websocket, subscriber))
+    getter = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.create_task(subscriber.queue.get())
+            done, _ = await asyncio.wait({reader, getter}, timeout=config.LIVE_HEARTBEAT_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if reader in done:
+                break
+            if getter in done:
+                _, data = getter.result()
+                getter = None
+                await websocket.send_text(data)
+            else:
+                await websocket.send_text(PING)
+        if not isinstance(reader.exception(), WebSocketDisconnect):
+            await websocket.close(code=1003)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in (reader, getter):
+            if task is not None:
+                task.cancel()
+        live_broker.unsubscribe(subscriber)
+
+async def _read_subscriptions(websocket: WebSocket, subscriber: Subscriber) -> None:
+    while True:
+        message = await websocket.receive_json()
+        action = message.get("action")
+        if action not in ("subscribe", "unsubscribe"):
+            raise ValueError(f"Unknown action {action!r}")
+        live_broker.update(
+            subscriber,
+            [int(value) for value in message.get("granary_ids", ())],
+            [int(value) for value in message.get("depot_ids", ())],
+            remove=action == "unsubscribe",
+        )
+
+@router.get("/events")
+async def live_events(granary_id: List[int] = Query([]), depot_id: List[int] = Query([])):
+    """Server-sent events for the given granaries and depots, named like the WebSocket frame types."""
+    if not granary_id and not depot_id:
+        raise HTTPException(status_code=400, detail="Subscribe to at least one granary_id or depot_id")
+    try:
+        subscriber = live_broker.subscribe(granary_id, depot_id)
+    except BrokerFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = await subscriber.next_event(config.LIVE_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": ping\n\n"
+                else:
+                    yield f"event: {event[0]}\ndata: {event[1]}\n\n"
+        finally:
+            live_broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/stats", response_model=LiveStats)
+async def read_live_stats():
+    """Connected subscribers and how many events were fanned out or dropped."""
+    return live_broker.stats()
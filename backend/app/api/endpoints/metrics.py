@@ -0,0 +1,19 @@
+from typing import List
+from fastapi import APIRouter, Response
+from app.schemas import SlowRequest
+from app.services.admission import admission_controller
+from app.services.metrics import request_metrics
+
+router = APIRouter()
+
+# Served at /metrics, outside /api, where Prometheus scrapes by default
+exposition_router = APIRouter()
+
+@exposition_router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return Response(request_metrics.render() + admission_controller.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/slow", response_model=List[SlowRequest])
+async def read_slow_requests():
+    """Most recent slow requests, newest first, with their SQL grouped by statement."""
+    return list(reversed(request_metrics.slow_requests))
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.schemas import ReportStats
+from app.services.reports import report_engine
+
+router = APIRouter()
+
+@router.get("/stats", response_model=ReportStats)
+async def read_report_stats():
+    """Worker pool size, job counts and how many granaries the report engine has covered."""
+    return report_engine.stats()
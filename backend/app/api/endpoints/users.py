@@ -2,15 +2,15 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.core.security import verify_password, get_password_hash
-from app.core.db import get_db
+from app.core.security import get_password_hash_async, token_cache
+from app.core.db import get_db, get_read_db
 from app.models import User
 from app.schemas import UserCreate, UserResponse
 
 router = APIRouter()
 
 @router.get("", response_model=List[UserResponse])
-async def read_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+async def read_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(User).offset(skip).limit(limit))
     users = result.scalars().all()
     return users
@@ -24,7 +24,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Username or email already registered")
     
     # Secure hash using Passlib
-    hashed_password = get_password_hash(user.password) 
+    hashed_password = await get_password_hash_async(user.password)
     
     db_user = User(
         username=user.username,
@@ -37,7 +37,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     return db_user
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
+async def read_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalars().first()
     if user is None:
@@ -62,6 +62,7 @@ async def update_user(user_id: int, user_in: UserCreate, db: AsyncSession = Depe
     
     await db.commit()
     await db.refresh(user)
+    token_cache.invalidate_user(user_id)
     return user
 
 @router.delete("/{user_id}")
@@ -73,4 +74,5 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(user)
     await db.commit()
+    token_cache.invalidate_user(user_id)
     return {"ok": True}
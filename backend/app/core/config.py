@@ -0,0 +1,145 @@
+import os
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Database engine profile (see app.core.db.PROFILES): dev, sqlite-production or postgres.
+# DATABASE_URL overrides the profile's URL; DATABASE_READ_URL points readers at a replica.
+DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+DB_ECHO = _env_bool("DB_ECHO", False) if os.getenv("DB_ECHO") is not None else None
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+DB_READER_POOL_SIZE = int(os.getenv("DB_READER_POOL_SIZE", "8"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Apply pending schema migrations at startup instead of refusing to start
+DB_AUTO_MIGRATE = _env_bool("DB_AUTO_MIGRATE", False)
+
+# MQTT broker used by the ingestion worker. Leave MQTT_BROKER_HOST empty to
+# run without a broker (readings can still be pushed in-process).
+MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST", "")
+MQTT_BROKER_PORT = int(os.getenv("MQTT_BROKER_PORT", "1883"))
+MQTT_USERNAME = os.getenv("MQTT_USERNAME") or None
+MQTT_PASSWORD = os.getenv("MQTT_PASSWORD") or None
+MQTT_CLIENT_ID = os.getenv("MQTT_CLIENT_ID", "lq-web-ingest")
+MQTT_TOPIC_REFRESH_SECONDS = float(os.getenv("MQTT_TOPIC_REFRESH_SECONDS", "60"))
+MQTT_RECONNECT_SECONDS = float(os.getenv("MQTT_RECONNECT_SECONDS", "5"))
+
+# Ingestion batching: a batch is written when it reaches INGEST_BATCH_SIZE rows
+# or when INGEST_FLUSH_INTERVAL seconds have passed, whichever comes first.
+INGEST_ENABLED = _env_bool("INGEST_ENABLED", True)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))
+INGEST_MAX_BUFFER = int(os.getenv("INGEST_MAX_BUFFER", "50000"))
+
+# Latest-reading snapshot store: number of granaries whose latest reading is kept in memory
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("SNAPSHOT_MAX_ENTRIES", "20000"))
+
+# Temperature alarm rules (°C), evaluated inline for every ingested reading
+ALARM_MAX_TEMPERATURE = float(os.getenv("ALARM_MAX_TEMPERATURE", "30"))
+ALARM_LAYER_DEVIATION = float(os.getenv("ALARM_LAYER_DEVIATION", "5"))
+ALARM_GRADIENT = float(os.getenv("ALARM_GRADIENT", "4"))
+ALARM_RISE_PER_DAY = float(os.getenv("ALARM_RISE_PER_DAY", "3"))
+ALARM_RISE_MIN_DELTA = float(os.getenv("ALARM_RISE_MIN_DELTA", "1"))
+ALARM_MAX_PER_READING = int(os.getenv("ALARM_MAX_PER_READING", "20"))
+
+# Collection scheduler: sweeps every granary's collector on a fixed cadence
+COLLECTION_ENABLED = _env_bool("COLLECTION_ENABLED", False)
+COLLECTION_INTERVAL_SECONDS = float(os.getenv("COLLECTION_INTERVAL_SECONDS", "600"))
+COLLECTION_GLOBAL_CONCURRENCY = int(os.getenv("COLLECTION_GLOBAL_CONCURRENCY", "64"))
+COLLECTION_DEPOT_CONCURRENCY = int(os.getenv("COLLECTION_DEPOT_CONCURRENCY", "2"))
+COLLECTION_DEPOT_STAGGER_SECONDS = float(os.getenv("COLLECTION_DEPOT_STAGGER_SECONDS", "0.5"))
+COLLECTION_TIMEOUT_SECONDS = float(os.getenv("COLLECTION_TIMEOUT_SECONDS", "30"))
+COLLECTION_RETRIES = int(os.getenv("COLLECTION_RETRIES", "2"))
+COLLECTION_RETRY_BACKOFF_SECONDS = float(os.getenv("COLLECTION_RETRY_BACKOFF_SECONDS", "2"))
+
+# Authentication: bcrypt runs on a bounded thread pool so logins never block
+# the event loop; decoded tokens are cached with their user until they expire
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+
+# Rendered depot/granary list responses kept for conditional GETs
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+
+# /api/depots/summary is recomputed at most once per TTL
+DEPOT_SUMMARY_TTL_SECONDS = float(os.getenv("DEPOT_SUMMARY_TTL_SECONDS", "5"))
+
+# Retention: readings older than ARCHIVE_RETENTION_DAYS (whole months) move from
+# granary_data to compressed per-granary, per-month segment files in ARCHIVE_DIR
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "365"))
+ARCHIVE_ENABLED = _env_bool("ARCHIVE_ENABLED", False)
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "86400"))
+ARCHIVE_OPEN_SEGMENTS = int(os.getenv("ARCHIVE_OPEN_SEGMENTS", "64"))
+
+# Request metrics served at /metrics. Requests slower than METRICS_SLOW_REQUEST_MS
+# are logged with a per-statement SQL breakdown (at most METRICS_MAX_STATEMENTS
+# distinct statements each) and the last METRICS_SLOW_LOG_SIZE are kept in memory
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "500"))
+METRICS_SLOW_LOG_SIZE = int(os.getenv("METRICS_SLOW_LOG_SIZE", "100"))
+METRICS_MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", "50"))
+METRICS_LATENCY_BUCKETS = tuple(
+    float(bound) for bound in os.getenv("METRICS_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(",")
+)
+
+# Live push (/api/live/ws and /api/live/events): events queued per subscriber
+# before it is treated as a slow consumer, and the cap on connected subscribers
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "256"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "5000"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+
+# Interpolated temperature slices (/api/granaries/{id}/field): rendered slices
+# memoised per reading, and the largest width/height a request may ask for
+FIELD_CACHE_MAX_ENTRIES = int(os.getenv("FIELD_CACHE_MAX_ENTRIES", "512"))
+FIELD_MAX_RESOLUTION = int(os.getenv("FIELD_MAX_RESOLUTION", "512"))
+
+# Response encoding: bodies of at least RESPONSE_GZIP_MIN_BYTES are gzipped for
+# clients that send Accept-Encoding: gzip (0 turns compression off). Level 1
+# costs a fraction of the CPU of level 6 for most of the size reduction on
+# reading pages. Data endpoints also answer in MessagePack for
+# Accept: application/msgpack
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "1"))
+
+# Write-behind of granaries.last_collected_at and collection_status: pending
+# changes are written every GRANARY_STATE_FLUSH_SECONDS, or sooner once
+# GRANARY_STATE_MAX_PENDING granaries are waiting. This bounds what a crash can lose
+GRANARY_STATE_FLUSH_SECONDS = float(os.getenv("GRANARY_STATE_FLUSH_SECONDS", "0.25"))
+GRANARY_STATE_MAX_PENDING = int(os.getenv("GRANARY_STATE_MAX_PENDING", "5000"))
+
+# Inspection reports (/api/depots/{id}/reports): computed on a pool of
+# REPORT_WORKERS processes. With REPORT_ENABLED, every depot's reports for the
+# previous day and week are generated at startup and daily at REPORT_HOUR (UTC)
+REPORT_ENABLED = _env_bool("REPORT_ENABLED", False)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", str(os.cpu_count() or 1)))
+REPORT_HOUR = int(os.getenv("REPORT_HOUR", "1"))
+REPORT_TOP_POINTS = int(os.getenv("REPORT_TOP_POINTS", "10"))
+REPORT_JOB_HISTORY = int(os.getenv("REPORT_JOB_HISTORY", "200"))
+
+# Admission control for writes: POST/PUT/PATCH/DELETE requests under /api and
+# ingestion batches share ADMISSION_WRITE_SLOTS, one per writer connection by
+# default. A free slot goes to interactive requests before bulk work (requests
+# under ADMISSION_BULK_PATHS and ingestion). Each class queues at most
+# ADMISSION_*_QUEUE requests for ADMISSION_*_MAX_WAIT_SECONDS; beyond that it
+# is answered 429 with Retry-After
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED", True)
+ADMISSION_WRITE_SLOTS = int(os.getenv("ADMISSION_WRITE_SLOTS", str(DB_POOL_SIZE) if DB_PROFILE == "postgres" else "1"))
+ADMISSION_INTERACTIVE_QUEUE = int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "200"))
+ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS", "10"))
+ADMISSION_BULK_QUEUE = int(os.getenv("ADMISSION_BULK_QUEUE", "20"))
+ADMISSION_BULK_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_BULK_MAX_WAIT_SECONDS", "30"))
+ADMISSION_BULK_PATHS = tuple(
+    path.strip() for path in os.getenv("ADMISSION_BULK_PATHS", "/api/granaries/bulk,/api/collection/sweep").split(",")
+    if path.strip()
+)
@@ -0,0 +1,87 @@
+"""Response bodies for the data-heavy read endpoints.
+
+These endpoints build plain dicts and lists straight from row tuples and hand
+them to `respond`, which skips FastAPI's response_model validation and
+serialisation. A client whose Accept header asks for application/msgpack (or
+application/x-msgpack) gets MessagePack when msgpack is installed. Everyone
+else gets JSON, encoded by orjson when it is installed and by the standard
+library otherwise. Datetimes are ISO 8601 strings in every format, as
+pydantic renders them. gzip is negotiated separately by the GZip middleware
+(see RESPONSE_GZIP_MIN_BYTES).
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+_MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def dumps(payload: Any) -> bytes:
+    """Compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(data) -> Any:
+    """Parse JSON text or bytes; raises ValueError when it is not valid JSON."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def packb(payload: Any) -> bytes:
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+
+def media_type(request: Request) -> str:
+    """MSGPACK when the client accepts it (q > 0) and msgpack is installed, else JSON."""
+    if msgpack is None:
+        return JSON
+    for part in request.headers.get("accept", "").split(","):
+        kind, *params = part.split(";")
+        if kind.strip().lower() not in _MSGPACK_TYPES:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        return MSGPACK if quality > 0 else JSON
+    return JSON
+
+
+def encode(payload: Any, kind: str = JSON) -> bytes:
+    return packb(payload) if kind == MSGPACK else dumps(payload)
+
+
+def respond(request: Request, payload: Any, status_code: int = 200,
+            headers: Optional[Dict[str, str]] = None) -> Response:
+    kind = media_type(request)
+    return Response(
+        content=encode(payload, kind), status_code=status_code, media_type=kind,
+        headers={"Vary": "Accept", **(headers or {})},
+    )
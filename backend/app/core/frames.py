@@ -0,0 +1,254 @@
+"""Decoder for the raw frames a collector extension sends back.
+
+A collect request (see app.services.collection) makes one extension
+(GranaryConfig.extension_number) report every cable on its bus, addressed
+start_index..end_index, and then its temperature/humidity sensor at th_index.
+Each report is one frame:
+
+    offset  size  field
+    0       2     0xAA 0x55
+    2       1     extension number
+    3       1     kind: 0x01 cable temperatures, 0x02 temperature/humidity
+    4       1     index: the cable or sensor address on the bus
+    5       1     n, the number of values
+    6       2n    values, big-endian int16 in tenths (of a degree, or of %RH)
+    6+2n    1     checksum: sum of bytes 2 .. 5+2n, modulo 256
+
+A message is the frames of one response, concatenated. The cable at address i
+is cable i - start_index + 1 of the reading. A cable frame carries
+cable_point_count values, point 1 first. A temperature/humidity frame carries
+the air temperature and then the humidity. The collector counts in
+GranaryConfig describe the hardware; they do not change the frames.
+
+Sensors report ABSENT when disconnected or open-circuit. Values outside the
+sensor's range are treated the same way, as is exactly 85.0 °C: a DS18B20
+returns that power-on value when a conversion never ran. All of these become
+NaN. A frame with a bad checksum is discarded, so its cable reads as missing.
+Structural problems raise FrameError: a lost sync, a truncated frame, another
+extension's frame, or an address outside the layout.
+
+`compile_layout` turns a config into a FrameLayout once. `decode` first tries
+the expected message (every cable in address order, then the sensor) and
+checks all of its frames at once as rows of one NumPy array. Anything else
+(frames out of order, repeated or absent) is walked header by header with
+struct to find the frames, whose rows are then gathered into one array and
+checked the same way.
+"""
+import struct
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import List, Optional
+
+import numpy as np
+
+SYNC = b"\xaa\x55"
+CABLE = 0x01
+CLIMATE = 0x02
+ABSENT = 0x7FFF
+SCALE = 10
+# DS18B20 range and power-on register value, in tenths of a degree
+SENSOR_MIN, SENSOR_MAX = -550, 1250
+POWER_ON = 850
+
+HEAD = struct.Struct(">2sBBBB")
+CHECKSUM_SIZE = 1
+CLIMATE_FRAME_SIZE = HEAD.size + 4 + CHECKSUM_SIZE
+
+
+class FrameError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class FrameLayout:
+    extension: int
+    start_index: int
+    cable_count: int
+    points: int
+    th_index: Optional[int] = None
+
+    @property
+    def cable_frame_size(self) -> int:
+        return HEAD.size + 2 * self.points + CHECKSUM_SIZE
+
+    @cached_property
+    def cable_heads(self) -> np.ndarray:
+        """The header bytes of every cable frame of the expected message, one row per cable."""
+        heads = np.empty((self.cable_count, HEAD.size), dtype=np.uint8)
+        heads[:] = (0xAA, 0x55, self.extension, CABLE, 0, self.points)
+        heads[:, 4] = np.arange(self.start_index, self.start_index + self.cable_count)
+        return heads
+
+    @property
+    def message_size(self) -> int:
+        """Size of the expected message: every cable, then the sensor if there is one."""
+        return self.cable_count * self.cable_frame_size + (CLIMATE_FRAME_SIZE if self.th_index is not None else 0)
+
+
+@dataclass
+class DecodedFrames:
+    grid: np.ndarray  # cables × points float32, NaN where missing
+    air_temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    missing_sensors: int = 0  # NaN points, including those of missing cables
+    missing_cables: List[int] = field(default_factory=list)  # 1-based, no valid frame
+    checksum_errors: int = 0
+
+
+def compile_layout(extension_number: Optional[int], start_index: Optional[int], end_index: Optional[int],
+                   cable_count: Optional[int], cable_point_count: Optional[int], th_index: Optional[int] = None,
+                   th_collector_count: Optional[int] = None) -> FrameLayout:
+    """FrameLayout for a GranaryConfig's wiring. Raises ValueError when it cannot describe frames."""
+    if extension_number is None or start_index is None or end_index is None or not cable_point_count:
+        raise ValueError("extension_number, start_index, end_index and cable_point_count are required")
+    cables = end_index - start_index + 1
+    if cables < 1:
+        raise ValueError("end_index must not be before start_index")
+    if cable_count and cable_count != cables:
+        raise ValueError(f"start_index..end_index addresses {cables} cables but cable_count is {cable_count}")
+    if not (0 <= extension_number <= 0xFF and 0 <= start_index and end_index <= 0xFF and cable_point_count <= 0xFF):
+        raise ValueError("extension number, addresses and point count must each fit in one byte")
+    if th_index is not None and (th_collector_count == 0 or start_index <= th_index <= end_index):
+        # No sensor fitted, or an address that is really a cable's
+        th_index = None
+    return FrameLayout(extension_number, start_index, cables, cable_point_count, th_index)
+
+
+def _temperatures(raw: np.ndarray) -> np.ndarray:
+    values = raw.astype(np.float32) / SCALE
+    values[(raw == ABSENT) | (raw == POWER_ON) | (raw < SENSOR_MIN) | (raw > SENSOR_MAX)] = np.nan
+    return values
+
+
+def _climate(raw: np.ndarray):
+    temperature, humidity = int(raw[0]), int(raw[1])
+    air = None if temperature == ABSENT or not SENSOR_MIN <= temperature <= SENSOR_MAX else temperature / SCALE
+    return air, None if humidity == ABSENT or not 0 <= humidity <= 100 * SCALE else humidity / SCALE
+
+
+def _checksum(frame: bytes) -> int:
+    return sum(frame[2:-1]) & 0xFF
+
+
+def _finish(grid: np.ndarray, present: np.ndarray, air, humidity, checksum_errors: int) -> DecodedFrames:
+    return DecodedFrames(
+        grid=grid,
+        air_temperature=air,
+        humidity=humidity,
+        missing_sensors=int(np.isnan(grid).sum()),
+        missing_cables=(np.flatnonzero(~present) + 1).tolist(),
+        checksum_errors=checksum_errors,
+    )
+
+
+def _cable_values(rows: np.ndarray, points: int):
+    """(valid, temperatures) for a (frames, frame size) uint8 array of gathered cable frames."""
+    valid = (rows[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xFF) == rows[:, -1]
+    raw = np.ascontiguousarray(rows[:, HEAD.size:-1]).view(">i2").reshape(len(rows), points)
+    return valid, _temperatures(raw)
+
+
+def _decode_expected(layout: FrameLayout, message: bytes) -> Optional[DecodedFrames]:
+    """Decode a message laid out exactly as expected, or None to fall back to the walk."""
+    cables, size = layout.cable_count, layout.cable_frame_size
+    rows = np.frombuffer(message, dtype=np.uint8, count=cables * size).reshape(cables, size)
+    if not np.array_equal(rows[:, :HEAD.size], layout.cable_heads):
+        return None
+    air = humidity = None
+    checksum_errors = 0
+    if layout.th_index is not None:
+        tail = message[cables * size:]
+        if HEAD.unpack_from(tail) != (SYNC, layout.extension, CLIMATE, layout.th_index, 2):
+            return None
+        if _checksum(tail) == tail[-1]:
+            air, humidity = _climate(np.frombuffer(tail, dtype=">i2", count=2, offset=HEAD.size))
+        else:
+            checksum_errors += 1
+
+    valid = (rows[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xFF) == rows[:, -1]
+    # Every cable's values at once: a (cables, points) view striding over the frames
+    raw = np.ndarray((cables, layout.points), dtype=">i2", buffer=message, offset=HEAD.size, strides=(size, 2))
+    grid = _temperatures(raw)
+    grid[~valid] = np.nan
+    return _finish(grid, valid, air, humidity, checksum_errors + int(cables - valid.sum()))
+
+
+def _decode_walk(layout: FrameLayout, message: bytes) -> DecodedFrames:
+    # Hop from header to header in Python, then check and unpack every cable
+    # frame together, as in the expected case
+    offsets, cables = [], []
+    air = humidity = None
+    checksum_errors = 0
+    offset = 0
+    while offset < len(message):
+        if len(message) - offset < HEAD.size + CHECKSUM_SIZE:
+            raise FrameError(f"truncated frame header at byte {offset}")
+        sync, extension, kind, index, count = HEAD.unpack_from(message, offset)
+        if sync != SYNC:
+            raise FrameError(f"no frame start at byte {offset}")
+        end = offset + HEAD.size + 2 * count + CHECKSUM_SIZE
+        if end > len(message):
+            raise FrameError(f"truncated frame at byte {offset}")
+        if extension != layout.extension:
+            raise FrameError(f"frame from extension {extension}, expected {layout.extension}")
+        if kind == CABLE:
+            cable = index - layout.start_index
+            if not 0 <= cable < layout.cable_count or count != layout.points:
+                raise FrameError(f"cable frame at address {index} with {count} values does not fit the layout")
+            offsets.append(offset)
+            cables.append(cable)
+        elif kind == CLIMATE and index == layout.th_index and count == 2:
+            frame = message[offset:end]
+            if _checksum(frame) == frame[-1]:
+                air, humidity = _climate(np.frombuffer(frame, dtype=">i2", count=2, offset=HEAD.size))
+            else:
+                checksum_errors += 1
+        else:
+            raise FrameError(f"unexpected frame kind {kind} at address {index}")
+        offset = end
+
+    grid = np.full((layout.cable_count, layout.points), np.nan, dtype=np.float32)
+    present = np.zeros(layout.cable_count, dtype=bool)
+    if offsets:
+        data = np.frombuffer(message, dtype=np.uint8)
+        rows = data[np.array(offsets)[:, None] + np.arange(layout.cable_frame_size)]
+        valid, values = _cable_values(rows, layout.points)
+        checksum_errors += int(len(offsets) - valid.sum())
+        # A repeated cable keeps its last valid frame
+        placed = np.array(cables)[valid]
+        grid[placed] = values[valid]
+        present[placed] = True
+    return _finish(grid, present, air, humidity, checksum_errors)
+
+
+def decode(layout: FrameLayout, message: bytes) -> DecodedFrames:
+    message = bytes(message)
+    if len(message) == layout.message_size:
+        decoded = _decode_expected(layout, message)
+        if decoded is not None:
+            return decoded
+    return _decode_walk(layout, message)
+
+
+def encode(layout: FrameLayout, grid: np.ndarray, air_temperature: Optional[float] = None,
+           humidity: Optional[float] = None) -> bytes:
+    """The expected message for a reading, as a collector sends it (NaN becomes ABSENT)."""
+    if grid.shape != (layout.cable_count, layout.points):
+        raise ValueError(f"grid is {grid.shape}, layout is {(layout.cable_count, layout.points)}")
+    cables, size = layout.cable_count, layout.cable_frame_size
+    frames = np.zeros((cables, size), dtype=np.uint8)
+    frames[:, 0], frames[:, 1] = 0xAA, 0x55
+    frames[:, 2], frames[:, 3] = layout.extension, CABLE
+    frames[:, 4] = np.arange(layout.start_index, layout.start_index + cables)
+    frames[:, 5] = layout.points
+    missing = np.isnan(grid)
+    raw = np.rint(np.where(missing, 0, grid) * SCALE).astype(">i2")
+    raw[missing] = ABSENT
+    frames[:, HEAD.size:-1] = raw.view(np.uint8).reshape(cables, 2 * layout.points)
+    frames[:, -1] = frames[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xFF
+    message = frames.tobytes()
+    if layout.th_index is not None:
+        values = [ABSENT if v is None else int(round(v * SCALE)) for v in (air_temperature, humidity)]
+        frame = HEAD.pack(SYNC, layout.extension, CLIMATE, layout.th_index, 2) + struct.pack(">hh", *values)
+        message += frame + bytes([sum(frame[2:]) & 0xFF])
+    return message
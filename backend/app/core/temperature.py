@@ -0,0 +1,115 @@
+"""Packed storage format for cable temperature readings.
+
+A reading is a cable × point grid. It is stored as a 4-byte header
+(little-endian uint16 cable count, uint16 point count) followed by the grid as
+little-endian int16 in hundredths of a degree, row-major by cable. Missing
+sensors are stored as MISSING and decode to NaN.
+
+The JSON shape served by the API maps the 1-based cable number to its list of
+point values: {"1": [18.5, 18.7, ...], "2": [...]}.
+"""
+import struct
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+SCALE = 100
+MISSING = -32768
+HEADER = struct.Struct("<HH")
+_LIMIT = 32767 / SCALE
+
+
+def json_to_grid(values: Any, cable_count: int, cable_point_count: int) -> np.ndarray:
+    """Lay out a JSON reading on a cable × point float32 grid.
+
+    Accepts the cable-keyed shape ({"1": [...]}), flat "cable-point" keys
+    ({"1-1": 18.5}) or a plain list of cable lists. Raises ValueError when a
+    value does not fit the configured layout.
+    """
+    # The common case, every cable with every point: convert in one call
+    rows = values if isinstance(values, list) else None
+    if isinstance(values, dict) and len(values) == cable_count:
+        rows = [values.get(str(cable)) for cable in range(1, cable_count + 1)]
+    if rows is not None and len(rows) == cable_count and all(
+            isinstance(row, list) and len(row) == cable_point_count for row in rows):
+        # NumPy reads None as NaN when converting to a float dtype
+        return np.array(rows, dtype=np.float32)
+
+    grid = np.full((cable_count, cable_point_count), np.nan, dtype=np.float32)
+    if isinstance(values, list):
+        items = enumerate(values, start=1)
+    elif isinstance(values, dict):
+        items = values.items()
+    else:
+        raise ValueError("temperature_values must be an object or a list")
+
+    for key, value in items:
+        if isinstance(value, list):
+            cable = int(key)
+            if not 1 <= cable <= cable_count or len(value) > cable_point_count:
+                raise ValueError(f"cable {key} does not fit a {cable_count}x{cable_point_count} layout")
+            row = np.array(value, dtype=np.float32)
+            grid[cable - 1, :len(row)] = row
+        else:
+            cable, _, point = str(key).partition("-")
+            cable, point = int(cable), int(point)
+            if not (1 <= cable <= cable_count and 1 <= point <= cable_point_count):
+                raise ValueError(f"point {key} does not fit a {cable_count}x{cable_point_count} layout")
+            grid[cable - 1, point - 1] = np.nan if value is None else float(value)
+    return grid
+
+
+def encode_grid(grid: np.ndarray) -> bytes:
+    cable_count, cable_point_count = grid.shape
+    missing = np.isnan(grid)
+    if np.any(np.abs(grid[~missing]) > _LIMIT):
+        raise ValueError(f"temperature outside the packable range ±{_LIMIT}")
+    fixed = np.rint(np.where(missing, 0, grid) * SCALE).astype("<i2")
+    fixed[missing] = MISSING
+    return HEADER.pack(cable_count, cable_point_count) + fixed.tobytes()
+
+
+def decode_grid(blob: bytes) -> np.ndarray:
+    cable_count, cable_point_count = HEADER.unpack_from(blob)
+    fixed = np.frombuffer(blob, dtype="<i2", offset=HEADER.size, count=cable_count * cable_point_count)
+    grid = fixed.astype(np.float32) / SCALE
+    grid[fixed == MISSING] = np.nan
+    return grid.reshape(cable_count, cable_point_count)
+
+
+def decode_many(blobs: Iterable[bytes]) -> np.ndarray:
+    """Decode same-shaped blobs into one (readings, cables, points) array."""
+    blobs = list(blobs)
+    if not blobs:
+        return np.empty((0, 0, 0), dtype=np.float32)
+    cable_count, cable_point_count = HEADER.unpack_from(blobs[0])
+    size = cable_count * cable_point_count
+    stride = HEADER.size + 2 * size
+    joined = b"".join(blobs)
+    if len(joined) != stride * len(blobs):
+        raise ValueError("blobs do not share one layout")
+    raw = np.frombuffer(joined, dtype=np.uint8).reshape(len(blobs), stride)[:, HEADER.size:]
+    fixed = raw.copy().view("<i2").reshape(len(blobs), cable_count, cable_point_count)
+    grid = fixed.astype(np.float32) / SCALE
+    grid[fixed == MISSING] = np.nan
+    return grid
+
+
+def grid_to_json(grid: np.ndarray) -> Dict[str, list]:
+    rounded = np.round(grid.astype(np.float64), 2)
+    rows = rounded.tolist()
+    # Only cables with a missing sensor need their NaNs replaced one by one;
+    # NaN is the only value not equal to itself
+    for cable in np.flatnonzero(np.isnan(rounded).any(axis=1)).tolist():
+        rows[cable] = [None if v != v else v for v in rows[cable]]
+    return {str(cable): row for cable, row in enumerate(rows, start=1)}
+
+
+def pack_values(values: Any, cable_count: Optional[int], cable_point_count: Optional[int]) -> Optional[bytes]:
+    """Pack a JSON reading for a granary layout, or None when it cannot be packed."""
+    if values is None or not cable_count or not cable_point_count:
+        return None
+    try:
+        return encode_grid(json_to_grid(values, cable_count, cable_point_count))
+    except (ValueError, TypeError):
+        return None
@@ -1,8 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.db import engine, Base
-from app.models import User, Depot, Granary, GranaryConfig, GranaryInfo, GranaryData # Import to register models
-from app.api.endpoints import users, depots, granaries, auth
+from fastapi.middleware.gzip import GZipMiddleware
+from app.core.db import engine, read_engine
+from app.api.endpoints import users, depots, granaries, auth, ingest, collection, cache, archive, metrics, live, reports, admission
+from app.core import config
+from app import migrations
+from app.services.ingest import ingestion_service
+from app.services.snapshots import snapshot_store
+from app.services.collection import collection_scheduler
+from app.services.archive import archive_service
+from app.services.granary_state import granary_state
+from app.services.reports import report_engine
+from app.services.metrics import MetricsMiddleware, request_metrics
+from app.services.admission import AdmissionMiddleware
 
 app = FastAPI(title="Grain Management System")
 
@@ -13,6 +23,20 @@ origins = [
     "http://127.0.0.1:5173",
 ]
 
+# Innermost, so shed writes still pass through the metrics, compression and CORS layers
+if config.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
+# Compression sits inside the metrics middleware so its cost is timed with the request
+if config.RESPONSE_GZIP_MIN_BYTES > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=config.RESPONSE_GZIP_MIN_BYTES, compresslevel=config.RESPONSE_GZIP_LEVEL)
+
+# Per-route latency and per-request SQL accounting, see app.services.metrics
+if config.METRICS_ENABLED:
+    request_metrics.instrument(engine)
+    request_metrics.instrument(read_engine)
+    app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -26,12 +50,46 @@ app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(depots.router, prefix="/api/depots", tags=["depots"])
 app.include_router(granaries.router, prefix="/api/granaries", tags=["granaries"])
+app.include_router(ingest.router, prefix="/api/ingest", tags=["ingest"])
+app.include_router(collection.router, prefix="/api/collection", tags=["collection"])
+app.include_router(cache.router, prefix="/api/cache", tags=["cache"])
+app.include_router(archive.router, prefix="/api/archive", tags=["archive"])
+app.include_router(reports.router, prefix="/api/reports", tags=["reports"])
+app.include_router(admission.router, prefix="/api/admission", tags=["admission"])
+app.include_router(live.router, prefix="/api/live", tags=["live"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
+app.include_router(metrics.exposition_router, tags=["metrics"])
 
 @app.on_event("startup")
 async def startup():
-    async with engine.begin() as conn:
-        # Create tables
-        await conn.run_sync(Base.metadata.create_all)
+    # Schema changes are applied by `python -m app.migrations upgrade`, not at startup
+    if config.DB_AUTO_MIGRATE:
+        await migrations.upgrade(engine)
+    await migrations.check(engine)
+    await snapshot_store.warm()
+    await granary_state.recover()
+    granary_state.start()
+    if config.INGEST_ENABLED:
+        await ingestion_service.start()
+    if config.COLLECTION_ENABLED:
+        await collection_scheduler.start()
+    if config.ARCHIVE_ENABLED:
+        await archive_service.start()
+    if config.REPORT_ENABLED:
+        await report_engine.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Also stops jobs started through the API when the schedule is off
+    await report_engine.stop()
+    if config.ARCHIVE_ENABLED:
+        await archive_service.stop()
+    if config.COLLECTION_ENABLED:
+        await collection_scheduler.stop()
+    if config.INGEST_ENABLED:
+        await ingestion_service.stop()
+    # Last, so it writes the state left by the services above
+    await granary_state.stop()
 
 @app.get("/")
 def read_root():
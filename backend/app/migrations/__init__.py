@@ -0,0 +1,91 @@
+"""Versioned schema migrations.
+
+Each module in `app.migrations.versions` named `v<NNNN>_<name>.py` defines
+DESCRIPTION and `async def upgrade(engine)`. Applied versions are recorded in
+the `schema_version` table. Migrations are written to be idempotent (create
+with checkfirst, add columns only when missing), so databases created by the
+old `create_all` startup upgrade cleanly from version 1.
+
+Usage (from backend/):
+    python -m app.migrations upgrade
+    python -m app.migrations status
+"""
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect
+from sqlalchemy.future import select
+
+from app.migrations import versions
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=True),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def load_migrations() -> List[Tuple[int, object]]:
+    migrations = []
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        name = module_info.name
+        if not name.startswith("v"):
+            continue
+        version = int(name[1:].split("_", 1)[0])
+        migrations.append((version, importlib.import_module(f"{versions.__name__}.{name}")))
+    migrations.sort(key=lambda item: item[0])
+    return migrations
+
+
+def head_version() -> int:
+    migrations = load_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+async def current_version(engine) -> int:
+    async with engine.connect() as conn:
+        if not await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(schema_version.name)):
+            return 0
+        result = await conn.execute(select(func.max(schema_version.c.version)))
+        return result.scalar() or 0
+
+
+async def upgrade(engine, target: int = None) -> List[int]:
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: schema_version.create(sync_conn, checkfirst=True))
+    applied = []
+    version = await current_version(engine)
+    for number, module in load_migrations():
+        if number <= version or (target is not None and number > target):
+            continue
+        logger.info("Applying migration %04d: %s", number, module.DESCRIPTION)
+        await module.upgrade(engine)
+        async with engine.begin() as conn:
+            await conn.execute(schema_version.insert().values(version=number, description=module.DESCRIPTION))
+        applied.append(number)
+    return applied
+
+
+async def check(engine) -> int:
+    """Raise SchemaOutOfDate unless the database is at the head version."""
+    version = await current_version(engine)
+    head = head_version()
+    if version < head:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, code expects {head}. "
+            "Run `python -m app.migrations upgrade` from backend/."
+        )
+    return version
@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+import logging
+
+from app.core.db import engine
+from app.migrations import current_version, head_version, upgrade
+
+
+async def main(command: str) -> None:
+    engine.echo = False
+    try:
+        if command == "upgrade":
+            applied = await upgrade(engine)
+            print(f"Applied {len(applied)} migration(s); now at version {await current_version(engine)}")
+        else:
+            print(f"Database at version {await current_version(engine)}, head is {head_version()}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    parser.add_argument("command", choices=["upgrade", "status"], nargs="?", default="status")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args().command))
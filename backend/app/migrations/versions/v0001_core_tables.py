@@ -0,0 +1,106 @@
+"""Core tables: users, depots, granaries, granary configs/infos and readings.
+
+The tables are declared here as they were at version 1, not taken from
+app.models, so a new database goes through the same steps as an old one;
+later columns and indexes are added by their own versions.
+
+Databases created by the old startup `create_all` already have these tables;
+they are left untouched and only recorded as version 1.
+"""
+from sqlalchemy import JSON, Boolean, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text
+
+DESCRIPTION = "Core tables"
+
+metadata = MetaData()
+
+depots = Table(
+    "depots",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True, nullable=False, comment="粮库名称"),
+    Column("address", Text, nullable=True, comment="粮库地址"),
+    Column("contact_person", String, nullable=True, comment="联系人"),
+    Column("phone", String, nullable=True, comment="电话"),
+    Column("province", String, nullable=True, comment="省份"),
+    Column("created_at", DateTime, comment="安装时间"),
+)
+
+users = Table(
+    "users",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True, nullable=False, comment="用户名"),
+    Column("hashed_password", String, nullable=False, comment="密码"),
+    Column("email", String, unique=True, index=True, nullable=True, comment="邮箱"),
+    Column("role", Integer, comment="权限"),
+    Column("depot_id", Integer, ForeignKey("depots.id"), nullable=True, comment="粮库ID"),
+    Column("full_name", String, nullable=True, comment="姓名"),
+    Column("phone", String, nullable=True, comment="联系电话"),
+    Column("is_active", Boolean, comment="是否使用"),
+)
+
+granaries = Table(
+    "granaries",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("depot_id", Integer, ForeignKey("depots.id"), nullable=False, comment="粮库ID"),
+    Column("name", String, index=True, nullable=False, comment="粮仓名称"),
+    Column("last_collected_at", DateTime, nullable=True, comment="最后采集时间"),
+    Column("collection_status", Integer, comment="采集状态"),
+)
+
+granary_configs = Table(
+    "granary_configs",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("granary_id", Integer, ForeignKey("granaries.id"), unique=True, nullable=False),
+    Column("extension_number", Integer, nullable=True, comment="分机号"),
+    Column("temp_collector_count", Integer, nullable=True, comment="温度采集器数量"),
+    Column("th_collector_count", Integer, nullable=True, comment="温湿度采集器数量"),
+    Column("start_index", Integer, nullable=True, comment="起始编号"),
+    Column("end_index", Integer, nullable=True, comment="结束编号"),
+    Column("th_index", Integer, nullable=True, comment="温湿度编号"),
+    Column("cable_count", Integer, nullable=True, comment="电缆根数"),
+    Column("cable_point_count", Integer, nullable=True, comment="电缆点数"),
+    Column("total_collector_count", Integer, nullable=True, comment="采集器总数"),
+    Column("mqtt_topic_sub", String, nullable=True, comment="mqtt接收主题"),
+    Column("mqtt_topic_pub", String, nullable=True, comment="mqtt发送主题"),
+    Column("collection_device", Integer, nullable=True, comment="采集设备"),
+)
+
+granary_infos = Table(
+    "granary_infos",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("granary_id", Integer, ForeignKey("granaries.id"), unique=True, nullable=False),
+    Column("manager", String, nullable=True, comment="仓管员"),
+    Column("design_capacity", Float, nullable=True, comment="设计储量"),
+    Column("actual_capacity", Float, nullable=True, comment="实际储量"),
+    Column("storage_nature", String, nullable=True, comment="存储性质"),
+    Column("variety", String, nullable=True, comment="品种"),
+    Column("entry_time", DateTime, nullable=True, comment="入仓时间"),
+    Column("origin", String, nullable=True, comment="产地"),
+    Column("grade", String, nullable=True, comment="粮食等级"),
+    Column("rough_rice_yield", Float, nullable=True, comment="出糙率（容重）"),
+    Column("moisture", Float, nullable=True, comment="水分"),
+    Column("remark", Text, nullable=True, comment="备注"),
+)
+
+granary_data = Table(
+    "granary_data",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("granary_id", Integer, ForeignKey("granaries.id"), nullable=False),
+    Column("collected_at", DateTime, comment="采集时间"),
+    Column("sequence_number", Integer, nullable=True, comment="编号"),
+    Column("temperature_values", JSON, nullable=True, comment="温度值"),
+    Column("humidity_values", Float, nullable=True, comment="温湿度值"),
+)
+
+TABLES = [depots, users, granaries, granary_configs, granary_infos, granary_data]
+
+
+async def upgrade(engine) -> None:
+    async with engine.begin() as conn:
+        for table in TABLES:
+            await conn.run_sync(lambda sync_conn, table=table: table.create(sync_conn, checkfirst=True))
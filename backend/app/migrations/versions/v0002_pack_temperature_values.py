@@ -0,0 +1,96 @@
+"""Add granary_data.temperature_packed and convert JSON readings into it.
+
+Safe to re-run: only rows that are still unpacked are touched, in id order,
+one committed chunk at a time. Rows that do not fit their granary's
+cable_count × cable_point_count are left as JSON.
+
+The columns it reads and writes are declared here as they were at version 2,
+not taken from app.models.
+"""
+import logging
+
+from sqlalchemy import JSON, Column, Integer, LargeBinary, MetaData, Table, bindparam, inspect, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.temperature import pack_values
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION = "Packed temperature grids"
+CHUNK_SIZE = 2000
+
+metadata = MetaData()
+
+granary_configs = Table(
+    "granary_configs",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("granary_id", Integer),
+    Column("cable_count", Integer),
+    Column("cable_point_count", Integer),
+)
+
+granary_data = Table(
+    "granary_data",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("granary_id", Integer),
+    Column("temperature_values", JSON(none_as_null=True)),
+    Column("temperature_packed", LargeBinary),
+)
+
+
+async def add_column(conn) -> None:
+    columns = await conn.run_sync(lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns("granary_data")})
+    if "temperature_packed" not in columns:
+        column_type = LargeBinary().compile(dialect=conn.dialect)
+        await conn.execute(text(f"ALTER TABLE granary_data ADD COLUMN temperature_packed {column_type}"))
+
+
+async def pack_existing_rows(session_maker, chunk_size: int = CHUNK_SIZE) -> int:
+    async with session_maker() as session:
+        result = await session.execute(
+            select(granary_configs.c.granary_id, granary_configs.c.cable_count, granary_configs.c.cable_point_count)
+        )
+        layouts = {granary_id: (cables, points) for granary_id, cables, points in result.all()}
+
+    packed_total = 0
+    last_id = 0
+    while True:
+        async with session_maker() as session:
+            result = await session.execute(
+                select(granary_data.c.id, granary_data.c.granary_id, granary_data.c.temperature_values)
+                .where(granary_data.c.id > last_id)
+                .where(granary_data.c.temperature_packed.is_(None))
+                .where(granary_data.c.temperature_values.isnot(None))
+                .order_by(granary_data.c.id)
+                .limit(chunk_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                packed = pack_values(row.temperature_values, *layouts.get(row.granary_id, (None, None)))
+                if packed is not None:
+                    updates.append({"row_id": row.id, "temperature_packed": packed, "temperature_values": None})
+            if updates:
+                await session.execute(
+                    update(granary_data).where(granary_data.c.id == bindparam("row_id")),
+                    updates,
+                )
+                await session.commit()
+            packed_total += len(updates)
+            logger.info("Packed %d rows (up to id %d)", packed_total, last_id)
+    return packed_total
+
+
+async def upgrade(engine) -> None:
+    async with engine.begin() as conn:
+        await add_column(conn)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await pack_existing_rows(session_maker)
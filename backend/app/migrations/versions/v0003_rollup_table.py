@@ -0,0 +1,36 @@
+"""Hourly/daily rollup table for temperature history.
+
+Declared here as it was at version 3, not taken from app.models.
+"""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, LargeBinary, MetaData, String, Table, UniqueConstraint
+
+DESCRIPTION = "Temperature rollups"
+
+metadata = MetaData()
+
+# Only the key, for the foreign key; the table itself belongs to version 1
+Table("granaries", metadata, Column("id", Integer, primary_key=True))
+
+granary_data_rollups = Table(
+    "granary_data_rollups",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("granary_id", Integer, ForeignKey("granaries.id"), nullable=False),
+    Column("resolution", String, nullable=False, comment="汇总粒度"),
+    Column("bucket_start", DateTime, nullable=False, comment="时段开始"),
+    Column("reading_count", Integer, nullable=False, comment="采集次数"),
+    Column("temperature_min", LargeBinary, nullable=True, comment="最低温度"),
+    Column("temperature_max", LargeBinary, nullable=True, comment="最高温度"),
+    Column("temperature_sum", LargeBinary, nullable=True, comment="温度合计"),
+    Column("point_counts", LargeBinary, nullable=True, comment="测点计数"),
+    Column("humidity_min", Float, nullable=True, comment="最低湿度"),
+    Column("humidity_max", Float, nullable=True, comment="最高湿度"),
+    Column("humidity_sum", Float, nullable=True, comment="湿度合计"),
+    Column("humidity_count", Integer, nullable=False, comment="湿度计数"),
+    UniqueConstraint("granary_id", "resolution", "bucket_start", name="uq_granary_data_rollup_bucket"),
+)
+
+
+async def upgrade(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: granary_data_rollups.create(sync_conn, checkfirst=True))
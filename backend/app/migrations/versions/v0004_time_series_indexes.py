@@ -0,0 +1,38 @@
+"""Indexes for the hot read paths.
+
+- granary_data (granary_id, collected_at, id): latest reading per granary,
+  time-range reads and keyset pages for one granary
+- granaries.depot_id and users.depot_id: lookups by depot
+
+The indexes and the columns they cover are declared here as they were at
+version 4, not taken from app.models.
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Table
+
+DESCRIPTION = "Time-series and foreign key indexes"
+
+metadata = MetaData()
+
+granary_data = Table(
+    "granary_data",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("granary_id", Integer),
+    Column("collected_at", DateTime),
+)
+
+granaries = Table("granaries", metadata, Column("id", Integer, primary_key=True), Column("depot_id", Integer))
+
+users = Table("users", metadata, Column("id", Integer, primary_key=True), Column("depot_id", Integer))
+
+INDEXES = [
+    Index("ix_granary_data_granary_collected", granary_data.c.granary_id, granary_data.c.collected_at, granary_data.c.id),
+    Index("ix_granaries_depot_id", granaries.c.depot_id),
+    Index("ix_users_depot_id", users.c.depot_id),
+]
+
+
+async def upgrade(engine) -> None:
+    async with engine.begin() as conn:
+        for index in INDEXES:
+            await conn.run_sync(lambda sync_conn, index=index: index.create(sync_conn, checkfirst=True))
@@ -0,0 +1,34 @@
+"""Temperature alarms raised by the analysis engine.
+
+Declared here as it was at version 5, not taken from app.models.
+"""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table
+
+DESCRIPTION = "Temperature alarms"
+
+metadata = MetaData()
+
+# Only the keys, for the foreign keys; the tables themselves belong to version 1
+Table("granaries", metadata, Column("id", Integer, primary_key=True))
+Table("granary_data", metadata, Column("id", Integer, primary_key=True))
+
+granary_alarms = Table(
+    "granary_alarms",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("granary_id", Integer, ForeignKey("granaries.id"), nullable=False),
+    Column("granary_data_id", Integer, ForeignKey("granary_data.id"), nullable=True),
+    Column("collected_at", DateTime, nullable=False, comment="采集时间"),
+    Column("alarm_type", String, nullable=False, comment="报警类型"),
+    Column("cable", Integer, nullable=False, comment="电缆号"),
+    Column("point", Integer, nullable=False, comment="测点号"),
+    Column("value", Float, nullable=False, comment="温度值"),
+    Column("reference", Float, nullable=True, comment="参考值"),
+    Column("created_at", DateTime, comment="报警时间"),
+    Index("ix_granary_alarms_granary_collected", "granary_id", "collected_at"),
+)
+
+
+async def upgrade(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: granary_alarms.create(sync_conn, checkfirst=True))
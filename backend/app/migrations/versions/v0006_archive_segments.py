@@ -0,0 +1,32 @@
+"""Index of archived granary_data segment files.
+
+Declared here as it was at version 6, not taken from app.models.
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, String, Table, UniqueConstraint
+
+DESCRIPTION = "Archived reading segments"
+
+metadata = MetaData()
+
+# Only the key, for the foreign key; the table itself belongs to version 1
+Table("granaries", metadata, Column("id", Integer, primary_key=True))
+
+granary_data_segments = Table(
+    "granary_data_segments",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("granary_id", Integer, ForeignKey("granaries.id"), nullable=False),
+    Column("month", DateTime, nullable=False, comment="归档月份"),
+    Column("path", String, nullable=False, comment="文件路径"),
+    Column("first_collected_at", DateTime, nullable=False, comment="最早采集时间"),
+    Column("last_collected_at", DateTime, nullable=False, comment="最晚采集时间"),
+    Column("row_count", Integer, nullable=False, comment="记录数"),
+    Column("size_bytes", Integer, nullable=False, comment="文件大小"),
+    Column("created_at", DateTime, comment="归档时间"),
+    UniqueConstraint("granary_id", "month", name="uq_granary_data_segment_month"),
+)
+
+
+async def upgrade(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: granary_data_segments.create(sync_conn, checkfirst=True))
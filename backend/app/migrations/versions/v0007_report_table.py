@@ -0,0 +1,38 @@
+"""Daily and weekly inspection reports.
+
+Declared here as it was at version 7, not taken from app.models.
+"""
+from sqlalchemy import JSON, Column, DateTime, Float, ForeignKey, Integer, LargeBinary, MetaData, String, Table, UniqueConstraint
+
+DESCRIPTION = "Inspection reports"
+
+metadata = MetaData()
+
+# Only the key, for the foreign key; the table itself belongs to version 1
+Table("granaries", metadata, Column("id", Integer, primary_key=True))
+
+granary_reports = Table(
+    "granary_reports",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("granary_id", Integer, ForeignKey("granaries.id"), nullable=False),
+    Column("period", String, nullable=False, comment="报告周期"),
+    Column("period_start", DateTime, nullable=False, comment="周期开始"),
+    Column("period_end", DateTime, nullable=False, comment="周期结束"),
+    Column("reading_count", Integer, nullable=False, comment="采集次数"),
+    Column("temperature_max", Float, nullable=True, comment="最高温度"),
+    Column("temperature_min", Float, nullable=True, comment="最低温度"),
+    Column("temperature_avg", Float, nullable=True, comment="平均温度"),
+    Column("humidity_avg", Float, nullable=True, comment="平均湿度"),
+    Column("layers", JSON, nullable=True, comment="分层统计"),
+    Column("hottest", JSON, nullable=True, comment="最高温测点"),
+    Column("changes", JSON, nullable=True, comment="较上期变化"),
+    Column("point_avg", LargeBinary, nullable=True, comment="测点平均温度"),
+    Column("generated_at", DateTime, comment="生成时间"),
+    UniqueConstraint("granary_id", "period", "period_start", name="uq_granary_report_period"),
+)
+
+
+async def upgrade(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: granary_reports.create(sync_conn, checkfirst=True))
@@ -0,0 +1,30 @@
+"""Checkpoints of bulk history imports.
+
+Declared here as it was at version 8, not taken from app.models.
+"""
+from sqlalchemy import JSON, Column, DateTime, Integer, MetaData, String, Table
+
+DESCRIPTION = "History import checkpoints"
+
+metadata = MetaData()
+
+granary_data_imports = Table(
+    "granary_data_imports",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("source", String, nullable=False, comment="导入文件"),
+    Column("fingerprint", String, unique=True, nullable=False, comment="文件指纹"),
+    Column("status", String, nullable=False, comment="导入状态"),
+    Column("records", Integer, nullable=False, comment="已读记录数"),
+    Column("offset", Integer, nullable=True, comment="续读位置"),
+    Column("rows_inserted", Integer, nullable=False, comment="导入记录数"),
+    Column("rows_skipped", Integer, nullable=False, comment="跳过记录数"),
+    Column("span", JSON, nullable=True, comment="时间范围"),
+    Column("started_at", DateTime, comment="开始时间"),
+    Column("updated_at", DateTime, comment="更新时间"),
+)
+
+
+async def upgrade(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: granary_data_imports.create(sync_conn, checkfirst=True))
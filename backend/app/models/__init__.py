@@ -1,3 +1,3 @@
 from .user import User
 from .depot import Depot
-from .granary import Granary, GranaryConfig, GranaryInfo, GranaryData
+from .granary import Granary, GranaryConfig, GranaryInfo, GranaryData, GranaryDataRollup, GranaryAlarm, GranaryDataSegment, GranaryReport, GranaryDataImport
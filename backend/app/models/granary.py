@@ -1,13 +1,14 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, JSON, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, JSON, DateTime, Text, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from app.core.db import Base
+from app.core import temperature
 from datetime import datetime
 
 class Granary(Base):
     __tablename__ = "granaries"
 
     id = Column(Integer, primary_key=True, index=True)
-    depot_id = Column(Integer, ForeignKey("depots.id"), nullable=False, comment="粮库ID")
+    depot_id = Column(Integer, ForeignKey("depots.id"), nullable=False, index=True, comment="粮库ID")
     name = Column(String, index=True, nullable=False, comment="粮仓名称")
     last_collected_at = Column(DateTime, nullable=True, comment="最后采集时间")
     collection_status = Column(Integer, default=0, comment="采集状态") # 0: Idle, 1: Collecting
@@ -17,6 +18,10 @@ class Granary(Base):
     config = relationship("GranaryConfig", uselist=False, back_populates="granary", cascade="all, delete-orphan")
     info = relationship("GranaryInfo", uselist=False, back_populates="granary", cascade="all, delete-orphan")
     data_records = relationship("GranaryData", back_populates="granary", cascade="all, delete-orphan")
+    rollups = relationship("GranaryDataRollup", cascade="all, delete-orphan")
+    alarms = relationship("GranaryAlarm", cascade="all, delete-orphan")
+    segments = relationship("GranaryDataSegment", cascade="all, delete-orphan")
+    reports = relationship("GranaryReport", cascade="all, delete-orphan")
 
 class GranaryConfig(Base):
     __tablename__ = "granary_configs"
@@ -61,13 +66,127 @@ class GranaryInfo(Base):
 
 class GranaryData(Base):
     __tablename__ = "granary_data"
+    __table_args__ = (
+        # Latest-per-granary, time range and keyset reads for one granary
+        Index("ix_granary_data_granary_collected", "granary_id", "collected_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     granary_id = Column(Integer, ForeignKey("granaries.id"), nullable=False)
     
     collected_at = Column(DateTime, default=datetime.utcnow, comment="采集时间")
     sequence_number = Column(Integer, nullable=True, comment="编号")
-    temperature_values = Column(JSON, nullable=True, comment="温度值")
+    temperature_values = Column(JSON(none_as_null=True), nullable=True, comment="温度值")
+    temperature_packed = Column(LargeBinary, nullable=True, comment="温度值(压缩)") # See app.core.temperature
     humidity_values = Column(Float, nullable=True, comment="温湿度值") 
 
     granary = relationship("Granary", back_populates="data_records")
+
+    @property
+    def temperature_grid(self):
+        """Cable × point NumPy grid, or None for legacy rows stored as JSON."""
+        if self.temperature_packed is None:
+            return None
+        return temperature.decode_grid(self.temperature_packed)
+
+    @property
+    def temperature_map(self):
+        """Reading in the API's JSON shape, whichever way it is stored."""
+        if self.temperature_packed is not None:
+            return temperature.grid_to_json(temperature.decode_grid(self.temperature_packed))
+        return self.temperature_values
+
+class GranaryDataRollup(Base):
+    __tablename__ = "granary_data_rollups"
+    __table_args__ = (
+        UniqueConstraint("granary_id", "resolution", "bucket_start", name="uq_granary_data_rollup_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granary_id = Column(Integer, ForeignKey("granaries.id"), nullable=False)
+    resolution = Column(String, nullable=False, comment="汇总粒度") # hour / day
+    bucket_start = Column(DateTime, nullable=False, comment="时段开始")
+    reading_count = Column(Integer, nullable=False, default=0, comment="采集次数")
+
+    # Per cable point grids, see app.services.rollups
+    temperature_min = Column(LargeBinary, nullable=True, comment="最低温度")
+    temperature_max = Column(LargeBinary, nullable=True, comment="最高温度")
+    temperature_sum = Column(LargeBinary, nullable=True, comment="温度合计")
+    point_counts = Column(LargeBinary, nullable=True, comment="测点计数")
+
+    humidity_min = Column(Float, nullable=True, comment="最低湿度")
+    humidity_max = Column(Float, nullable=True, comment="最高湿度")
+    humidity_sum = Column(Float, nullable=True, comment="湿度合计")
+    humidity_count = Column(Integer, nullable=False, default=0, comment="湿度计数")
+
+class GranaryAlarm(Base):
+    __tablename__ = "granary_alarms"
+    __table_args__ = (
+        Index("ix_granary_alarms_granary_collected", "granary_id", "collected_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granary_id = Column(Integer, ForeignKey("granaries.id"), nullable=False)
+    granary_data_id = Column(Integer, ForeignKey("granary_data.id"), nullable=True)
+    collected_at = Column(DateTime, nullable=False, comment="采集时间")
+    alarm_type = Column(String, nullable=False, comment="报警类型") # threshold / layer_deviation / gradient / rise_rate
+    cable = Column(Integer, nullable=False, comment="电缆号")
+    point = Column(Integer, nullable=False, comment="测点号")
+    value = Column(Float, nullable=False, comment="温度值")
+    reference = Column(Float, nullable=True, comment="参考值")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="报警时间")
+
+class GranaryDataSegment(Base):
+    __tablename__ = "granary_data_segments"
+    __table_args__ = (
+        UniqueConstraint("granary_id", "month", name="uq_granary_data_segment_month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granary_id = Column(Integer, ForeignKey("granaries.id"), nullable=False)
+    month = Column(DateTime, nullable=False, comment="归档月份")
+    path = Column(String, nullable=False, comment="文件路径") # Relative to ARCHIVE_DIR, see app.services.archive
+    first_collected_at = Column(DateTime, nullable=False, comment="最早采集时间")
+    last_collected_at = Column(DateTime, nullable=False, comment="最晚采集时间")
+    row_count = Column(Integer, nullable=False, comment="记录数")
+    size_bytes = Column(Integer, nullable=False, comment="文件大小")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="归档时间")
+
+class GranaryReport(Base):
+    __tablename__ = "granary_reports"
+    __table_args__ = (
+        UniqueConstraint("granary_id", "period", "period_start", name="uq_granary_report_period"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granary_id = Column(Integer, ForeignKey("granaries.id"), nullable=False)
+    period = Column(String, nullable=False, comment="报告周期") # day / week
+    period_start = Column(DateTime, nullable=False, comment="周期开始")
+    period_end = Column(DateTime, nullable=False, comment="周期结束")
+    reading_count = Column(Integer, nullable=False, default=0, comment="采集次数")
+    temperature_max = Column(Float, nullable=True, comment="最高温度")
+    temperature_min = Column(Float, nullable=True, comment="最低温度")
+    temperature_avg = Column(Float, nullable=True, comment="平均温度")
+    humidity_avg = Column(Float, nullable=True, comment="平均湿度")
+
+    # Report body and the per point mean grid the next report compares against, see app.services.inspection
+    layers = Column(JSON(none_as_null=True), nullable=True, comment="分层统计")
+    hottest = Column(JSON(none_as_null=True), nullable=True, comment="最高温测点")
+    changes = Column(JSON(none_as_null=True), nullable=True, comment="较上期变化")
+    point_avg = Column(LargeBinary, nullable=True, comment="测点平均温度")
+    generated_at = Column(DateTime, default=datetime.utcnow, comment="生成时间")
+
+class GranaryDataImport(Base):
+    __tablename__ = "granary_data_imports"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False, comment="导入文件")
+    fingerprint = Column(String, unique=True, nullable=False, comment="文件指纹") # Size and a hash of the head, see app.services.history_import
+    status = Column(String, nullable=False, default="running", comment="导入状态") # running / loaded / done
+    records = Column(Integer, nullable=False, default=0, comment="已读记录数")
+    offset = Column(Integer, nullable=True, comment="续读位置") # Byte offset of the next record, for seekable formats
+    rows_inserted = Column(Integer, nullable=False, default=0, comment="导入记录数")
+    rows_skipped = Column(Integer, nullable=False, default=0, comment="跳过记录数")
+    span = Column(JSON(none_as_null=True), nullable=True, comment="时间范围") # {granary_id: [first, last collected_at]}
+    started_at = Column(DateTime, default=datetime.utcnow, comment="开始时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, comment="更新时间")
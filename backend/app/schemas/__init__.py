@@ -1,3 +1,11 @@
 from .user import UserCreate, UserResponse
-from .depot import DepotCreate, DepotResponse
-from .granary import GranaryCreate, GranaryResponse, GranaryConfigCreate, GranaryConfigResponse
+from .depot import DepotCreate, DepotResponse, DepotSummary
+from .granary import GranaryCreate, GranaryResponse, GranaryConfigCreate, GranaryConfigResponse, GranaryHistoryResponse, GranaryLatestResponse, SnapshotStats, GranaryStateStats, GranaryDataPage, GranaryAlarmResponse, GranaryBulkResponse, GranaryField, FieldCacheStats, GranaryTemperature, GranaryTemperatureList, TemperatureIndexStats
+from .ingest import IngestStats
+from .collection import CollectionStats
+from .cache import ResponseCacheStats
+from .archive import ArchiveStats
+from .metrics import SlowRequest
+from .live import LiveStats
+from .report import GranaryReportResponse, DepotReports, ReportJobResponse, ReportStats
+from .admission import AdmissionStats
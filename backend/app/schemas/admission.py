@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Dict
+
+class AdmissionClassStats(BaseModel):
+    active: int # Write slots held
+    queued: int
+    max_queue: int
+    max_wait_seconds: float
+    peak_queue: int
+    admitted: int
+    shed_queue_full: int # Answered 429 on arrival
+    shed_timeout: int # Answered 429 after waiting max_wait_seconds
+    avg_wait_ms: float
+    avg_hold_ms: float # Running average of the time a slot is held
+
+class AdmissionStats(BaseModel):
+    enabled: bool
+    slots: int
+    active: int
+    classes: Dict[str, AdmissionClassStats] # interactive / bulk
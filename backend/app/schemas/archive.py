@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class ArchiveStats(BaseModel):
+    retention_days: int
+    cutoff: datetime # Whole months before this are archived
+    runs: int
+    segments_written: int
+    rows_archived: int
+    bytes_written: int
+    segment_reads: int
+    open_segments: int
+    last_run_seconds: float
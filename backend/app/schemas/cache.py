@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import Dict
+
+class ResponseCacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    versions: Dict[str, int]
+    hits: int
+    misses: int
+    hit_ratio: float
+    not_modified: int
+    bytes_saved: int
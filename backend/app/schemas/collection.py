@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+
+class CollectionStats(BaseModel):
+    sweep_running: bool
+    in_flight: int
+    cycles: int
+    interval_seconds: float
+    last_sweep_targets: int
+    last_sweep_skipped: int
+    last_sweep_seconds: float
+    requests: int
+    succeeded: int
+    failed: int
+    timeouts: int
+    retried: int
+    pending_status_writes: int
@@ -21,3 +21,16 @@ class DepotResponse(DepotBase):
     
     class Config:
         from_attributes = True
+
+class DepotSummary(BaseModel):
+    depot_id: int
+    name: str
+    province: Optional[str] = None
+    granary_count: int
+    collecting_count: int
+    never_collected_count: int
+    stalest_collected_at: Optional[datetime] = None # Oldest last_collected_at among granaries that have one
+    design_capacity: float
+    actual_capacity: float
+    latest_temperature_max: Optional[float] = None
+    latest_temperature_avg: Optional[float] = None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, AliasChoices
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -59,12 +59,20 @@ class GranaryDataCreate(GranaryDataBase):
     pass
 
 class GranaryDataResponse(GranaryDataBase):
+    # Packed readings are rendered back into the JSON shape
+    temperature_values: Optional[Dict[str, Any]] = Field(
+        default=None, validation_alias=AliasChoices("temperature_map", "temperature_values")
+    )
     id: int
     granary_id: int
     collected_at: datetime
     class Config:
         from_attributes = True
 
+class GranaryDataPage(BaseModel):
+    items: List[GranaryDataResponse]
+    next_cursor: Optional[str] = None
+
 # Granary Schemas
 class GranaryBase(BaseModel):
     name: str
@@ -84,3 +92,133 @@ class GranaryResponse(GranaryBase):
     
     class Config:
         from_attributes = True
+
+# Bulk Import Schemas
+class GranaryBulkRowResult(BaseModel):
+    row: int # 1-based position in the upload
+    status: str # created / updated / invalid
+    id: Optional[int] = None
+    errors: Optional[List[str]] = None
+
+class GranaryBulkResponse(BaseModel):
+    written: bool
+    created: int
+    updated: int
+    invalid: int
+    results: List[GranaryBulkRowResult]
+
+# History Schemas
+class GranaryHistoryPoint(BaseModel):
+    bucket_start: datetime
+    reading_count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    humidity_mean: Optional[float] = None
+    points: Optional[Dict[str, Any]] = None # Per cable point min/max/mean grids
+
+class GranaryHistoryResponse(BaseModel):
+    granary_id: int
+    resolution: str # raw / hour / day
+    start: datetime
+    end: datetime
+    series: List[GranaryHistoryPoint]
+
+# Latest Snapshot Schemas
+class GranaryLatestResponse(BaseModel):
+    granary_id: int
+    depot_id: int
+    name: str
+    collection_status: int = 0
+    last_collected_at: Optional[datetime] = None
+    reading: Optional[GranaryDataResponse] = None
+
+# Temperature Index Schemas
+class GranaryTemperature(BaseModel):
+    granary_id: int
+    depot_id: Optional[int] = None
+    name: Optional[str] = None
+    province: Optional[str] = None
+    collected_at: datetime # Latest packed reading
+    temperature_max: float
+    temperature_avg: float
+    rise_per_day: Optional[float] = None # Change of the mean in °C per day since the previous reading
+
+class GranaryTemperatureList(BaseModel):
+    metric: str # max / mean / rise
+    total: int # Granaries matching the filters, before the limit
+    granaries: List[GranaryTemperature]
+
+class TemperatureIndexStats(BaseModel):
+    granaries: int
+    with_rise: int
+    depots: int
+    provinces: int
+    sorted_lists: int
+    updates: int
+    queries: int
+
+# Temperature Field Schemas
+class GranaryField(BaseModel):
+    granary_id: int
+    reading_id: int
+    collected_at: datetime
+    axis: str # layer / row / column
+    index: int # 1-based layer, cable row or cable column
+    cable_rows: int
+    cable_columns: int
+    cable_points: int
+    width: int
+    height: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    values: List[List[Optional[float]]] # height rows of width values, top row first; None where no sensor is near
+
+class FieldCacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    bytes: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+
+class SnapshotStats(BaseModel):
+    granaries: int
+    entries: int
+    max_entries: int
+    reading_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+
+class GranaryStateStats(BaseModel):
+    pending: int
+    pending_collected: int
+    pending_statuses: int
+    max_pending: int
+    flush_interval_seconds: float
+    recorded: int
+    coalesced: int # Changes merged into one already pending for the same granary
+    flushes: int
+    rows_written: int
+    flush_errors: int
+    last_flush_ms: float
+    seconds_since_flush: Optional[float] = None
+
+# Alarm Schemas
+class GranaryAlarmResponse(BaseModel):
+    id: int
+    granary_id: int
+    granary_data_id: Optional[int] = None
+    collected_at: datetime
+    alarm_type: str
+    cable: int
+    point: int
+    value: float
+    reference: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+
+class AnalysisStats(BaseModel):
+    readings_evaluated: int
+    alarms_raised: int
+    readings_per_second: float
+
+class IngestStats(BaseModel):
+    mqtt_connected: bool
+    subscribed_topics: int
+    buffered: int
+    messages_received: int
+    messages_dropped: int
+    frame_layouts: int # Granaries whose wiring can decode raw collector frames
+    frame_checksum_errors: int
+    rows_written: int
+    flush_count: int
+    flush_errors: int
+    last_flush_rows: int
+    last_flush_ms: float
+    messages_per_second: float
+    uptime_seconds: float
+    analysis: AnalysisStats
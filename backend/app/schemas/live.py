@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+class LiveStats(BaseModel):
+    subscribers: int
+    max_subscribers: int
+    granaries_watched: int
+    depots_watched: int
+    queued: int # Events waiting in subscriber queues
+    events_published: int
+    deliveries: int
+    overflows: int # Times a slow subscriber's backlog was discarded
+    rejected: int # Connections refused at max_subscribers
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List
+from datetime import datetime
+
+class SqlStatementStats(BaseModel):
+    statement: str # Whitespace and IN lists collapsed
+    count: int
+    total_ms: float
+
+class SlowRequest(BaseModel):
+    started_at: datetime
+    method: str
+    path: str
+    route: str # Route template, or "unmatched"
+    status: int
+    duration_ms: float
+    queries: int
+    db_ms: float
+    statements: List[SqlStatementStats] # Slowest first
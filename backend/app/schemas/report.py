@@ -0,0 +1,88 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+class ReportLayer(BaseModel):
+    layer: int # Point index, the same across all cables
+    max: Optional[float] = None
+    min: Optional[float] = None
+    avg: Optional[float] = None
+
+class ReportPoint(BaseModel):
+    cable: int
+    point: int
+    value: Optional[float] = None
+    collected_at: datetime # When the point read its maximum
+
+class ReportLayerChange(BaseModel):
+    layer: int
+    avg: Optional[float] = None
+
+class ReportRise(BaseModel):
+    cable: int
+    point: int
+    previous: Optional[float] = None
+    current: Optional[float] = None
+    delta: Optional[float] = None
+
+class ReportChanges(BaseModel):
+    previous_period_start: datetime
+    max: Optional[float] = None
+    min: Optional[float] = None
+    avg: Optional[float] = None
+    layers: List[ReportLayerChange] = []
+    largest_rises: List[ReportRise] = [] # Points whose mean rose the most
+
+class GranaryReportResponse(BaseModel):
+    id: int
+    granary_id: int
+    period: str
+    period_start: datetime
+    period_end: datetime
+    reading_count: int
+    temperature_max: Optional[float] = None
+    temperature_min: Optional[float] = None
+    temperature_avg: Optional[float] = None
+    humidity_avg: Optional[float] = None
+    layers: List[ReportLayer] = []
+    hottest: List[ReportPoint] = []
+    changes: Optional[ReportChanges] = None # None for a granary's first report
+    generated_at: datetime
+
+class DepotReports(BaseModel):
+    depot_id: int
+    period: str
+    period_start: Optional[datetime] = None # None until the depot has a report of this period
+    period_end: Optional[datetime] = None
+    reports: List[GranaryReportResponse]
+
+class ReportJobResponse(BaseModel):
+    id: str
+    depot_id: int
+    period: str
+    period_start: datetime
+    period_end: datetime
+    trigger: str
+    status: str # queued / running / done / failed
+    total: int
+    completed: int
+    skipped: int # Already reported, for scheduled jobs
+    failed: int
+    progress: float
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class ReportStats(BaseModel):
+    workers: int
+    pool_started: bool
+    jobs: int
+    jobs_queued: int
+    jobs_running: int
+    jobs_failed: int
+    granaries_reported: int
+    granaries_failed: int
+    readings_processed: int
+    compute_seconds: float # Time granaries spent in the worker pool, summed
+    last_job_seconds: float
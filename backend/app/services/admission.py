@@ -0,0 +1,258 @@
+"""Admission control for database writes.
+
+With SQLite there is one writer, and a reconnecting fleet of collectors can
+keep it busy for as long as its backlog lasts. Writes therefore take one of
+ADMISSION_WRITE_SLOTS before they start. Every write request under /api holds
+one for its whole duration (`AdmissionMiddleware`), and the ingestion worker
+holds one per batch, so interactive requests get the writer between batches.
+
+Work comes in two priority classes. "interactive" is every write request
+except those under ADMISSION_BULK_PATHS. "bulk" is those paths and background
+work such as ingestion. A freed slot goes to the oldest interactive waiter.
+Bulk waiters get one slot after every `BULK_EVERY` consecutive interactive
+grants, so a steady stream of interactive writes cannot stall ingestion.
+
+Each class has a bounded queue and a longest wait. A request that finds its
+queue full, or that is still waiting after the longest wait, is answered 429.
+The Retry-After header estimates when a slot could be free, from the work
+queued ahead and the average time a slot is held. Background callers pass
+`bounded=False` and always wait; the ingestion buffer has its own limit.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Iterable, Optional
+
+from starlette.responses import JSONResponse
+
+from app.core import config
+
+CLASSES = ("interactive", "bulk")
+BULK_EVERY = 8
+
+WRITE_METHODS = frozenset(("POST", "PUT", "PATCH", "DELETE"))
+# Login only hashes and checks a password and writes nothing. Registration inserts a user, so it takes a slot
+EXEMPT_PATHS = ("/api/auth/login",)
+
+# Weight of the latest hold time in the running average behind Retry-After
+_HOLD_WEIGHT = 0.1
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, priority: str, reason: str, retry_after: int):
+        super().__init__(f"Too many {priority} writes waiting ({reason}), retry in {retry_after} s")
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class PriorityClass:
+    def __init__(self, name: str, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.active = 0
+        self.peak_queue = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.wait_seconds = 0.0
+        self.hold_seconds = 0.0  # running average
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": len(self.waiters),
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "peak_queue": self.peak_queue,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "avg_wait_ms": round(self.wait_seconds / self.admitted * 1000, 3) if self.admitted else 0.0,
+            "avg_hold_ms": round(self.hold_seconds * 1000, 3),
+        }
+
+
+class AdmissionController:
+    def __init__(self, slots: int = config.ADMISSION_WRITE_SLOTS, enabled: bool = config.ADMISSION_ENABLED,
+                 queues: Optional[Dict[str, int]] = None, max_waits: Optional[Dict[str, float]] = None):
+        queues = queues or {"interactive": config.ADMISSION_INTERACTIVE_QUEUE, "bulk": config.ADMISSION_BULK_QUEUE}
+        max_waits = max_waits or {"interactive": config.ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS,
+                                  "bulk": config.ADMISSION_BULK_MAX_WAIT_SECONDS}
+        self.slots = max(slots, 1)
+        self.enabled = enabled
+        self.classes = {name: PriorityClass(name, queues[name], max_waits[name]) for name in CLASSES}
+        self.active = 0
+        # Interactive grants in a row while bulk work was waiting
+        self._interactive_streak = 0
+
+    # Slots
+
+    async def acquire(self, priority: str, bounded: bool = True) -> None:
+        """Wait for a write slot; raises AdmissionRejected when the class is saturated."""
+        cls = self.classes[priority]
+        started = time.monotonic()
+        if self.active < self.slots and not any(c.waiters for c in self.classes.values()):
+            self._grant(cls)
+            cls.admitted += 1
+            return
+        if bounded and len(cls.waiters) >= cls.max_queue:
+            cls.shed_queue_full += 1
+            raise AdmissionRejected(priority, "queue full", self.retry_after(priority))
+        waiter = asyncio.get_running_loop().create_future()
+        cls.waiters.append(waiter)
+        cls.peak_queue = max(cls.peak_queue, len(cls.waiters))
+        # A slot may be free with only abandoned waiters ahead
+        self._dispatch()
+        try:
+            if bounded:
+                await asyncio.wait_for(waiter, cls.max_wait)
+            else:
+                await waiter
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # Granted as the wait ended; hand the slot on
+                self.release(priority)
+            else:
+                try:
+                    cls.waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(exc, asyncio.TimeoutError):
+                cls.shed_timeout += 1
+                raise AdmissionRejected(priority, "timed out", self.retry_after(priority)) from None
+            raise
+        cls.admitted += 1
+        cls.wait_seconds += time.monotonic() - started
+
+    def release(self, priority: str, held: Optional[float] = None) -> None:
+        cls = self.classes[priority]
+        cls.active -= 1
+        self.active -= 1
+        if held is not None:
+            cls.hold_seconds += (held - cls.hold_seconds) * _HOLD_WEIGHT
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str, bounded: bool = True):
+        if not self.enabled:
+            yield
+            return
+        await self.acquire(priority, bounded)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(priority, time.perf_counter() - started)
+
+    def _grant(self, cls: PriorityClass) -> None:
+        cls.active += 1
+        self.active += 1
+
+    def _next_waiter(self) -> Optional[PriorityClass]:
+        interactive, bulk = self.classes["interactive"], self.classes["bulk"]
+        for cls in (interactive, bulk):
+            # Waiters that gave up are dropped here as well as by themselves
+            while cls.waiters and cls.waiters[0].done():
+                cls.waiters.popleft()
+        if interactive.waiters and (not bulk.waiters or self._interactive_streak < BULK_EVERY):
+            self._interactive_streak = self._interactive_streak + 1 if bulk.waiters else 0
+            return interactive
+        if bulk.waiters:
+            self._interactive_streak = 0
+            return bulk
+        return None
+
+    def _dispatch(self) -> None:
+        while self.active < self.slots:
+            cls = self._next_waiter()
+            if cls is None:
+                return
+            self._grant(cls)
+            cls.waiters.popleft().set_result(None)
+
+    def retry_after(self, priority: str) -> int:
+        """Seconds until a slot is likely free for a new request of this class."""
+        ahead = self.active + len(self.classes["interactive"].waiters)
+        if priority == "bulk":
+            ahead += len(self.classes["bulk"].waiters)
+        hold = max(cls.hold_seconds for cls in self.classes.values())
+        return max(1, math.ceil(ahead * hold / self.slots))
+
+    # Reporting
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "slots": self.slots,
+            "active": self.active,
+            "classes": {name: cls.stats() for name, cls in self.classes.items()},
+        }
+
+    def render(self) -> str:
+        """Queue depths and shed counts in the Prometheus text format."""
+        lines = [
+            "# HELP admission_write_slots Write slots shared by requests and ingestion.",
+            "# TYPE admission_write_slots gauge",
+            f"admission_write_slots {self.slots}",
+        ]
+        lines.extend(self._family("admission_active", "gauge", "Write slots held.",
+                                  ((f'class="{name}"', cls.active) for name, cls in self.classes.items())))
+        lines.extend(self._family("admission_queue_depth", "gauge", "Writes waiting for a slot.",
+                                  ((f'class="{name}"', len(cls.waiters)) for name, cls in self.classes.items())))
+        lines.extend(self._family("admission_admitted_total", "counter", "Writes given a slot.",
+                                  ((f'class="{name}"', cls.admitted) for name, cls in self.classes.items())))
+        lines.extend(self._family("admission_shed_total", "counter", "Writes answered 429.", (
+            (f'class="{name}",reason="{reason}"', count)
+            for name, cls in self.classes.items()
+            for reason, count in (("queue_full", cls.shed_queue_full), ("timeout", cls.shed_timeout))
+        )))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _family(name: str, kind: str, help: str, samples: Iterable) -> Iterable[str]:
+        yield f"# HELP {name} {help}"
+        yield f"# TYPE {name} {kind}"
+        for labels, value in samples:
+            yield f"{name}{{{labels}}} {value}"
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware holding a write slot for the whole of each write request."""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None,
+                 bulk_paths: tuple = config.ADMISSION_BULK_PATHS):
+        self.app = app
+        self.controller = controller or admission_controller
+        self.bulk_paths = tuple(bulk_paths)
+
+    def classify(self, scope) -> Optional[str]:
+        path = scope.get("path", "")
+        if scope.get("method") not in WRITE_METHODS or not path.startswith("/api/") or path.startswith(EXEMPT_PATHS):
+            return None
+        return "bulk" if self.bulk_paths and path.startswith(self.bulk_paths) else "interactive"
+
+    async def __call__(self, scope, receive, send):
+        priority = self.classify(scope) if scope["type"] == "http" and self.controller.enabled else None
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.acquire(priority)
+        except AdmissionRejected as exc:
+            response = JSONResponse({"detail": str(exc)}, status_code=429,
+                                    headers={"Retry-After": str(exc.retry_after)})
+            await response(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority, time.perf_counter() - started)
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,460 @@
+"""Tiered retention: old granary_data rows move to segment files on disk.
+
+Readings older than ARCHIVE_RETENTION_DAYS, rounded down to whole months, are
+written to one file per granary per month (`<ARCHIVE_DIR>/<granary_id>/<YYYY-MM>.seg`)
+and deleted from granary_data in the same transaction that records the file in
+`granary_data_segments`. Hourly rollups of the month are dropped as well, as
+they outweigh the readings themselves; daily rollups stay, so long-range
+history is unaffected, while raw and hourly history for archived months are
+served from the segments.
+
+Segment layout: MAGIC, a little-endian u32 header length, a JSON header
+({"rows": n, "columns": {name: [offset, length, dtype, encoding]}}), then one
+zlib-compressed block per column. Ids and timestamps (µs since epoch) are
+delta-encoded; packed temperature grids and legacy JSON readings are stored
+as concatenated blobs with an offsets column. Files are memory-mapped and
+only the columns a query needs are decompressed.
+
+Archiving a month that already has a segment merges into it, so the job is
+safe to re-run and picks up late or backfilled readings.
+
+Usage (from backend/):
+    python -m app.services.archive [--before 2025-01-01] [--vacuum]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, update
+from sqlalchemy.future import select
+
+from app.core import config
+from app.core.db import async_session_maker
+from app.models import GranaryAlarm, GranaryData, GranaryDataRollup, GranaryDataSegment
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LQSEG1\n"
+NULL_INT = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1)
+_FIELDS = ("id", "collected_at", "sequence_number", "temperature_values", "temperature_packed", "humidity_values")
+
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(ts: datetime) -> datetime:
+    return (month_start(ts) + timedelta(days=32)).replace(day=1)
+
+
+def _to_micros(ts: datetime) -> int:
+    return (ts - _EPOCH) // timedelta(microseconds=1)
+
+
+def _blobs(values: List[Optional[bytes]]) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = np.array([len(value) if value else 0 for value in values], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    data = np.frombuffer(b"".join(value for value in values if value), dtype=np.uint8)
+    return offsets, data
+
+
+def encode_segment(rows: List[Dict[str, Any]]) -> bytes:
+    """Serialise rows (dicts with the granary_data columns) sorted by (collected_at, id)."""
+    ids = np.array([row["id"] for row in rows], dtype=np.int64)
+    stamps = np.array([_to_micros(row["collected_at"]) for row in rows], dtype=np.int64)
+    packed_offsets, packed = _blobs([row["temperature_packed"] for row in rows])
+    json_offsets, json_data = _blobs([
+        json.dumps(row["temperature_values"]).encode() if row["temperature_packed"] is None and row["temperature_values"] is not None else None
+        for row in rows
+    ])
+    columns = {
+        "id": (np.diff(ids, prepend=0), "delta"),
+        "collected_at": (np.diff(stamps, prepend=0), "delta"),
+        "sequence_number": (np.array([NULL_INT if row["sequence_number"] is None else row["sequence_number"] for row in rows], dtype=np.int64), "plain"),
+        "humidity_values": (np.array([np.nan if row["humidity_values"] is None else row["humidity_values"] for row in rows], dtype=np.float64), "plain"),
+        "temperature_packed_offsets": (packed_offsets, "plain"),
+        "temperature_packed": (packed, "plain"),
+        "temperature_values_offsets": (json_offsets, "plain"),
+        "temperature_values": (json_data, "plain"),
+    }
+    directory = {}
+    blocks = []
+    offset = 0
+    for name, (values, encoding) in columns.items():
+        block = zlib.compress(values.tobytes(), 6)
+        directory[name] = [offset, len(block), values.dtype.str, encoding]
+        blocks.append(block)
+        offset += len(block)
+    header = json.dumps({"rows": len(rows), "columns": directory}).encode()
+    return MAGIC + struct.pack("<I", len(header)) + header + b"".join(blocks)
+
+
+class Segment:
+    """A memory-mapped segment file; columns are decompressed on access."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a granary data segment")
+        (header_length,) = struct.unpack_from("<I", self._map, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(self._map[header_start:header_start + header_length])
+        self._data_start = header_start + header_length
+        self._columns = header["columns"]
+        self.rows = header["rows"]
+
+    def column(self, name: str) -> np.ndarray:
+        offset, length, dtype, encoding = self._columns[name]
+        start = self._data_start + offset
+        with memoryview(self._map) as view:
+            values = np.frombuffer(zlib.decompress(view[start:start + length]), dtype=dtype)
+        return np.cumsum(values) if encoding == "delta" else values
+
+    def collected_at(self) -> np.ndarray:
+        return self.column("collected_at").astype("datetime64[us]")
+
+    def blobs(self, name: str, positions: np.ndarray) -> List[Optional[bytes]]:
+        offsets = self.column(f"{name}_offsets")
+        data = self.column(name).tobytes()
+        return [data[offsets[i]:offsets[i + 1]] or None for i in positions]
+
+    def window(self, start: datetime, end: datetime) -> np.ndarray:
+        """Row positions with start <= collected_at < end."""
+        stamps = self.collected_at()
+        return np.arange(
+            np.searchsorted(stamps, np.datetime64(start, "us"), side="left"),
+            np.searchsorted(stamps, np.datetime64(end, "us"), side="left"),
+        )
+
+    def read_rows(self, positions: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        if positions is None:
+            positions = np.arange(self.rows)
+        ids = self.column("id")
+        stamps = self.collected_at()
+        sequence = self.column("sequence_number")
+        humidity = self.column("humidity_values")
+        packed = self.blobs("temperature_packed", positions)
+        values = self.blobs("temperature_values", positions)
+        return [{
+            "id": int(ids[i]),
+            "collected_at": stamps[i].astype(datetime),
+            "sequence_number": None if sequence[i] == NULL_INT else int(sequence[i]),
+            "humidity_values": None if np.isnan(humidity[i]) else float(humidity[i]),
+            "temperature_packed": packed[n],
+            "temperature_values": json.loads(values[n]) if values[n] is not None else None,
+        } for n, i in enumerate(positions)]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class ArchiveService:
+    def __init__(self, session_maker=async_session_maker, root: str = config.ARCHIVE_DIR,
+                 retention_days: int = config.ARCHIVE_RETENTION_DAYS,
+                 interval: float = config.ARCHIVE_INTERVAL_SECONDS,
+                 max_open_segments: int = config.ARCHIVE_OPEN_SEGMENTS):
+        self.session_maker = session_maker
+        self.root = root
+        self.retention_days = retention_days
+        self.interval = interval
+        self.max_open_segments = max_open_segments
+        self._open: "OrderedDict[Tuple[str, int, int], Segment]" = OrderedDict()
+        self._loop_task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.segments_written = 0
+        self.rows_archived = 0
+        self.bytes_written = 0
+        self.segment_reads = 0
+        self.last_run_seconds = 0.0
+
+    # Files
+
+    def segment_path(self, granary_id: int, month: datetime) -> str:
+        return os.path.join(str(granary_id), f"{month:%Y-%m}.seg")
+
+    def open_segment(self, path: str) -> Segment:
+        """Open (or reuse) the mapping of a segment; a rewritten file gets a fresh mapping."""
+        full_path = os.path.join(self.root, path)
+        stat = os.stat(full_path)
+        key = (full_path, stat.st_mtime_ns, stat.st_size)
+        segment = self._open.get(key)
+        if segment is None:
+            segment = Segment(full_path)
+            self._open[key] = segment
+            while len(self._open) > self.max_open_segments:
+                _, evicted = self._open.popitem(last=False)
+                evicted.close()
+        self._open.move_to_end(key)
+        self.segment_reads += 1
+        return segment
+
+    def _write_file(self, path: str, content: bytes) -> None:
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        temporary = full_path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, full_path)
+
+    def remove_granary_files(self, granary_id: int) -> None:
+        directory = os.path.join(self.root, str(granary_id))
+        if not os.path.isdir(directory):
+            return
+        for key in [key for key in self._open if os.path.dirname(key[0]) == directory]:
+            self._open.pop(key).close()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    # Reads
+
+    async def segments_in_range(self, session, granary_id: int, start: Optional[datetime], end: Optional[datetime],
+                                descending: bool = False) -> List[str]:
+        """Paths of the granary's segments holding rows with start <= collected_at < end, in month order."""
+        query = select(GranaryDataSegment.path).where(GranaryDataSegment.granary_id == granary_id)
+        if end is not None:
+            query = query.where(GranaryDataSegment.first_collected_at < end)
+        if start is not None:
+            query = query.where(GranaryDataSegment.last_collected_at >= start)
+        month = GranaryDataSegment.month.desc() if descending else GranaryDataSegment.month
+        return (await session.execute(query.order_by(month))).scalars().all()
+
+    def read_segments(self, paths: List[str], start: Optional[datetime],
+                      end: Optional[datetime]) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the rows with start <= collected_at < end one segment at a time."""
+        for path in paths:
+            segment = self.open_segment(path)
+            yield segment.read_rows(segment.window(start or datetime.min, end or datetime.max))
+
+    async def read_range(self, session, granary_id: int, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """Archived rows of a granary with start <= collected_at < end, oldest first."""
+        paths = await self.segments_in_range(session, granary_id, start, end)
+        return [row for rows in self.read_segments(paths, start, end) for row in rows]
+
+    async def read_page(self, session, granary_id: int, start: Optional[datetime], end: Optional[datetime],
+                        after: Optional[Tuple[datetime, int]], limit: int, descending: bool = False) -> List[Dict[str, Any]]:
+        """Up to `limit` archived rows in [start, end) following the (collected_at, id) key `after`,
+        in keyset order. Only the rows returned are decoded."""
+        if after is not None:
+            if descending:
+                bound = after[0] + timedelta(microseconds=1)
+                end = bound if end is None else min(end, bound)
+            else:
+                start = after[0] if start is None else max(start, after[0])
+        rows = []
+        for path in await self.segments_in_range(session, granary_id, start, end, descending):
+            segment = self.open_segment(path)
+            positions = segment.window(start or datetime.min, end or datetime.max)
+            if after is not None and positions.size:
+                stamps = segment.collected_at()[positions]
+                ids = segment.column("id")[positions]
+                after_ts = np.datetime64(after[0], "us")
+                if descending:
+                    positions = positions[(stamps < after_ts) | ((stamps == after_ts) & (ids < after[1]))]
+                else:
+                    positions = positions[(stamps > after_ts) | ((stamps == after_ts) & (ids > after[1]))]
+            if descending:
+                positions = positions[::-1]
+            rows.extend(segment.read_rows(positions[:limit - len(rows)]))
+            if len(rows) >= limit:
+                break
+        return rows
+
+    async def iter_segments(self, session, granary_id: Optional[int] = None):
+        """Yield (granary_id, rows) per archived segment, for rebuilding derived data."""
+        query = select(GranaryDataSegment.granary_id, GranaryDataSegment.path).order_by(
+            GranaryDataSegment.granary_id, GranaryDataSegment.month
+        )
+        if granary_id is not None:
+            query = query.where(GranaryDataSegment.granary_id == granary_id)
+        for segment_granary, path in (await session.execute(query)).all():
+            yield segment_granary, self.open_segment(path).read_rows()
+
+    # Retention job
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        return month_start((now or datetime.utcnow()) - timedelta(days=self.retention_days))
+
+    async def run_once(self, before: Optional[datetime] = None) -> Dict[str, Any]:
+        """Archive every whole month before `before` (default: the retention cutoff)."""
+        started = time.perf_counter()
+        before = month_start(before) if before is not None else self.cutoff()
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(GranaryData.granary_id, func.min(GranaryData.collected_at))
+                .where(GranaryData.collected_at < before)
+                .group_by(GranaryData.granary_id)
+            )
+            oldest = result.all()
+
+        summary = {"before": before, "segments": 0, "rows": 0, "bytes": 0}
+        for granary_id, first in oldest:
+            month = month_start(first)
+            while month < before:
+                rows, size = await self.archive_month(granary_id, month)
+                if rows:
+                    summary["segments"] += 1
+                    summary["rows"] += rows
+                    summary["bytes"] += size
+                month = next_month(month)
+
+        self.runs += 1
+        self.last_run_seconds = time.perf_counter() - started
+        summary["seconds"] = round(self.last_run_seconds, 3)
+        return summary
+
+    async def archive_month(self, granary_id: int, month: datetime) -> Tuple[int, int]:
+        end = next_month(month)
+        in_month = (
+            (GranaryData.granary_id == granary_id)
+            & (GranaryData.collected_at >= month)
+            & (GranaryData.collected_at < end)
+        )
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(*(getattr(GranaryData, field) for field in _FIELDS))
+                .where(in_month)
+                .order_by(GranaryData.collected_at, GranaryData.id)
+            )
+            rows = [dict(row._mapping) for row in result.all()]
+            if not rows:
+                return 0, 0
+            max_id = max(row["id"] for row in rows)
+
+            existing = (await session.execute(
+                select(GranaryDataSegment)
+                .where(GranaryDataSegment.granary_id == granary_id)
+                .where(GranaryDataSegment.month == month)
+            )).scalars().first()
+            if existing is not None:
+                archived_ids = {row["id"] for row in rows}
+                merged = [row for row in self.open_segment(existing.path).read_rows() if row["id"] not in archived_ids]
+                rows = sorted(merged + rows, key=lambda row: (row["collected_at"], row["id"]))
+
+            path = self.segment_path(granary_id, month)
+            content = encode_segment(rows)
+            self._write_file(path, content)
+
+            values = {
+                "path": path,
+                "first_collected_at": rows[0]["collected_at"],
+                "last_collected_at": rows[-1]["collected_at"],
+                "row_count": len(rows),
+                "size_bytes": len(content),
+            }
+            if existing is None:
+                session.add(GranaryDataSegment(granary_id=granary_id, month=month, **values))
+            else:
+                for key, value in values.items():
+                    setattr(existing, key, value)
+
+            archived = select(GranaryData.id).where(in_month).where(GranaryData.id <= max_id)
+            # Alarms keep their granary and timestamp; only the link to the moved row goes
+            await session.execute(
+                update(GranaryAlarm).where(GranaryAlarm.granary_data_id.in_(archived)).values(granary_data_id=None)
+            )
+            deleted = await session.execute(delete(GranaryData).where(in_month).where(GranaryData.id <= max_id))
+            await session.execute(
+                delete(GranaryDataRollup)
+                .where(GranaryDataRollup.granary_id == granary_id)
+                .where(GranaryDataRollup.resolution == "hour")
+                .where(GranaryDataRollup.bucket_start >= month)
+                .where(GranaryDataRollup.bucket_start < end)
+            )
+            await session.commit()
+
+        self.segments_written += 1
+        self.rows_archived += deleted.rowcount
+        self.bytes_written += len(content)
+        logger.info("Archived %d readings of granary %s for %s", deleted.rowcount, granary_id, f"{month:%Y-%m}")
+        return deleted.rowcount, len(content)
+
+    async def vacuum(self) -> None:
+        """Give the space of archived rows back to the filesystem (SQLite only)."""
+        engine = self.session_maker.kw["bind"]
+        if engine.dialect.name != "sqlite":
+            return
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("VACUUM")
+
+    # Lifecycle
+
+    async def start(self) -> None:
+        self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    async def _run_loop(self) -> None:
+        while True:
+            try:
+                summary = await self.run_once()
+                if summary["rows"]:
+                    logger.info("Archive run moved %d readings into %d segments", summary["rows"], summary["segments"])
+            except Exception:
+                logger.exception("Archive run failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retention_days": self.retention_days,
+            "cutoff": self.cutoff(),
+            "runs": self.runs,
+            "segments_written": self.segments_written,
+            "rows_archived": self.rows_archived,
+            "bytes_written": self.bytes_written,
+            "segment_reads": self.segment_reads,
+            "open_segments": len(self._open),
+            "last_run_seconds": round(self.last_run_seconds, 3),
+        }
+
+
+archive_service = ArchiveService()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move old granary readings into archive segment files")
+    parser.add_argument("--before", type=datetime.fromisoformat, default=None,
+                        help="archive whole months before this date (default: the retention cutoff)")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite database afterwards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app.core.db import engine
+    engine.echo = False
+
+    async def run() -> None:
+        summary = await archive_service.run_once(args.before)
+        print(f"Archived {summary['rows']} readings into {summary['segments']} segments ({summary['bytes']} bytes)")
+        if args.vacuum:
+            await archive_service.vacuum()
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
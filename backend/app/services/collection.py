@@ -0,0 +1,326 @@
+"""Scheduled collection sweeps across all granaries.
+
+Every COLLECTION_INTERVAL_SECONDS the scheduler asks each granary's collector
+for a reading. Requests within a depot start at least
+COLLECTION_DEPOT_STAGGER_SECONDS apart because the depot's collectors share a
+bus, and concurrency is capped per depot and globally. Each request has a
+timeout and is retried with backoff. Granaries without both MQTT topics
+configured cannot be asked or answer, so sweeps skip them.
+
+In-flight state is kept in memory; the `collection_status` column goes
+through the write-behind buffer in app.services.granary_state, which also
+keeps the snapshot store and granary listings current.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.future import select
+
+from app.core import config
+from app.core.db import async_session_maker
+from app.models import Granary, GranaryConfig
+from app.services.granary_state import granary_state
+from app.services.ingest import ingestion_service
+
+logger = logging.getLogger(__name__)
+
+IDLE = 0
+COLLECTING = 1
+
+
+@dataclass
+class CollectionTarget:
+    granary_id: int
+    depot_id: int
+    extension_number: Optional[int] = None
+    start_index: Optional[int] = None
+    end_index: Optional[int] = None
+    topic_pub: Optional[str] = None
+    topic_sub: Optional[str] = None
+
+    @property
+    def usable(self) -> bool:
+        """Whether a command can be published and its reading be received."""
+        return bool(self.topic_pub and self.topic_sub)
+
+
+class MqttCollector:
+    """Publishes a collect command on mqtt_topic_pub and waits for the reading
+    to arrive through the ingestion worker."""
+
+    def __init__(self, ingestion=ingestion_service):
+        self.ingestion = ingestion
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+        ingestion.reading_listeners.append(self._on_reading)
+
+    def _on_reading(self, granary_id: int) -> None:
+        for waiter in self._waiters.pop(granary_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def collect(self, target: CollectionTarget) -> None:
+        if not target.topic_pub:
+            raise ValueError(f"Granary {target.granary_id} has no mqtt_topic_pub")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(target.granary_id, []).append(waiter)
+        try:
+            await self.ingestion.publish(target.topic_pub, json.dumps({
+                "command": "collect",
+                "granary_id": target.granary_id,
+                "extension_number": target.extension_number,
+                "start_index": target.start_index,
+                "end_index": target.end_index,
+            }))
+            await waiter
+        finally:
+            waiters = self._waiters.get(target.granary_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+
+
+class FakeCollector:
+    """In-process collector for tests and benchmarks.
+
+    Answers after `latency` seconds (± jitter), fails with probability
+    `failure_rate` and never answers with probability `drop_rate`. When
+    `ingestion` is given, a synthetic reading is pushed through it for every
+    successful request.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0,
+                 drop_rate: float = 0.0, ingestion=None, cables: int = 4, points: int = 4, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.ingestion = ingestion
+        self.cables = cables
+        self.points = points
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.in_flight_by_depot: Dict[int, int] = {}
+        self.max_in_flight_by_depot: Dict[int, int] = {}
+
+    async def collect(self, target: CollectionTarget) -> None:
+        self.requests += 1
+        depot = target.depot_id
+        self.in_flight_by_depot[depot] = self.in_flight_by_depot.get(depot, 0) + 1
+        self.max_in_flight_by_depot[depot] = max(self.max_in_flight_by_depot.get(depot, 0), self.in_flight_by_depot[depot])
+        try:
+            if self.random.random() < self.drop_rate:
+                await asyncio.Event().wait()
+            await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+            if self.random.random() < self.failure_rate:
+                raise ConnectionError("collector did not acknowledge")
+            if self.ingestion is not None and target.topic_sub:
+                values = {str(c): [round(self.random.uniform(15, 22), 1) for _ in range(self.points)]
+                          for c in range(1, self.cables + 1)}
+                await self.ingestion.handle_message(target.topic_sub, json.dumps({"temperature_values": values}))
+        finally:
+            self.in_flight_by_depot[depot] -= 1
+
+
+class CollectionScheduler:
+    def __init__(
+        self,
+        collector=None,
+        session_maker=async_session_maker,
+        interval: float = config.COLLECTION_INTERVAL_SECONDS,
+        global_concurrency: int = config.COLLECTION_GLOBAL_CONCURRENCY,
+        depot_concurrency: int = config.COLLECTION_DEPOT_CONCURRENCY,
+        depot_stagger: float = config.COLLECTION_DEPOT_STAGGER_SECONDS,
+        timeout: float = config.COLLECTION_TIMEOUT_SECONDS,
+        retries: int = config.COLLECTION_RETRIES,
+        retry_backoff: float = config.COLLECTION_RETRY_BACKOFF_SECONDS,
+    ):
+        self.collector = collector
+        self.session_maker = session_maker
+        self.interval = interval
+        self.global_concurrency = global_concurrency
+        self.depot_concurrency = depot_concurrency
+        self.depot_stagger = depot_stagger
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+        self.status: Dict[int, int] = {}
+        self._global_limit: Optional[asyncio.Semaphore] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._sweep_lock = asyncio.Lock()
+        # Sweeps started on request, kept until done
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.cycles = 0
+        self.requests = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.retried = 0
+        self.last_sweep_targets = 0
+        self.last_sweep_skipped = 0
+        self.last_sweep_seconds = 0.0
+        self.last_sweep_started: Optional[float] = None
+        self.sweep_running = False
+
+    # Lifecycle
+
+    async def start(self) -> None:
+        if self.collector is None:
+            self.collector = MqttCollector()
+        self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks)
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+            self._loop_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Anything interrupted mid-request is no longer collecting
+        for granary_id, state in list(self.status.items()):
+            if state != IDLE:
+                self._set_status(granary_id, IDLE)
+
+    def start_sweep(self) -> bool:
+        """Start a sweep in the background; False if one is already running or about to start."""
+        if self.sweep_running or self._sweep_lock.locked() or self._tasks:
+            return False
+        task = asyncio.create_task(self._background_sweep())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _background_sweep(self) -> None:
+        try:
+            await self.sweep()
+        except Exception:
+            logger.exception("Collection sweep failed")
+
+    async def _run_loop(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Collection sweep failed")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    # State
+
+    def _set_status(self, granary_id: int, state: int) -> None:
+        self.status[granary_id] = state
+        granary_state.set_status(granary_id, state)
+
+    # Sweeps
+
+    async def load_targets(self) -> List[CollectionTarget]:
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(
+                    Granary.id, Granary.depot_id,
+                    GranaryConfig.extension_number, GranaryConfig.start_index, GranaryConfig.end_index,
+                    GranaryConfig.mqtt_topic_pub, GranaryConfig.mqtt_topic_sub,
+                )
+                .outerjoin(GranaryConfig, GranaryConfig.granary_id == Granary.id)
+                .order_by(Granary.depot_id, GranaryConfig.extension_number, Granary.id)
+            )
+            return [CollectionTarget(*row) for row in result.all()]
+
+    async def sweep(self, targets: Optional[List[CollectionTarget]] = None) -> Dict[str, Any]:
+        """Collect once from every target, returning a summary of the sweep."""
+        async with self._sweep_lock:
+            if targets is None:
+                targets = await self.load_targets()
+            skipped = sum(1 for target in targets if not target.usable)
+            if skipped:
+                logger.debug("Skipping %d granaries without MQTT topics", skipped)
+                targets = [target for target in targets if target.usable]
+            self._global_limit = asyncio.Semaphore(self.global_concurrency)
+            by_depot: Dict[int, List[CollectionTarget]] = {}
+            for target in targets:
+                by_depot.setdefault(target.depot_id, []).append(target)
+
+            before = (self.succeeded, self.failed)
+            self.sweep_running = True
+            self.last_sweep_started = time.monotonic()
+            try:
+                await asyncio.gather(*(self._sweep_depot(depot_targets) for depot_targets in by_depot.values()))
+            finally:
+                self.sweep_running = False
+                self.last_sweep_seconds = time.monotonic() - self.last_sweep_started
+                self.last_sweep_targets = len(targets)
+                self.last_sweep_skipped = skipped
+                self.cycles += 1
+            return {
+                "targets": len(targets),
+                "skipped": skipped,
+                "succeeded": self.succeeded - before[0],
+                "failed": self.failed - before[1],
+                "seconds": round(self.last_sweep_seconds, 3),
+            }
+
+    async def _sweep_depot(self, targets: List[CollectionTarget]) -> None:
+        depot_limit = asyncio.Semaphore(self.depot_concurrency)
+        tasks = []
+        next_start = time.monotonic()
+        for target in targets:
+            # Space out request starts on the depot's shared collector bus
+            delay = next_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await depot_limit.acquire()
+            next_start = time.monotonic() + self.depot_stagger
+            tasks.append(asyncio.create_task(self._collect_one(target, depot_limit)))
+        await asyncio.gather(*tasks)
+
+    async def _collect_one(self, target: CollectionTarget, depot_limit: asyncio.Semaphore) -> None:
+        try:
+            async with self._global_limit:
+                self._set_status(target.granary_id, COLLECTING)
+                try:
+                    for attempt in range(self.retries + 1):
+                        if attempt:
+                            self.retried += 1
+                            await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                        self.requests += 1
+                        try:
+                            await asyncio.wait_for(self.collector.collect(target), timeout=self.timeout)
+                        except asyncio.TimeoutError:
+                            self.timeouts += 1
+                            continue
+                        except Exception as exc:
+                            logger.debug("Collection from granary %s failed: %s", target.granary_id, exc)
+                            continue
+                        self.succeeded += 1
+                        return
+                    self.failed += 1
+                finally:
+                    self._set_status(target.granary_id, IDLE)
+        finally:
+            depot_limit.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sweep_running": self.sweep_running,
+            "in_flight": sum(1 for state in self.status.values() if state == COLLECTING),
+            "cycles": self.cycles,
+            "interval_seconds": self.interval,
+            "last_sweep_targets": self.last_sweep_targets,
+            "last_sweep_skipped": self.last_sweep_skipped,
+            "last_sweep_seconds": round(self.last_sweep_seconds, 3),
+            "requests": self.requests,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "retried": self.retried,
+            "pending_status_writes": len(granary_state.statuses),
+        }
+
+
+collection_scheduler = CollectionScheduler()
@@ -0,0 +1,151 @@
+"""Per-depot overview for the dashboard.
+
+Granary counts and capacities come from one grouped query over granaries
+and granary_infos joined to depots, collection state and staleness from
+another over the granaries without pending state. Granaries with pending
+state are counted from their rows with the pending values overlaid, as the
+granary listings show them, so a read never waits for the write-behind buffer.
+Latest temperatures come from the snapshot store. The result is cached for
+DEPOT_SUMMARY_TTL_SECONDS, or until a depot or granary is written, and
+concurrent requests for an expired summary share one computation.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.future import select
+
+from app.core import config
+from app.models import Depot, Granary, GranaryInfo
+from app.services.granary_state import granary_state
+from app.services.snapshots import snapshot_store
+
+# Above this many granaries with pending state, all rows are overlaid instead
+MAX_EXCLUDED = 1000
+
+
+def summary_query():
+    per_depot = (
+        select(
+            Granary.depot_id,
+            func.count(Granary.id).label("granary_count"),
+            func.sum(GranaryInfo.design_capacity).label("design_capacity"),
+            func.sum(GranaryInfo.actual_capacity).label("actual_capacity"),
+        )
+        .outerjoin(GranaryInfo, GranaryInfo.granary_id == Granary.id)
+        .group_by(Granary.depot_id)
+        .subquery()
+    )
+    return (
+        select(
+            Depot.id, Depot.name, Depot.province,
+            per_depot.c.granary_count, per_depot.c.design_capacity, per_depot.c.actual_capacity,
+        )
+        .outerjoin(per_depot, per_depot.c.depot_id == Depot.id)
+        .order_by(Depot.id)
+    )
+
+
+def collection_query(exclude=()):
+    query = select(
+        Granary.depot_id,
+        func.sum(case((Granary.collection_status == 1, 1), else_=0)).label("collecting_count"),
+        func.sum(case((Granary.last_collected_at.is_(None), 1), else_=0)).label("never_collected_count"),
+        func.min(Granary.last_collected_at).label("stalest_collected_at"),
+    ).group_by(Granary.depot_id)
+    if exclude:
+        query = query.where(Granary.id.notin_(exclude))
+    return query
+
+
+async def collection_figures(session) -> Dict[int, Dict[str, Any]]:
+    """Per depot: collecting and never-collected counts and the stalest last_collected_at.
+
+    Granaries with pending state are left out of the grouped query and counted
+    from their rows with the pending values overlaid.
+    """
+    pending = sorted(granary_state.pending_ids())
+    figures = {}
+    # With many pending (e.g. right after a sweep), reading every row is cheaper than listing them
+    overlay_all = len(pending) > MAX_EXCLUDED
+    if not overlay_all:
+        figures = {
+            row.depot_id: {
+                "collecting_count": row.collecting_count or 0,
+                "never_collected_count": row.never_collected_count or 0,
+                "stalest_collected_at": row.stalest_collected_at,
+            }
+            for row in (await session.execute(collection_query(pending))).all()
+        }
+        if not pending:
+            return figures
+    query = select(Granary.id, Granary.depot_id, Granary.last_collected_at, Granary.collection_status)
+    result = await session.execute(query if overlay_all else query.where(Granary.id.in_(pending)))
+    for granary_id, depot_id, last_collected_at, collection_status in result.all():
+        granary = granary_state.overlay({
+            "id": granary_id, "last_collected_at": last_collected_at, "collection_status": collection_status,
+        })
+        depot = figures.setdefault(depot_id, {"collecting_count": 0, "never_collected_count": 0,
+                                              "stalest_collected_at": None})
+        if granary["collection_status"] == 1:
+            depot["collecting_count"] += 1
+        collected_at = granary["last_collected_at"]
+        if collected_at is None:
+            depot["never_collected_count"] += 1
+        elif depot["stalest_collected_at"] is None or collected_at < depot["stalest_collected_at"]:
+            depot["stalest_collected_at"] = collected_at
+    return figures
+
+
+class DepotSummaryCache:
+    def __init__(self, ttl: float = config.DEPOT_SUMMARY_TTL_SECONDS):
+        self.ttl = ttl
+        self._summary: Optional[List[Dict[str, Any]]] = None
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+        # Bumped by invalidate(), so a summary computed across a change is not kept
+        self._generation = 0
+
+    def invalidate(self) -> None:
+        """Drop the cached summary; called after depots or granaries are written."""
+        self._expires = 0.0
+        self._generation += 1
+
+    async def get(self, session) -> List[Dict[str, Any]]:
+        if self._summary is not None and time.monotonic() < self._expires:
+            return self._summary
+        async with self._lock:
+            # Another request may have refreshed it while this one waited
+            if self._summary is None or time.monotonic() >= self._expires:
+                generation = self._generation
+                self._summary = await self.compute(session)
+                if generation == self._generation:
+                    self._expires = time.monotonic() + self.ttl
+        return self._summary
+
+    async def compute(self, session) -> List[Dict[str, Any]]:
+        result = await session.execute(summary_query())
+        collection = await collection_figures(session)
+        temperatures = await snapshot_store.depot_temperatures()
+        summary = []
+        for row in result.all():
+            figures = collection.get(row.id, {})
+            maximum, mean = temperatures.get(row.id, (None, None))
+            summary.append({
+                "depot_id": row.id,
+                "name": row.name,
+                "province": row.province,
+                "granary_count": row.granary_count or 0,
+                "collecting_count": figures.get("collecting_count", 0),
+                "never_collected_count": figures.get("never_collected_count", 0),
+                "stalest_collected_at": figures.get("stalest_collected_at"),
+                "design_capacity": row.design_capacity or 0.0,
+                "actual_capacity": row.actual_capacity or 0.0,
+                "latest_temperature_max": round(maximum, 2) if maximum is not None else None,
+                "latest_temperature_avg": round(mean, 2) if mean is not None else None,
+            })
+        return summary
+
+
+depot_summary = DepotSummaryCache()
@@ -0,0 +1,201 @@
+"""Interpolated 2D slices of a reading's cable grid, for heatmaps.
+
+Cables stand in a rows × columns plan, numbered row by row from cable 1, and
+point 1 is the top of every cable. GranaryConfig records the cable and point
+counts but not the plan, so the plan defaults to the most square
+factorisation of the cable count (rows <= columns). A request can pass the
+number of rows instead.
+
+A slice is one of:
+  layer   one point on every cable   -> rows × columns
+  row     a row of cables            -> points × columns
+  column  a column of cables         -> points × rows
+A missing sensor takes the mean of its present neighbours in the slice. The
+slice is then resampled bilinearly to the requested size with two small
+weight matrices, and any sensor still missing carries no weight rather than
+pulling its surroundings towards zero.
+
+Rendered slices are memoised by reading id and slice parameters. A reading
+never changes once written, so entries are only evicted, never invalidated.
+"""
+import json
+import math
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.future import select
+
+from app.core import config
+from app.core.temperature import decode_grid, json_to_grid
+from app.models import GranaryConfig, GranaryData
+from app.services.snapshots import snapshot_store
+
+# (granary id, reading id, axis, index, rows, width, height)
+FieldKey = Tuple[int, int, str, int, Optional[int], int, int]
+
+
+def plan_shape(cable_count: int, rows: Optional[int] = None) -> Tuple[int, int]:
+    """(rows, columns) of the cable plan. A short last row is padded with missing cables."""
+    if rows is None:
+        rows = next(r for r in range(math.isqrt(cable_count), 0, -1) if cable_count % r == 0)
+    elif not 1 <= rows <= cable_count:
+        raise ValueError(f"rows must be between 1 and {cable_count}")
+    return rows, math.ceil(cable_count / rows)
+
+
+def interpolation_weights(size_out: int, size_in: int) -> np.ndarray:
+    """(size_out, size_in) linear interpolation weights with the end samples aligned."""
+    weights = np.zeros((size_out, size_in))
+    if size_in == 1:
+        weights[:, 0] = 1.0
+        return weights
+    position = np.linspace(0.0, size_in - 1, size_out)
+    low = np.minimum(np.floor(position).astype(int), size_in - 2)
+    frac = position - low
+    out = np.arange(size_out)
+    weights[out, low] = 1.0 - frac
+    weights[out, low + 1] = frac
+    return weights
+
+
+def fill_missing(values: np.ndarray) -> np.ndarray:
+    """Replace each NaN with the mean of its present up/down/left/right neighbours, if any."""
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+    padded = np.pad(values, 1, constant_values=np.nan)
+    neighbours = np.stack([padded[:-2, 1:-1], padded[2:, 1:-1], padded[1:-1, :-2], padded[1:-1, 2:]])
+    present = ~np.isnan(neighbours)
+    count = present.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(present, neighbours, 0.0).sum(axis=0) / count
+    return np.where(missing & (count > 0), mean, values)
+
+
+def resample(values: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Bilinear resize of a 2D array that may contain NaN; NaN where no sensor contributes."""
+    values = fill_missing(values)
+    present = ~np.isnan(values)
+    rows = interpolation_weights(height, values.shape[0])
+    cols = interpolation_weights(width, values.shape[1]).T
+    total = rows @ np.where(present, values, 0.0) @ cols
+    weight = rows @ present.astype(float) @ cols
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weight > 1e-9, total / weight, np.nan)
+
+
+def slice_grid(grid: np.ndarray, axis: str, index: int, rows: Optional[int] = None) -> np.ndarray:
+    """2D slice of a cables × points grid; index is 1-based along the axis."""
+    cable_count, point_count = grid.shape
+    plan_rows, plan_cols = plan_shape(cable_count, rows)
+    plan = np.full((plan_rows * plan_cols, point_count), np.nan)
+    plan[:cable_count] = grid
+    plan = plan.reshape(plan_rows, plan_cols, point_count)
+    limit = {"layer": point_count, "row": plan_rows, "column": plan_cols}[axis]
+    if not 1 <= index <= limit:
+        raise ValueError(f"{axis} index must be between 1 and {limit}")
+    if axis == "layer":
+        return plan[:, :, index - 1]
+    if axis == "row":
+        return plan[index - 1, :, :].T
+    return plan[:, index - 1, :].T
+
+
+class FieldService:
+    def __init__(self, max_entries: int = config.FIELD_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[FieldKey, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def _load(self, session, granary_id: int, reading_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        query = select(
+            GranaryData.id, GranaryData.collected_at, GranaryData.temperature_packed, GranaryData.temperature_values,
+        ).where(GranaryData.granary_id == granary_id)
+        if reading_id is None:
+            query = query.order_by(GranaryData.collected_at.desc(), GranaryData.id.desc()).limit(1)
+        else:
+            query = query.where(GranaryData.id == reading_id)
+        row = (await session.execute(query)).first()
+        return dict(row._mapping) if row is not None else None
+
+    async def _grid(self, session, granary_id: int, reading: Dict[str, Any]) -> np.ndarray:
+        if reading["temperature_packed"] is not None:
+            return decode_grid(reading["temperature_packed"])
+        # Legacy JSON readings are laid out with the configured counts
+        layout = (await session.execute(
+            select(GranaryConfig.cable_count, GranaryConfig.cable_point_count)
+            .where(GranaryConfig.granary_id == granary_id)
+        )).first()
+        if reading["temperature_values"] is None or layout is None or not all(layout):
+            raise ValueError("Reading has no temperature grid")
+        return json_to_grid(reading["temperature_values"], *layout)
+
+    async def render(self, session, granary_id: int, reading_id: Optional[int], axis: str, index: int,
+                     width: int, height: int, rows: Optional[int] = None) -> Optional[bytes]:
+        """JSON body of a GranaryField, or None when the reading does not exist.
+        Raises ValueError for a slice the reading's layout cannot provide."""
+        reading = snapshot_store.latest_reading(granary_id) if reading_id is None else None
+        if reading is not None:
+            reading_id = reading["id"]
+        if reading_id is not None:
+            key = (granary_id, reading_id, axis, index, rows, width, height)
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+        if reading is None:
+            reading = await self._load(session, granary_id, reading_id)
+            if reading is None:
+                return None
+        self.misses += 1
+
+        grid = await self._grid(session, granary_id, reading)
+        plan_rows, plan_cols = plan_shape(grid.shape[0], rows)
+        field = resample(slice_grid(grid, axis, index, rows), height, width)
+        present = field[~np.isnan(field)]
+        values = np.round(field, 2).tolist()
+        body = json.dumps({
+            "granary_id": granary_id,
+            "reading_id": reading["id"],
+            "collected_at": reading["collected_at"].isoformat(),
+            "axis": axis,
+            "index": index,
+            "cable_rows": plan_rows,
+            "cable_columns": plan_cols,
+            "cable_points": grid.shape[1],
+            "width": width,
+            "height": height,
+            "min": round(float(present.min()), 2) if present.size else None,
+            "max": round(float(present.max()), 2) if present.size else None,
+            # NaN (no sensor nearby) is the only value not equal to itself
+            "values": [[None if v != v else v for v in line] for line in values],
+        }, separators=(",", ":")).encode()
+
+        key = (granary_id, reading["id"], axis, index, rows, width, height)
+        self._entries[key] = body
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return body
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": sum(len(body) for body in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+field_service = FieldService()
@@ -0,0 +1,205 @@
+"""Bulk granary provisioning from JSON, CSV or XLSX.
+
+Every row is validated first (schema, depot exists, no duplicate depot/name in
+the upload). Valid rows are then written in one transaction with multi-row
+statements: one INSERT ... RETURNING for new granaries, one executemany
+UPDATE for existing ones and one INSERT ... ON CONFLICT (granary_id) per
+config/info table.
+
+A row updates an existing granary when it carries its `id` or when its depot
+already has a granary of the same name; otherwise it creates one. Config and
+info given for an existing granary replace the stored ones.
+
+CSV/XLSX headers are field names (`name`, `depot_id`, `cable_count`, ...) or
+the column comments used in the database (`粮仓名称`, `粮库ID`, `电缆根数`, ...).
+"""
+import csv
+import io
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.future import select
+
+from app.models import Depot, Granary, GranaryConfig, GranaryInfo
+from app.schemas import GranaryCreate
+from app.schemas.granary import GranaryConfigBase, GranaryInfoBase
+
+CONFIG_FIELDS = tuple(GranaryConfigBase.model_fields)
+INFO_FIELDS = tuple(GranaryInfoBase.model_fields)
+GRANARY_FIELDS = ("id", "name", "depot_id", "collection_status")
+
+
+def _header_aliases() -> Dict[str, Tuple[Optional[str], str]]:
+    """Header -> (nested section or None, field name)."""
+    aliases = {}
+    for section, model, fields in ((None, Granary, GRANARY_FIELDS), ("config", GranaryConfig, CONFIG_FIELDS),
+                                   ("info", GranaryInfo, INFO_FIELDS)):
+        for field in fields:
+            aliases[field] = (section, field)
+            if section:
+                aliases[f"{section}.{field}"] = (section, field)
+            comment = model.__table__.c[field].comment
+            if comment:
+                aliases[comment] = (section, field)
+    return aliases
+
+
+HEADER_ALIASES = _header_aliases()
+
+
+def nest_flat_row(flat: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn one spreadsheet row into the nested GranaryCreate shape, dropping empty cells."""
+    row: Dict[str, Any] = {}
+    for header, value in flat.items():
+        if header is None or value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        target = HEADER_ALIASES.get(str(header).strip())
+        if target is None:
+            continue
+        section, field = target
+        value = value.strip() if isinstance(value, str) else value
+        if section is None:
+            row[field] = value
+        else:
+            row.setdefault(section, {})[field] = value
+    return row
+
+
+def parse_csv(content: bytes) -> List[Dict[str, Any]]:
+    text = content.decode("utf-8-sig")
+    return [nest_flat_row(flat) for flat in csv.DictReader(io.StringIO(text))]
+
+
+def parse_xlsx(content: bytes) -> List[Dict[str, Any]]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("XLSX upload requires the openpyxl package")
+    workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    headers = next(rows, None) or ()
+    parsed = []
+    for values in rows:
+        if all(value is None for value in values):
+            continue
+        parsed.append(nest_flat_row(dict(zip(headers, values))))
+    workbook.close()
+    return parsed
+
+
+def _errors(exc: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()]
+
+
+async def validate_rows(session, raw_rows: List[Dict[str, Any]]) -> Tuple[List[Tuple[int, Optional[int], GranaryCreate]], List[Dict[str, Any]]]:
+    """Validate every row, returning (valid entries, per-row results).
+
+    Entries are (row number, existing granary id or None, parsed row); results
+    hold an entry per invalid row.
+    """
+    parsed: List[Tuple[int, Optional[int], GranaryCreate]] = []
+    results: List[Dict[str, Any]] = []
+    for number, raw in enumerate(raw_rows, start=1):
+        try:
+            granary_id = raw.get("id")
+            granary_id = int(granary_id) if granary_id is not None else None
+            parsed.append((number, granary_id, GranaryCreate.model_validate(raw)))
+        except ValidationError as exc:
+            results.append({"row": number, "status": "invalid", "errors": _errors(exc)})
+        except (TypeError, ValueError):
+            results.append({"row": number, "status": "invalid", "errors": ["id: must be an integer"]})
+
+    depot_ids = {row.depot_id for _, _, row in parsed}
+    existing_depots = set()
+    if depot_ids:
+        result = await session.execute(select(Depot.id).where(Depot.id.in_(depot_ids)))
+        existing_depots = set(result.scalars().all())
+
+    keys = {(row.depot_id, row.name) for _, _, row in parsed}
+    ids = {granary_id for _, granary_id, _ in parsed if granary_id is not None}
+    by_key: Dict[Tuple[int, str], int] = {}
+    known_ids = set()
+    if keys:
+        result = await session.execute(
+            select(Granary.id, Granary.depot_id, Granary.name).where(tuple_(Granary.depot_id, Granary.name).in_(keys))
+        )
+        by_key = {(depot_id, name): granary_id for granary_id, depot_id, name in result.all()}
+    if ids:
+        result = await session.execute(select(Granary.id).where(Granary.id.in_(ids)))
+        known_ids = set(result.scalars().all())
+
+    entries = []
+    seen: Dict[Tuple[int, str], int] = {}
+    for number, granary_id, row in parsed:
+        errors = []
+        if row.depot_id not in existing_depots:
+            errors.append(f"depot_id: depot {row.depot_id} does not exist")
+        if granary_id is not None and granary_id not in known_ids:
+            errors.append(f"id: granary {granary_id} does not exist")
+        key = (row.depot_id, row.name)
+        if key in seen:
+            errors.append(f"name: duplicates row {seen[key]} in this upload")
+        seen.setdefault(key, number)
+        if errors:
+            results.append({"row": number, "status": "invalid", "errors": errors})
+            continue
+        entries.append((number, granary_id if granary_id is not None else by_key.get(key), row))
+    return entries, results
+
+
+def _upsert(dialect_name: str, model, columns: Tuple[str, ...]):
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    stmt = dialect.insert(model)
+    return stmt.on_conflict_do_update(
+        index_elements=[model.granary_id],
+        set_={column: stmt.excluded[column] for column in columns},
+    )
+
+
+def _info_values(info: GranaryInfoBase) -> Dict[str, Any]:
+    values = info.model_dump()
+    # Same defaults as create_granary
+    for field in ("rough_rice_yield", "moisture"):
+        if values.get(field) is None:
+            values[field] = 0.0
+    return values
+
+
+async def write_rows(session, entries: List[Tuple[int, Optional[int], GranaryCreate]]) -> List[Dict[str, Any]]:
+    """Insert or update validated entries; the caller commits."""
+    results = []
+    new = [(number, row) for number, granary_id, row in entries if granary_id is None]
+    existing = [(number, granary_id, row) for number, granary_id, row in entries if granary_id is not None]
+
+    ids_by_row: Dict[int, int] = {}
+    if new:
+        result = await session.execute(
+            insert(Granary).returning(Granary.id, sort_by_parameter_order=True),
+            [{"name": row.name, "depot_id": row.depot_id, "collection_status": row.collection_status} for _, row in new],
+        )
+        for (number, _), granary_id in zip(new, result.scalars().all()):
+            ids_by_row[number] = granary_id
+            results.append({"row": number, "status": "created", "id": granary_id})
+    if existing:
+        await session.execute(
+            update(Granary),
+            [{"id": granary_id, "name": row.name, "depot_id": row.depot_id} for _, granary_id, row in existing],
+        )
+        for number, granary_id, _ in existing:
+            ids_by_row[number] = granary_id
+            results.append({"row": number, "status": "updated", "id": granary_id})
+
+    dialect_name = session.bind.dialect.name
+    configs = [{"granary_id": ids_by_row[number], **row.config.model_dump()}
+               for number, _, row in entries if row.config is not None]
+    if configs:
+        await session.execute(_upsert(dialect_name, GranaryConfig, CONFIG_FIELDS), configs)
+    infos = [{"granary_id": ids_by_row[number], **_info_values(row.info)}
+             for number, _, row in entries if row.info is not None]
+    if infos:
+        await session.execute(_upsert(dialect_name, GranaryInfo, INFO_FIELDS), infos)
+
+    results.sort(key=lambda item: item["row"])
+    return results
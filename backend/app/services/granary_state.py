@@ -0,0 +1,243 @@
+"""Write-behind buffer for the hot columns of the granaries table.
+
+Every accepted reading moves a granary's `last_collected_at` and every
+collection request sets its `collection_status` twice. Rather than updating
+the granaries row each time, writers record the new values here. Every
+GRANARY_STATE_FLUSH_SECONDS the buffer writes them in one transaction: one
+executemany UPDATE for the timestamps and one for the statuses. Changes to the
+same granary between flushes collapse into a single row, and a timestamp
+never moves backwards.
+
+Readers see pending values. Granary listings and the depot summary overlay
+them (see app.services.listings and app.services.depot_summary), and the
+snapshot store is updated as they are recorded. Cached listing responses are
+renewed once per flush, not per change.
+
+A crash loses at most the changes since the last successful flush: one flush
+interval, or GRANARY_STATE_MAX_PENDING granaries, since a full buffer wakes
+the flusher early. A failed flush keeps its changes for the next attempt.
+Neither column is the source of truth. On startup `recover` moves
+`last_collected_at` up to each granary's latest stored reading and resets
+`collection_status`, since no collection survives a restart.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import bindparam, or_, update
+
+from app.core import config
+from app.core.db import async_session_maker
+from app.models import Granary
+from app.services.live import live_broker
+from app.services.response_cache import response_cache
+from app.services.snapshots import snapshot_store
+
+logger = logging.getLogger(__name__)
+
+_granaries = Granary.__table__
+
+# Only ever moves the timestamp forward, whatever else wrote it meanwhile
+_ADVANCE_COLLECTED = (
+    update(_granaries)
+    .where(_granaries.c.id == bindparam("granary_id"))
+    .where(or_(_granaries.c.last_collected_at.is_(None), _granaries.c.last_collected_at < bindparam("collected_at")))
+    .values(last_collected_at=bindparam("collected_at"))
+)
+_SET_STATUS = (
+    update(_granaries)
+    .where(_granaries.c.id == bindparam("granary_id"))
+    .values(collection_status=bindparam("status"))
+)
+
+
+class GranaryStateBuffer:
+    def __init__(self, session_maker=async_session_maker, flush_interval: float = config.GRANARY_STATE_FLUSH_SECONDS,
+                 max_pending: int = config.GRANARY_STATE_MAX_PENDING):
+        self.session_maker = session_maker
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.collected: Dict[int, datetime] = {}
+        self.statuses: Dict[int, int] = {}
+        # Changes being written by the current flush, still visible to readers
+        self._flushing_collected: Dict[int, datetime] = {}
+        self._flushing_statuses: Dict[int, int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.recorded = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.last_flush_at: Optional[float] = None
+
+    # Writers
+
+    def record_collected(self, latest: Dict[int, datetime]) -> None:
+        """Record the newest collected_at per granary of a committed batch of readings."""
+        for granary_id, collected_at in latest.items():
+            self.recorded += 1
+            current = self.collected.get(granary_id)
+            if current is not None:
+                self.coalesced += 1
+                if collected_at <= current:
+                    continue
+            self.collected[granary_id] = collected_at
+        self._check_size()
+
+    def set_status(self, granary_id: int, status: int) -> None:
+        self.recorded += 1
+        if granary_id in self.statuses:
+            self.coalesced += 1
+        self.statuses[granary_id] = status
+        snapshot_store.set_status(granary_id, status)
+        self._check_size()
+
+    def discard(self, granary_id: int) -> None:
+        """Forget pending changes for a deleted granary."""
+        self.collected.pop(granary_id, None)
+        self.statuses.pop(granary_id, None)
+
+    def _check_size(self) -> None:
+        if len(self.collected) + len(self.statuses) >= self.max_pending:
+            self._wake.set()
+
+    # Readers
+
+    def overlay(self, granary: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply pending values to a granary dict with id, last_collected_at and collection_status."""
+        granary_id = granary["id"]
+        for pending in (self._flushing_collected, self.collected):
+            collected_at = pending.get(granary_id)
+            if collected_at is not None and (granary["last_collected_at"] is None
+                                             or collected_at > granary["last_collected_at"]):
+                granary["last_collected_at"] = collected_at
+        status = self.statuses.get(granary_id, self._flushing_statuses.get(granary_id))
+        if status is not None:
+            granary["collection_status"] = status
+        return granary
+
+    def pending_ids(self) -> Set[int]:
+        """Granaries with values not yet written."""
+        return (self.collected.keys() | self.statuses.keys()
+                | self._flushing_collected.keys() | self._flushing_statuses.keys())
+
+    # Flushing
+
+    async def flush(self) -> int:
+        """Write every pending change; returns the number of rows written."""
+        async with self._flush_lock:
+            if not self.collected and not self.statuses:
+                return 0
+            collected, self.collected = self.collected, {}
+            statuses, self.statuses = self.statuses, {}
+            self._flushing_collected, self._flushing_statuses = collected, statuses
+            started = time.perf_counter()
+            try:
+                async with self.session_maker() as session:
+                    if collected:
+                        await session.execute(_ADVANCE_COLLECTED, [
+                            {"granary_id": granary_id, "collected_at": collected_at}
+                            for granary_id, collected_at in collected.items()
+                        ])
+                    if statuses:
+                        await session.execute(_SET_STATUS, [
+                            {"granary_id": granary_id, "status": status} for granary_id, status in statuses.items()
+                        ])
+                    await session.commit()
+            except BaseException:
+                # Cancellation as well: the batch may not have been committed
+                self.flush_errors += 1
+                # Keep the batch for the next attempt, under anything recorded since
+                for granary_id, collected_at in collected.items():
+                    current = self.collected.get(granary_id)
+                    if current is None or collected_at > current:
+                        self.collected[granary_id] = collected_at
+                for granary_id, status in statuses.items():
+                    self.statuses.setdefault(granary_id, status)
+                raise
+            finally:
+                self._flushing_collected, self._flushing_statuses = {}, {}
+                # Listings include both columns. Bumping once per batch rather than per record keeps
+                # their cached bodies and ETags usable under steady ingestion, at most a flush behind
+                response_cache.bump("granaries")
+            self.flushes += 1
+            self.rows_written += len(collected) + len(statuses)
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self.last_flush_at = time.monotonic()
+        live_broker.publish_status(statuses)
+        return len(collected) + len(statuses)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to persist granary state")
+
+    # Lifecycle
+
+    async def recover(self) -> int:
+        """Repair what a crash may have lost, from the warmed snapshot store; returns granaries changed."""
+        repaired = set()
+        for granary_id, state in snapshot_store.granaries.items():
+            reading = snapshot_store.latest_reading(granary_id)
+            if reading is not None and (state["last_collected_at"] is None
+                                        or reading["collected_at"] > state["last_collected_at"]):
+                state["last_collected_at"] = reading["collected_at"]
+                self.record_collected({granary_id: reading["collected_at"]})
+                repaired.add(granary_id)
+            if state["collection_status"]:
+                self.set_status(granary_id, 0)
+                repaired.add(granary_id)
+        if repaired:
+            logger.info("Repairing last_collected_at/collection_status of %d granaries", len(repaired))
+            await self.flush()
+        return len(repaired)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Let an in-flight flush finish rather than cancelling it half-written
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to persist granary state on shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self.collected) + len(self.statuses),
+            "pending_collected": len(self.collected),
+            "pending_statuses": len(self.statuses),
+            "max_pending": self.max_pending,
+            "flush_interval_seconds": self.flush_interval,
+            "recorded": self.recorded,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "seconds_since_flush": round(time.monotonic() - self.last_flush_at, 3) if self.last_flush_at else None,
+        }
+
+
+granary_state = GranaryStateBuffer()
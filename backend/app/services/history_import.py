@@ -0,0 +1,536 @@
+"""Bulk import of historical readings from legacy CSV/JSON dumps.
+
+Files are streamed record by record: CSV with a header row, JSON arrays of
+objects or newline-delimited JSON, each optionally gzipped. A record names
+its granary by `granary_id`, by name (`granary_name`, `粮仓名称`) or by
+extension number (`extension_number`, `分机号`), looked up within --depot-id.
+Its reading is either `temperature_values` (an object or list as the API
+takes it, JSON text in CSV) or one "cable-point" column per sensor ("1-1",
+"1-2", ...), plus `collected_at` and optionally `humidity_values` and
+`sequence_number`. Column comments work as headers too (`采集时间`, `温度值`,
+...). Readings that fit the granary's layout are stored packed.
+
+Rows are inserted with executemany in batches of --batch-size, and every
+--chunk-rows records are committed together with the file's checkpoint in
+`granary_data_imports`: the records read and, for CSV and NDJSON, the byte
+offset of the next one. An interrupted import resumes from its checkpoint,
+and a file already imported is recognised by its fingerprint and skipped.
+
+The granary_data indexes are dropped for the load and rebuilt once at the end
+(--keep-indexes to leave them), which also slows the server's reads while it
+runs. Rollups are not maintained per batch either: once every file is loaded,
+the days each granary received readings for are rebuilt
+(rollups.rebuild_range) and last_collected_at moves forward. Alarms are not
+evaluated for history.
+
+Usage (from backend/):
+    python -m app.services.history_import dump-2019.csv.gz dump-2020.json --depot-id 3
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from app.core import encoding
+from app.core.db import async_session_maker
+from app.core.temperature import pack_values
+from app.models import Granary, GranaryConfig, GranaryData, GranaryDataImport
+from app.services import rollups
+from app.services.granary_state import granary_state
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+CHUNK_ROWS = 50000
+MATCHES = ("auto", "id", "extension", "name")
+FINGERPRINT_BYTES = 1 << 20
+READ_SIZE = 1 << 16
+
+_POINT = re.compile(r"^\d+-\d+$")
+
+
+def _aliases() -> Dict[str, str]:
+    aliases = {}
+    fields = [(GranaryData, name) for name in
+              ("granary_id", "collected_at", "sequence_number", "temperature_values", "humidity_values")]
+    for model, name in fields:
+        aliases[name] = name
+        if model.__table__.c[name].comment:
+            aliases[model.__table__.c[name].comment] = name
+    for header in ("granary_name", "granary", "name", Granary.__table__.c.name.comment):
+        aliases[header] = "granary_name"
+    for header in ("extension_number", GranaryConfig.__table__.c.extension_number.comment):
+        aliases[header] = "extension_number"
+    aliases["humidity"] = "humidity_values"
+    return aliases
+
+
+ALIASES = _aliases()
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """ISO 8601, "YYYY/MM/DD HH:MM[:SS]" or epoch (milli)seconds, as naive UTC."""
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = float(text)
+        except ValueError:
+            if text.endswith("Z"):
+                text = text[:-1] + "+00:00"
+            ts = datetime.fromisoformat(text.replace("/", "-"))
+            if ts.tzinfo is not None:
+                ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+            return ts
+    if isinstance(value, (int, float)):
+        if value > 1e11:
+            value = value / 1000.0
+        return datetime.utcfromtimestamp(value)
+    raise ValueError(f"Unsupported timestamp: {value!r}")
+
+
+def fingerprint(path: str) -> str:
+    with open(path, "rb") as handle:
+        head = handle.read(FINGERPRINT_BYTES)
+    return f"{os.path.getsize(path)}:{hashlib.blake2b(head, digest_size=16).hexdigest()}"
+
+
+# Readers: yield (record, byte offset of the next record or None)
+
+class _Lines:
+    """Decoded lines of a binary file, tracking the offset after the last one read."""
+
+    def __init__(self, handle: BinaryIO, offset: int = 0):
+        self.handle = handle
+        self.offset = offset
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            line = self.handle.readline()
+            if not line:
+                return
+            self.offset += len(line)
+            yield line.decode("utf-8-sig")
+
+
+def _csv_records(handle: BinaryIO, offset: Optional[int]) -> Iterator[Tuple[Dict[str, Any], Optional[int]]]:
+    header_line = handle.readline()
+    header = next(csv.reader([header_line.decode("utf-8-sig")]), [])
+    lines = _Lines(handle, len(header_line))
+    if offset:
+        handle.seek(offset)
+        lines.offset = offset
+    for values in csv.reader(lines):
+        if values:
+            yield dict(zip(header, values)), lines.offset
+
+
+def _ndjson_records(handle: BinaryIO, offset: Optional[int]) -> Iterator[Tuple[Dict[str, Any], Optional[int]]]:
+    lines = _Lines(handle)
+    if offset:
+        handle.seek(offset)
+        lines.offset = offset
+    for line in lines:
+        if line.strip():
+            try:
+                record = encoding.loads(line)
+            except ValueError:
+                record = None
+            yield record, lines.offset
+
+
+def _json_array_records(handle: BinaryIO) -> Iterator[Tuple[Dict[str, Any], Optional[int]]]:
+    # One object at a time from a top-level array, never the whole document
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(handle, encoding="utf-8-sig")
+    buffer, pos = reader.read(READ_SIZE), 0
+    pos = buffer.index("[") + 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buffer):
+            more = reader.read(READ_SIZE)
+            if not more:
+                raise ValueError("JSON array is not closed")
+            buffer, pos = more, 0
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            more = reader.read(READ_SIZE)
+            if not more:
+                raise
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        pos = end
+        yield record, None
+
+
+def _open(path: str) -> BinaryIO:
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def read_records(path: str, skip: int = 0, offset: Optional[int] = None) -> Iterator[Tuple[Dict[str, Any], Optional[int]]]:
+    """Records of a dump, resuming at a checkpoint: at `offset` when it has one, else after `skip` records."""
+    name = path[:-3] if path.endswith(".gz") else path
+    with _open(path) as handle:
+        if name.lower().endswith(".csv"):
+            records = _csv_records(handle, offset)
+        else:
+            first = handle.read(READ_SIZE).lstrip().removeprefix(b"\xef\xbb\xbf").lstrip()[:1]
+            handle.seek(0)
+            records = _json_array_records(handle) if first == b"[" else _ndjson_records(handle, offset)
+        for number, item in enumerate(records):
+            if offset is None and number < skip:
+                continue
+            yield item
+
+
+# Mapping records to granary_data rows
+
+class GranaryResolver:
+    """Granary ids and layouts of a depot (or of all depots), by id, extension number and name."""
+
+    def __init__(self, match: str = "auto"):
+        if match not in MATCHES:
+            raise ValueError(f"match must be one of {', '.join(MATCHES)}")
+        self.match = match
+        self.ids: set = set()
+        self.by_name: Dict[str, int] = {}
+        self.by_extension: Dict[int, int] = {}
+        self.layouts: Dict[int, Tuple[Optional[int], Optional[int]]] = {}
+
+    async def load(self, session, depot_id: Optional[int] = None) -> "GranaryResolver":
+        query = (
+            select(Granary.id, Granary.name, GranaryConfig.extension_number,
+                   GranaryConfig.cable_count, GranaryConfig.cable_point_count)
+            .outerjoin(GranaryConfig, GranaryConfig.granary_id == Granary.id)
+        )
+        if depot_id is not None:
+            query = query.where(Granary.depot_id == depot_id)
+        extensions = Counter()
+        for granary_id, name, extension, cables, points in (await session.execute(query)).all():
+            self.ids.add(granary_id)
+            self.by_name[name] = granary_id
+            self.layouts[granary_id] = (cables, points)
+            if extension is not None:
+                extensions[extension] += 1
+                self.by_extension[extension] = granary_id
+        # An extension number shared by two granaries identifies neither
+        for extension, count in extensions.items():
+            if count > 1:
+                del self.by_extension[extension]
+        return self
+
+    def resolve(self, record: Dict[str, Any]) -> Optional[int]:
+        for key in (("granary_id", "extension_number", "granary_name") if self.match == "auto"
+                    else ({"id": "granary_id", "extension": "extension_number", "name": "granary_name"}[self.match],)):
+            value = record.get(key)
+            if value is None or value == "":
+                continue
+            if key == "granary_name":
+                return self.by_name.get(str(value).strip())
+            number = int(value)
+            return (number if number in self.ids else None) if key == "granary_id" else self.by_extension.get(number)
+        return None
+
+
+def _number(value: Any) -> Optional[float]:
+    """A sensor value, or None for an empty or unreadable cell (a missing sensor)."""
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def normalise(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Known fields under their canonical names, with "cable-point" columns gathered into temperature_values."""
+    record: Dict[str, Any] = {}
+    points: Dict[str, Any] = {}
+    for key, value in raw.items():
+        key = str(key).strip()
+        if _POINT.match(key):
+            points[key] = _number(value)
+        elif key in ALIASES:
+            record[ALIASES[key]] = value
+    if any(value is not None for value in points.values()) and not record.get("temperature_values"):
+        record["temperature_values"] = points
+    return record
+
+
+def to_row(record: Dict[str, Any], resolver: GranaryResolver) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """(granary_data row, None), or (None, the reason the record is skipped)."""
+    try:
+        granary_id = resolver.resolve(record)
+    except (TypeError, ValueError):
+        granary_id = None
+    if granary_id is None:
+        return None, "unknown_granary"
+    try:
+        collected_at = parse_timestamp(record.get("collected_at"))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None, "bad_timestamp"
+    values = record.get("temperature_values")
+    if isinstance(values, str):
+        try:
+            values = encoding.loads(values) if values.strip() else None
+        except ValueError:
+            return None, "bad_values"
+    humidity = record.get("humidity_values")
+    sequence = record.get("sequence_number")
+    try:
+        humidity = float(humidity) if humidity not in (None, "") else None
+        sequence = int(sequence) if sequence not in (None, "") else None
+    except (TypeError, ValueError):
+        return None, "bad_values"
+    if values is None and humidity is None:
+        return None, "no_values"
+    packed = pack_values(values, *resolver.layouts.get(granary_id, (None, None)))
+    row = {
+        "granary_id": granary_id,
+        "collected_at": collected_at,
+        "sequence_number": sequence,
+        "temperature_packed": packed,
+        "humidity_values": humidity,
+    }
+    if packed is None:
+        # Only rows that keep JSON carry the column, see HistoryImporter._insert
+        row["temperature_values"] = values
+    return row, None
+
+
+# Import
+
+class HistoryImporter:
+    def __init__(self, session_maker=async_session_maker, depot_id: Optional[int] = None, match: str = "auto",
+                 batch_size: int = BATCH_SIZE, chunk_rows: int = CHUNK_ROWS, defer_indexes: bool = True,
+                 rebuild_rollups: bool = True):
+        self.session_maker = session_maker
+        self.depot_id = depot_id
+        self.resolver = GranaryResolver(match)
+        self.batch_size = batch_size
+        self.chunk_rows = max(chunk_rows, batch_size)
+        self.defer_indexes = defer_indexes
+        self.rebuild_rollups = rebuild_rollups
+        self.skipped: Counter = Counter()
+        self.rows_inserted = 0
+        self.load_seconds = 0.0
+
+    async def run(self, paths: List[str]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        async with self.session_maker() as session:
+            await self.resolver.load(session, self.depot_id)
+        files = []
+        if self.defer_indexes:
+            await self._drop_indexes()
+        try:
+            for path in paths:
+                files.append(await self.import_file(path))
+        finally:
+            if self.defer_indexes:
+                indexing = time.perf_counter()
+                await self._create_indexes()
+                logger.info("Rebuilt granary_data indexes in %.1fs", time.perf_counter() - indexing)
+        finishing = time.perf_counter()
+        granaries = await self.finish()
+        total = time.perf_counter() - started
+        return {
+            "files": files,
+            "rows_inserted": self.rows_inserted,
+            "rows_skipped": dict(self.skipped),
+            "granaries": granaries,
+            "load_seconds": round(self.load_seconds, 3),
+            "finish_seconds": round(time.perf_counter() - finishing, 3),
+            "total_seconds": round(total, 3),
+            "rows_per_second": round(self.rows_inserted / self.load_seconds) if self.load_seconds else 0,
+        }
+
+    async def import_file(self, path: str) -> Dict[str, Any]:
+        key = fingerprint(path)
+        async with self.session_maker() as session:
+            checkpoint = (await session.execute(
+                select(GranaryDataImport).where(GranaryDataImport.fingerprint == key)
+            )).scalars().first()
+            if checkpoint is None:
+                checkpoint = GranaryDataImport(source=os.path.abspath(path), fingerprint=key, status="running",
+                                               records=0, rows_inserted=0, rows_skipped=0, span={})
+                session.add(checkpoint)
+                await session.commit()
+            elif checkpoint.status != "running":
+                logger.info("%s was already imported (%d rows); skipping", path, checkpoint.rows_inserted)
+                return {"path": path, "status": "already imported", "rows_inserted": 0}
+            else:
+                logger.info("Resuming %s after %d records", path, checkpoint.records)
+            checkpoint_id = checkpoint.id
+            state = {
+                "records": checkpoint.records,
+                "offset": checkpoint.offset,
+                "rows_inserted": checkpoint.rows_inserted,
+                "rows_skipped": checkpoint.rows_skipped,
+                "span": dict(checkpoint.span or {}),
+            }
+
+        started = time.perf_counter()
+        inserted = 0
+        records = read_records(path, state["records"], state["offset"])
+        exhausted = False
+        while not exhausted:
+            # One transaction per chunk, committed with the checkpoint it reaches
+            async with self.session_maker() as session:
+                batch: List[Dict[str, Any]] = []
+                read = 0
+                for raw, offset in records:
+                    read += 1
+                    state["records"] += 1
+                    state["offset"] = offset
+                    if isinstance(raw, dict):
+                        row, reason = to_row(normalise(raw), self.resolver)
+                    else:
+                        row, reason = None, "bad_record"
+                    if row is None:
+                        self.skipped[reason] += 1
+                        state["rows_skipped"] += 1
+                    else:
+                        batch.append(row)
+                        if len(batch) >= self.batch_size:
+                            await self._insert(session, batch, state["span"])
+                            inserted += len(batch)
+                            batch = []
+                    if read >= self.chunk_rows:
+                        break
+                else:
+                    exhausted = True
+                if batch:
+                    await self._insert(session, batch, state["span"])
+                    inserted += len(batch)
+                checkpoint = await session.get(GranaryDataImport, checkpoint_id)
+                checkpoint.records = state["records"]
+                checkpoint.offset = state["offset"]
+                checkpoint.rows_inserted = state["rows_inserted"] + inserted
+                checkpoint.rows_skipped = state["rows_skipped"]
+                checkpoint.span = dict(state["span"])
+                checkpoint.updated_at = datetime.utcnow()
+                if exhausted:
+                    checkpoint.status = "loaded"
+                await session.commit()
+            elapsed = time.perf_counter() - started
+            logger.info("%s: %d records read, %d rows inserted (%.0f rows/s)",
+                        path, state["records"], inserted, inserted / elapsed if elapsed else 0)
+
+        seconds = time.perf_counter() - started
+        self.load_seconds += seconds
+        self.rows_inserted += inserted
+        return {
+            "path": path,
+            "status": "loaded",
+            "records": state["records"],
+            "rows_inserted": inserted,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(inserted / seconds) if seconds else 0,
+        }
+
+    async def _insert(self, session, rows: List[Dict[str, Any]], span: Dict[str, List[str]]) -> None:
+        # Packed rows leave temperature_values out: binding NULL through the
+        # JSON type costs more than the rest of the row
+        packed = [row for row in rows if "temperature_values" not in row]
+        legacy = [row for row in rows if "temperature_values" in row]
+        for group in (packed, legacy):
+            if group:
+                await session.execute(insert(GranaryData.__table__), group)
+        for row in rows:
+            stamp = row["collected_at"].isoformat()
+            bounds = span.get(str(row["granary_id"]))
+            if bounds is None:
+                span[str(row["granary_id"])] = [stamp, stamp]
+            elif stamp < bounds[0]:
+                bounds[0] = stamp
+            elif stamp > bounds[1]:
+                bounds[1] = stamp
+
+    async def finish(self) -> int:
+        """Rollups and last_collected_at for every loaded file, including those of earlier runs."""
+        async with self.session_maker() as session:
+            loaded = (await session.execute(
+                select(GranaryDataImport).where(GranaryDataImport.status == "loaded")
+            )).scalars().all()
+            spans: Dict[int, List[datetime]] = {}
+            for checkpoint in loaded:
+                for granary_id, (first, last) in (checkpoint.span or {}).items():
+                    first, last = datetime.fromisoformat(first), datetime.fromisoformat(last)
+                    bounds = spans.setdefault(int(granary_id), [first, last])
+                    bounds[0], bounds[1] = min(bounds[0], first), max(bounds[1], last)
+            loaded_ids = [checkpoint.id for checkpoint in loaded]
+
+        for granary_id, (first, last) in sorted(spans.items()):
+            if self.rebuild_rollups:
+                count = await rollups.rebuild_range(self.session_maker, granary_id, first, last)
+                logger.info("Rebuilt rollups of granary %s from %s to %s (%d readings)", granary_id,
+                            f"{first:%Y-%m-%d}", f"{last:%Y-%m-%d}", count)
+            granary_state.record_collected({granary_id: last})
+        await granary_state.flush()
+
+        async with self.session_maker() as session:
+            for checkpoint_id in loaded_ids:
+                checkpoint = await session.get(GranaryDataImport, checkpoint_id)
+                checkpoint.status = "done"
+                checkpoint.updated_at = datetime.utcnow()
+            await session.commit()
+        return len(spans)
+
+    async def _drop_indexes(self) -> None:
+        engine = self.session_maker.kw["bind"]
+        async with engine.begin() as conn:
+            for index in GranaryData.__table__.indexes:
+                await conn.run_sync(lambda sync_conn, index=index: index.drop(sync_conn, checkfirst=True))
+
+    async def _create_indexes(self) -> None:
+        engine = self.session_maker.kw["bind"]
+        async with engine.begin() as conn:
+            for index in GranaryData.__table__.indexes:
+                await conn.run_sync(lambda sync_conn, index=index: index.create(sync_conn, checkfirst=True))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import historical granary readings from CSV/JSON dumps")
+    parser.add_argument("paths", nargs="+", help=".csv, .json or .ndjson files, optionally gzipped")
+    parser.add_argument("--depot-id", type=int, default=None, help="depot whose granaries names and extension numbers refer to")
+    parser.add_argument("--match", choices=MATCHES, default="auto",
+                        help="how records name their granary (auto: id, then extension number, then name)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per executemany")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="records per transaction and checkpoint")
+    parser.add_argument("--keep-indexes", action="store_true", help="maintain granary_data indexes during the load")
+    parser.add_argument("--skip-rollups", action="store_true", help="leave rollups to `python -m app.services.rollups`")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app.core.db import engine
+    engine.echo = False
+
+    async def run() -> None:
+        importer = HistoryImporter(
+            depot_id=args.depot_id, match=args.match, batch_size=args.batch_size, chunk_rows=args.chunk_rows,
+            defer_indexes=not args.keep_indexes, rebuild_rollups=not args.skip_rollups,
+        )
+        summary = await importer.run(args.paths)
+        print(json.dumps(summary, indent=2))
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from app.core import config, frames
+from app.core.db import async_session_maker, read_session_maker
+from app.core.temperature import encode_grid, pack_values
+from app.models import GranaryAlarm, GranaryConfig, GranaryData
+from app.services import rollups
+from app.services.admission import admission_controller
+from app.services.analysis import analysis_engine
+from app.services.granary_state import granary_state
+from app.services.live import live_broker
+from app.services.snapshots import snapshot_store
+
+logger = logging.getLogger(__name__)
+
+# Window used to report the sustained ingest rate
+RATE_WINDOW_SECONDS = 60.0
+
+
+def _parse_timestamp(value: Any) -> datetime:
+    if value is None:
+        return datetime.utcnow()
+    if isinstance(value, (int, float)):
+        # Collectors may send epoch seconds or epoch milliseconds
+        if value > 1e11:
+            value = value / 1000.0
+        return datetime.utcfromtimestamp(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith("Z"):
+            text = text[:-1]
+        return datetime.fromisoformat(text)
+    raise ValueError(f"Unsupported timestamp: {value!r}")
+
+
+class IngestionService:
+    """Buffers collector readings and writes them to granary_data in batches.
+
+    Readings arrive either from the MQTT subscriber or in-process through
+    `handle_message` / `submit`, as JSON or as raw collector frames decoded
+    with the granary's compiled FrameLayout (see app.core.frames). They are
+    flushed as one multi-row INSERT per batch, so the cost of a commit is
+    shared by every reading in it. A backlog is written batch_size rows per
+    transaction, each taking a bulk write slot (see app.services.admission) so
+    interactive writes are not stuck behind it. The granaries'
+    `last_collected_at` goes through the write-behind buffer in
+    app.services.granary_state rather than this transaction.
+    """
+
+    def __init__(
+        self,
+        session_maker=async_session_maker,
+        batch_size: int = config.INGEST_BATCH_SIZE,
+        flush_interval: float = config.INGEST_FLUSH_INTERVAL,
+        max_buffer: int = config.INGEST_MAX_BUFFER,
+        read_session_maker=None,
+    ):
+        self.session_maker = session_maker
+        # Topics are read apart from the writer, which an API request may hold while it refreshes them
+        self.read_session_maker = read_session_maker or session_maker
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, batch_size)
+
+        self.topic_map: Dict[str, int] = {}
+        self.layouts: Dict[int, Tuple[Optional[int], Optional[int]]] = {}
+        self.frame_layouts: Dict[int, frames.FrameLayout] = {}
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._mqtt_task: Optional[asyncio.Task] = None
+        self._mqtt_client = None
+        # Set when a refresh finds topics to subscribe to, e.g. a granary saved through the API
+        self._topics_changed = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+        # Called with the granary id of every accepted reading (e.g. collection waiters)
+        self.reading_listeners: List[Callable[[int], None]] = []
+
+        self.started_at: Optional[float] = None
+        self.messages_received = 0
+        self.messages_dropped = 0
+        self.frame_checksum_errors = 0
+        self.rows_written = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.last_flush_rows = 0
+        self.last_flush_ms = 0.0
+        self.mqtt_connected = False
+        self._recent_flushes: Deque[Tuple[float, int]] = deque()
+
+    # Lifecycle
+
+    async def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._stopping = False
+        await self.refresh_topics()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        if config.MQTT_BROKER_HOST:
+            self._mqtt_task = asyncio.create_task(self._mqtt_loop())
+
+    async def stop(self) -> None:
+        if self._mqtt_task is not None:
+            self._mqtt_task.cancel()
+            try:
+                await self._mqtt_task
+            except asyncio.CancelledError:
+                pass
+            self._mqtt_task = None
+        if self._flush_task is not None:
+            # Let an in-flight batch finish rather than cancelling it half-written
+            self._stopping = True
+            self._wake.set()
+            await self._flush_task
+            self._flush_task = None
+        # Whatever is still buffered is written before shutdown
+        await self.flush()
+
+    async def refresh_topics(self) -> Dict[str, int]:
+        """Re-read topics and wiring from GranaryConfig; call after granaries or their config change."""
+        # One at a time, so a refresh that started before a commit cannot land after one that saw it
+        async with self._refresh_lock:
+            return await self._refresh_topics()
+
+    async def _refresh_topics(self) -> Dict[str, int]:
+        async with self.read_session_maker() as session:
+            result = await session.execute(
+                select(
+                    GranaryConfig.mqtt_topic_sub,
+                    GranaryConfig.granary_id,
+                    GranaryConfig.cable_count,
+                    GranaryConfig.cable_point_count,
+                    GranaryConfig.extension_number,
+                    GranaryConfig.start_index,
+                    GranaryConfig.end_index,
+                    GranaryConfig.th_index,
+                    GranaryConfig.th_collector_count,
+                )
+                .where(GranaryConfig.mqtt_topic_sub.isnot(None))
+                .where(GranaryConfig.mqtt_topic_sub != "")
+            )
+            rows = result.all()
+        topic_map = {row.mqtt_topic_sub: row.granary_id for row in rows}
+        if topic_map.keys() - self.topic_map.keys():
+            self._topics_changed.set()
+        self.topic_map = topic_map
+        self.layouts = {row.granary_id: (row.cable_count, row.cable_point_count) for row in rows}
+        frame_layouts = {}
+        for row in rows:
+            try:
+                frame_layouts[row.granary_id] = frames.compile_layout(
+                    row.extension_number, row.start_index, row.end_index, row.cable_count,
+                    row.cable_point_count, row.th_index, row.th_collector_count,
+                )
+            except ValueError:
+                # Wiring incomplete: only JSON readings are accepted for this granary
+                pass
+        self.frame_layouts = frame_layouts
+        return self.topic_map
+
+    # Message handling
+
+    def parse_message(self, topic: str, payload: Any) -> Optional[Dict[str, Any]]:
+        """Turn a raw collector message into a granary_data row, or None if unusable."""
+        granary_id = self.topic_map.get(topic)
+        if granary_id is None:
+            return None
+        if isinstance(payload, (bytes, bytearray)) and payload[:2] == frames.SYNC:
+            return self.parse_frames(granary_id, payload)
+        if isinstance(payload, (bytes, bytearray)):
+            payload = payload.decode("utf-8")
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        if not isinstance(payload, dict):
+            return None
+        values = payload.get("temperature_values")
+        # Store the packed grid when the reading fits the configured layout
+        packed = pack_values(values, *self.layouts.get(granary_id, (None, None)))
+        return {
+            "granary_id": granary_id,
+            "collected_at": _parse_timestamp(payload.get("collected_at")),
+            "sequence_number": payload.get("sequence_number"),
+            "temperature_values": None if packed is not None else values,
+            "temperature_packed": packed,
+            "humidity_values": payload.get("humidity_values"),
+        }
+
+    def parse_frames(self, granary_id: int, message: bytes) -> Optional[Dict[str, Any]]:
+        """Turn a collector's raw frames into a granary_data row, or None without a valid cable frame.
+        Raises FrameError for a message that does not fit the granary's wiring."""
+        layout = self.frame_layouts.get(granary_id)
+        if layout is None:
+            return None
+        decoded = frames.decode(layout, message)
+        self.frame_checksum_errors += decoded.checksum_errors
+        if len(decoded.missing_cables) == layout.cable_count:
+            return None
+        return {
+            "granary_id": granary_id,
+            "collected_at": datetime.utcnow(),
+            "sequence_number": None,
+            "temperature_values": None,
+            "temperature_packed": encode_grid(decoded.grid),
+            "humidity_values": decoded.humidity,
+        }
+
+    async def handle_message(self, topic: str, payload: Any) -> bool:
+        try:
+            row = self.parse_message(topic, payload)
+        except (ValueError, TypeError, UnicodeDecodeError):
+            row = None
+        if row is None:
+            self.messages_dropped += 1
+            return False
+        await self.submit(row)
+        for listener in self.reading_listeners:
+            listener(row["granary_id"])
+        return True
+
+    async def publish(self, topic: str, payload: str) -> None:
+        if self._mqtt_client is None:
+            raise ConnectionError("MQTT broker is not connected")
+        await self._mqtt_client.publish(topic, payload)
+
+    async def submit(self, row: Dict[str, Any]) -> None:
+        self._buffer.append(row)
+        self.messages_received += 1
+        if len(self._buffer) >= self.max_buffer:
+            # Apply backpressure to the producer instead of growing without bound.
+            # A failed flush keeps its rows and is counted; the producer carries on.
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Ingestion flush failed")
+        elif len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    # Flushing
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Ingestion flush failed")
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
+            started = time.perf_counter()
+            written = 0
+            try:
+                # One transaction per batch, each taking its turn at the writer after waiting interactive requests
+                while written < len(rows):
+                    batch = rows[written:written + self.batch_size]
+                    async with admission_controller.slot("bulk", bounded=False):
+                        await self._write_batch(batch)
+                    written += len(batch)
+            except Exception:
+                self.flush_errors += 1
+                self.rows_written += written
+                # Put the unwritten rows back so they are retried, keeping the newest readings if full
+                self._buffer[:0] = rows[written:]
+                overflow = len(self._buffer) - self.max_buffer
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self.messages_dropped += overflow
+                raise
+            now = time.monotonic()
+            self.rows_written += len(rows)
+            self.flush_count += 1
+            self.last_flush_rows = len(rows)
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self._recent_flushes.append((now, len(rows)))
+            while self._recent_flushes and now - self._recent_flushes[0][0] > RATE_WINDOW_SECONDS:
+                self._recent_flushes.popleft()
+            return len(rows)
+
+    async def _write_batch(self, rows: List[Dict[str, Any]]) -> None:
+        latest: Dict[int, datetime] = {}
+        for row in rows:
+            current = latest.get(row["granary_id"])
+            if current is None or row["collected_at"] > current:
+                latest[row["granary_id"]] = row["collected_at"]
+
+        async with self.session_maker() as session:
+            result = await session.execute(
+                insert(GranaryData).returning(GranaryData.id, sort_by_parameter_order=True), rows
+            )
+            row_ids = result.scalars().all()
+            committed = [{**row, "id": row_id} for row, row_id in zip(rows, row_ids)]
+            await rollups.apply_readings(session, rollups.readings_from_rows(rows))
+            alarms = analysis_engine.evaluate_rows(committed, snapshot_store.latest_grid)
+            if alarms:
+                await session.execute(insert(GranaryAlarm), alarms)
+            await session.commit()
+        snapshot_store.apply_rows(committed)
+        granary_state.record_collected(latest)
+        live_broker.publish_readings(committed)
+
+    # MQTT
+
+    async def _mqtt_loop(self) -> None:
+        try:
+            import aiomqtt
+        except ImportError:
+            logger.warning("aiomqtt is not installed; MQTT ingestion is disabled")
+            return
+
+        while True:
+            try:
+                async with aiomqtt.Client(
+                    hostname=config.MQTT_BROKER_HOST,
+                    port=config.MQTT_BROKER_PORT,
+                    username=config.MQTT_USERNAME,
+                    password=config.MQTT_PASSWORD,
+                    identifier=config.MQTT_CLIENT_ID,
+                ) as client:
+                    self.mqtt_connected = True
+                    self._mqtt_client = client
+                    subscribed = set()
+                    refresher = asyncio.create_task(self._subscribe_loop(client, subscribed))
+                    try:
+                        async for message in client.messages:
+                            await self.handle_message(message.topic.value, message.payload)
+                    finally:
+                        refresher.cancel()
+            except aiomqtt.MqttError as exc:
+                logger.warning("MQTT connection lost (%s); reconnecting in %ss", exc, config.MQTT_RECONNECT_SECONDS)
+            except Exception:
+                logger.exception("MQTT ingestion failed; reconnecting in %ss", config.MQTT_RECONNECT_SECONDS)
+            finally:
+                self.mqtt_connected = False
+                self._mqtt_client = None
+            await asyncio.sleep(config.MQTT_RECONNECT_SECONDS)
+
+    async def _subscribe_loop(self, client, subscribed: set) -> None:
+        # New topics are subscribed to as soon as a refresh finds them, and topics
+        # written outside the API are picked up by the periodic refresh
+        while True:
+            try:
+                await self.refresh_topics()
+            except Exception:
+                logger.exception("Failed to refresh MQTT topics")
+            self._topics_changed.clear()
+            for topic in self.topic_map.keys() - subscribed:
+                await client.subscribe(topic)
+                subscribed.add(topic)
+            try:
+                await asyncio.wait_for(self._topics_changed.wait(), config.MQTT_TOPIC_REFRESH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    # Stats
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        uptime = now - self.started_at if self.started_at is not None else 0.0
+        window_rows = sum(count for ts, count in self._recent_flushes if now - ts <= RATE_WINDOW_SECONDS)
+        window = min(RATE_WINDOW_SECONDS, uptime) if uptime > 0 else 0.0
+        return {
+            "mqtt_connected": self.mqtt_connected,
+            "subscribed_topics": len(self.topic_map),
+            "buffered": len(self._buffer),
+            "messages_received": self.messages_received,
+            "messages_dropped": self.messages_dropped,
+            "frame_layouts": len(self.frame_layouts),
+            "frame_checksum_errors": self.frame_checksum_errors,
+            "rows_written": self.rows_written,
+            "flush_count": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "messages_per_second": round(window_rows / window, 2) if window > 0 else 0.0,
+            "uptime_seconds": round(uptime, 1),
+            "analysis": analysis_engine.stats(),
+        }
+
+
+ingestion_service = IngestionService(read_session_maker=read_session_maker)
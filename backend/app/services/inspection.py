@@ -0,0 +1,159 @@
+"""Inspection report figures for one granary over one period.
+
+`compute` works on the packed readings of the period alone and touches no
+database, so app.services.reports can run it in worker processes. The readings
+are stacked into one (readings, cables, points) array and reduced to:
+
+- the maximum, minimum and mean temperature of the period, and mean humidity
+- per layer (the same point index across all cables, as in
+  app.services.analysis) maximum, minimum and mean
+- the hottest points: the largest per point maxima, with when they were read
+- changes since the previous report of the same period: the differences of
+  the overall and per layer figures, and the points whose mean rose the most
+
+Means are over every valid sensor value of the period. If the cable layout
+changed during the period, only the readings in the latest layout count.
+"""
+import warnings
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.temperature import HEADER, decode_grid, decode_many, encode_grid
+
+
+def _value(value) -> Optional[float]:
+    value = float(value)
+    return None if value != value else round(value, 2)
+
+
+def _mean(total: np.ndarray, count: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def _delta(current: Optional[float], previous: Optional[float]) -> Optional[float]:
+    return None if current is None or previous is None else round(current - previous, 2)
+
+
+def _top_points(values: np.ndarray, top_n: int) -> List[tuple]:
+    """(cable index, point index) of the top_n largest non-NaN values, largest first."""
+    flat = np.where(np.isnan(values), -np.inf, values).ravel()
+    top_n = min(top_n, int(np.isfinite(flat).sum()))
+    if top_n == 0:
+        return []
+    order = np.argpartition(flat, -top_n)[-top_n:]
+    order = order[np.argsort(flat[order])[::-1]]
+    return [divmod(int(index), values.shape[1]) for index in order]
+
+
+def empty_report() -> Dict[str, Any]:
+    return {
+        "reading_count": 0,
+        "temperature_max": None,
+        "temperature_min": None,
+        "temperature_avg": None,
+        "humidity_avg": None,
+        "layers": [],
+        "hottest": [],
+        "changes": None,
+        "point_avg": None,
+    }
+
+
+def compute(packed: Sequence[bytes], collected_at: Sequence[datetime], humidity: Sequence[Optional[float]],
+            previous: Optional[Dict[str, Any]] = None, top_n: int = 10) -> Dict[str, Any]:
+    """Report figures for the readings of a period, oldest first.
+
+    `previous` is the previous report's temperature_max/min/avg, layers and
+    point_avg, or None. Returns the GranaryReport column values.
+    """
+    if not packed:
+        return empty_report()
+    # Keep the readings in the layout of the latest one
+    layout = packed[-1][:HEADER.size]
+    keep = [i for i, blob in enumerate(packed) if blob[:HEADER.size] == layout]
+    grids = decode_many(packed[i] for i in keep)
+    stamps = [collected_at[i] for i in keep]
+
+    valid = ~np.isnan(grids)
+    filled = np.where(valid, grids, -np.inf)
+    point_max = filled.max(axis=0)
+    point_when = filled.argmax(axis=0)
+    point_min = np.where(valid, grids, np.inf).min(axis=0)
+    point_sum = np.where(valid, grids, 0.0).sum(axis=0, dtype=np.float64)
+    point_count = valid.sum(axis=0)
+    seen = point_count > 0
+    point_max = np.where(seen, point_max, np.nan)
+    point_min = np.where(seen, point_min, np.nan)
+    point_avg = _mean(point_sum, point_count)
+
+    with warnings.catch_warnings():
+        # Layers whose sensors never reported are legitimately all NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        layer_max = np.nanmax(point_max, axis=0)
+        layer_min = np.nanmin(point_min, axis=0)
+    layer_avg = _mean(point_sum.sum(axis=0), point_count.sum(axis=0))
+    layers = [
+        {"layer": layer, "max": _value(high), "min": _value(low), "avg": _value(mean)}
+        for layer, (high, low, mean) in enumerate(zip(layer_max, layer_min, layer_avg), start=1)
+    ]
+
+    hottest = [
+        {
+            "cable": cable + 1,
+            "point": point + 1,
+            "value": _value(point_max[cable, point]),
+            "collected_at": stamps[point_when[cable, point]].isoformat(),
+        }
+        for cable, point in _top_points(point_max, top_n)
+    ]
+
+    humidity = [humidity[i] for i in keep if humidity[i] is not None]
+    report = {
+        "reading_count": len(keep),
+        "temperature_max": _value(np.nanmax(point_max)) if seen.any() else None,
+        "temperature_min": _value(np.nanmin(point_min)) if seen.any() else None,
+        "temperature_avg": _value(point_sum.sum() / point_count.sum()) if seen.any() else None,
+        "humidity_avg": round(sum(humidity) / len(humidity), 2) if humidity else None,
+        "layers": layers,
+        "hottest": hottest,
+        "changes": None,
+        "point_avg": encode_grid(point_avg.astype(np.float32)),
+    }
+    if previous is not None:
+        report["changes"] = changes(report, point_avg, previous, top_n)
+    return report
+
+
+def changes(report: Dict[str, Any], point_avg: np.ndarray, previous: Dict[str, Any], top_n: int) -> Dict[str, Any]:
+    previous_layers = {layer["layer"]: layer["avg"] for layer in previous.get("layers") or []}
+    result = {
+        "previous_period_start": previous["period_start"].isoformat(),
+        "max": _delta(report["temperature_max"], previous.get("temperature_max")),
+        "min": _delta(report["temperature_min"], previous.get("temperature_min")),
+        "avg": _delta(report["temperature_avg"], previous.get("temperature_avg")),
+        "layers": [
+            {"layer": layer["layer"], "avg": _delta(layer["avg"], previous_layers.get(layer["layer"]))}
+            for layer in report["layers"]
+        ],
+        "largest_rises": [],
+    }
+    if previous.get("point_avg") is not None:
+        before = decode_grid(previous["point_avg"])
+        # Point by point only while the layout is unchanged
+        if before.shape == point_avg.shape:
+            rise = point_avg - before
+            result["largest_rises"] = [
+                {
+                    "cable": cable + 1,
+                    "point": point + 1,
+                    "previous": _value(before[cable, point]),
+                    "current": _value(point_avg[cable, point]),
+                    "delta": _value(rise[cable, point]),
+                }
+                for cable, point in _top_points(rise, top_n)
+                if rise[cable, point] > 0
+            ]
+    return result
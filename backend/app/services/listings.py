@@ -0,0 +1,73 @@
+"""Row-tuple queries and renderers for the list endpoints.
+
+Each query selects exactly the columns of the endpoint's response schema, and
+each renderer zips a result row back into the dict that schema would dump.
+Nothing is loaded as an ORM instance or validated by pydantic on the way out,
+and a granary's config and info come from the same query through outer joins
+instead of two extra selectin loads. Granaries carry any last_collected_at
+and collection_status still waiting in the write-behind buffer.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.future import select
+
+from app.models import Depot, Granary, GranaryAlarm, GranaryConfig, GranaryInfo
+from app.schemas import DepotResponse, GranaryAlarmResponse, GranaryConfigResponse
+from app.schemas.granary import GranaryInfoResponse
+from app.services.granary_state import granary_state
+
+DEPOT_FIELDS = tuple(DepotResponse.model_fields)
+GRANARY_FIELDS = ("id", "depot_id", "name", "collection_status", "last_collected_at")
+CONFIG_FIELDS = tuple(GranaryConfigResponse.model_fields)
+INFO_FIELDS = tuple(GranaryInfoResponse.model_fields)
+ALARM_FIELDS = tuple(GranaryAlarmResponse.model_fields)
+
+_CONFIG_START = len(GRANARY_FIELDS)
+_INFO_START = _CONFIG_START + len(CONFIG_FIELDS)
+
+
+def _columns(model, fields: Sequence[str]) -> List[Any]:
+    return [getattr(model, field) for field in fields]
+
+
+def _related(row: Sequence[Any], start: int, fields: Sequence[str]) -> Optional[Dict[str, Any]]:
+    related = dict(zip(fields, row[start:start + len(fields)]))
+    # An outer join without a match leaves every column, including id, NULL
+    return related if related["id"] is not None else None
+
+
+def depots_query():
+    return select(*_columns(Depot, DEPOT_FIELDS)).order_by(Depot.id)
+
+
+def render_depot(row: Sequence[Any]) -> Dict[str, Any]:
+    return dict(zip(DEPOT_FIELDS, row))
+
+
+def granaries_query():
+    return (
+        select(
+            *_columns(Granary, GRANARY_FIELDS),
+            *_columns(GranaryConfig, CONFIG_FIELDS),
+            *_columns(GranaryInfo, INFO_FIELDS),
+        )
+        .outerjoin(GranaryConfig, GranaryConfig.granary_id == Granary.id)
+        .outerjoin(GranaryInfo, GranaryInfo.granary_id == Granary.id)
+        .order_by(Granary.id)
+    )
+
+
+def render_granary(row: Sequence[Any]) -> Dict[str, Any]:
+    granary = dict(zip(GRANARY_FIELDS, row))
+    granary["collection_status"] = granary["collection_status"] or 0
+    granary["config"] = _related(row, _CONFIG_START, CONFIG_FIELDS)
+    granary["info"] = _related(row, _INFO_START, INFO_FIELDS)
+    return granary_state.overlay(granary)
+
+
+def alarms_query():
+    return select(*_columns(GranaryAlarm, ALARM_FIELDS))
+
+
+def render_alarm(row: Sequence[Any]) -> Dict[str, Any]:
+    return dict(zip(ALARM_FIELDS, row))
@@ -0,0 +1,166 @@
+"""In-process fan-out of committed readings and collection status changes.
+
+Clients (WebSocket or SSE, see app.api.endpoints.live) subscribe to granary
+and depot ids. The ingestion worker publishes rows after they are committed,
+and the collection scheduler publishes status changes after they are
+persisted. Each event is rendered once and the same encoded string is queued
+for every matching subscriber, so a write costs one render plus one queue put
+per listener and no database work.
+
+Each subscriber's queue is bounded by LIVE_QUEUE_SIZE. A subscriber that falls
+that far behind has its backlog discarded and receives a single "overflow"
+event instead. It should then reload current state from
+/api/granaries/latest.
+"""
+import asyncio
+import json
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from app.core import config, encoding
+from app.services.snapshots import snapshot_store
+
+# (event type, JSON object with the same "type" field)
+Event = Tuple[str, str]
+
+
+class BrokerFull(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=queue_size)
+        self.granary_ids: Set[int] = set()
+        self.depot_ids: Set[int] = set()
+        self.delivered = 0
+        self.overflows = 0
+        self.dropped = 0
+
+    def offer(self, event: Event) -> bool:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind: replace the backlog with one marker rather than grow
+            dropped = self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflows += 1
+            self.dropped += dropped + 1
+            self.queue.put_nowait(("overflow", json.dumps({"type": "overflow", "dropped": dropped + 1})))
+            return False
+        self.delivered += 1
+        return True
+
+    async def next_event(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Next queued event, or None after `timeout` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LiveBroker:
+    def __init__(self, queue_size: int = config.LIVE_QUEUE_SIZE, max_subscribers: int = config.LIVE_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers: Set[Subscriber] = set()
+        self.by_granary: Dict[int, Set[Subscriber]] = {}
+        self.by_depot: Dict[int, Set[Subscriber]] = {}
+        self.events_published = 0
+        self.deliveries = 0
+        self.overflows = 0
+        self.rejected = 0
+
+    # Subscriptions
+
+    def subscribe(self, granary_ids: Iterable[int] = (), depot_ids: Iterable[int] = ()) -> Subscriber:
+        if len(self.subscribers) >= self.max_subscribers:
+            self.rejected += 1
+            raise BrokerFull(f"{self.max_subscribers} live subscribers already connected")
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        self.update(subscriber, granary_ids, depot_ids)
+        return subscriber
+
+    def update(self, subscriber: Subscriber, granary_ids: Iterable[int] = (), depot_ids: Iterable[int] = (),
+               remove: bool = False) -> None:
+        for ids, index, owned in ((granary_ids, self.by_granary, subscriber.granary_ids),
+                                  (depot_ids, self.by_depot, subscriber.depot_ids)):
+            for key in ids:
+                if remove:
+                    owned.discard(key)
+                    listeners = index.get(key)
+                    if listeners is not None:
+                        listeners.discard(subscriber)
+                        if not listeners:
+                            del index[key]
+                else:
+                    owned.add(key)
+                    index.setdefault(key, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.update(subscriber, list(subscriber.granary_ids), list(subscriber.depot_ids), remove=True)
+        self.subscribers.discard(subscriber)
+
+    def _listeners(self, granary_id: int, depot_id: Optional[int]) -> Set[Subscriber]:
+        listeners = self.by_granary.get(granary_id)
+        by_depot = self.by_depot.get(depot_id) if depot_id is not None else None
+        if listeners and by_depot:
+            return listeners | by_depot
+        return listeners or by_depot or set()
+
+    # Publishing
+
+    def _fan_out(self, listeners: Set[Subscriber], event: Event) -> None:
+        self.events_published += 1
+        for subscriber in listeners:
+            if subscriber.offer(event):
+                self.deliveries += 1
+            else:
+                self.overflows += 1
+
+    def publish_readings(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Push committed granary_data rows (dicts with the column names, including id)."""
+        if not self.subscribers:
+            return
+        for row in rows:
+            granary_id = row["granary_id"]
+            state = snapshot_store.granaries.get(granary_id)
+            depot_id = state["depot_id"] if state is not None else None
+            listeners = self._listeners(granary_id, depot_id)
+            if not listeners:
+                continue
+            reading = snapshot_store.render_reading(granary_id, row)
+            self._fan_out(listeners, ("reading", encoding.dumps(
+                {"type": "reading", "granary_id": granary_id, "depot_id": depot_id, "reading": reading}
+            ).decode()))
+
+    def publish_status(self, changes: Dict[int, int]) -> None:
+        """Push persisted collection_status values keyed by granary id."""
+        if not self.subscribers:
+            return
+        for granary_id, status in changes.items():
+            state = snapshot_store.granaries.get(granary_id)
+            depot_id = state["depot_id"] if state is not None else None
+            listeners = self._listeners(granary_id, depot_id)
+            if listeners:
+                self._fan_out(listeners, ("status", json.dumps(
+                    {"type": "status", "granary_id": granary_id, "depot_id": depot_id, "collection_status": status},
+                    separators=(",", ":"),
+                )))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "max_subscribers": self.max_subscribers,
+            "granaries_watched": len(self.by_granary),
+            "depots_watched": len(self.by_depot),
+            "queued": sum(subscriber.queue.qsize() for subscriber in self.subscribers),
+            "events_published": self.events_published,
+            "deliveries": self.deliveries,
+            "overflows": self.overflows,
+            "rejected": self.rejected,
+        }
+
+
+live_broker = LiveBroker()
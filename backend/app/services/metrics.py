@@ -0,0 +1,290 @@
+"""Request latency histograms and per-request SQL accounting.
+
+`MetricsMiddleware` times every HTTP request and files it under its route
+template (e.g. /api/granaries/{granary_id}), method and status code. Engine
+events count each statement and its time against the request that issued
+it. The request is found through a context variable, which SQLAlchemy's
+async greenlets share with the calling task. Statements run outside a request,
+such as ingestion flushes, are counted as background work.
+
+Everything is served in the Prometheus text format from /metrics. Requests
+slower than METRICS_SLOW_REQUEST_MS are logged with their statements grouped
+by SQL text, and the most recent ones are kept for /api/metrics/slow.
+"""
+import logging
+import re
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+OTHER_STATEMENTS = "(other statements)"
+
+_IN_LIST = re.compile(r"\(\s*(\?|\$\d+|%\(\w+\)s)(\s*,\s*(\?|\$\d+|%\(\w+\)s))+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse whitespace and expanded IN lists so repeats of a query group together."""
+    return _IN_LIST.sub("(?, ...)", _SPACES.sub(" ", statement).strip())
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """Path template of the route that served the request, e.g. /api/granaries/{granary_id}.
+
+    Depending on the FastAPI version the matched route carries either the full
+    template or the one relative to its router's prefix. In the latter case
+    the prefix is the leading segments of the request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and regex.match(path):
+        return template
+    return path.rsplit("/", template.count("/"))[0] + template if template else path
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-on-render histogram keyed by label values."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            # Bucket counts (the last is +Inf), then the sum
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        bounds = [f'le="{_number(bound)}"' for bound in self.buckets] + ['le="+Inf"']
+        for labels, (counts, total) in sorted(self._series.items()):
+            running = 0
+            for bound, count in zip(bounds, counts):
+                running += count
+                yield f"{self.name}_bucket{_labels(self.labels, labels, bound)} {running}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {running}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple[str, ...]) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class RequestStats:
+    """SQL issued while serving one request, keyed by raw statement text."""
+
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Dict[str, List[float]] = {}
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = self.statements.get(statement)
+        if entry is None:
+            if len(self.statements) >= config.METRICS_MAX_STATEMENTS:
+                statement = OTHER_STATEMENTS
+                entry = self.statements.get(statement)
+            if entry is None:
+                entry = self.statements[statement] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        grouped: Dict[str, List[float]] = {}
+        for statement, (count, seconds) in self.statements.items():
+            entry = grouped.setdefault(normalize_statement(statement), [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+        return [
+            {"statement": statement, "count": count, "total_ms": round(seconds * 1000, 3)}
+            for statement, (count, seconds) in sorted(grouped.items(), key=lambda item: -item[1][1])
+        ]
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_sql_stats", default=None)
+
+
+class RequestMetrics:
+    def __init__(self, slow_request_ms: float = config.METRICS_SLOW_REQUEST_MS,
+                 slow_log_size: int = config.METRICS_SLOW_LOG_SIZE):
+        self.slow_request_ms = slow_request_ms
+        self.slow_requests: Deque[Dict[str, Any]] = deque(maxlen=slow_log_size)
+        self.in_progress = 0
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Time to serve an HTTP request.",
+            ("method", "route", "status"), config.METRICS_LATENCY_BUCKETS,
+        )
+        self.request_queries = Histogram(
+            "http_request_db_queries", "SQL statements executed per HTTP request.",
+            ("method", "route"), QUERY_BUCKETS,
+        )
+        self.request_db_seconds = Counter(
+            "http_request_db_seconds_total", "Time spent in SQL statements by HTTP requests.", ("method", "route"),
+        )
+        self.queries = Counter("db_queries_total", "SQL statements executed.", ("context",))
+        self.db_seconds = Counter("db_query_seconds_total", "Time spent in SQL statements.", ("context",))
+
+    # Engine events
+
+    def instrument(self, engine) -> None:
+        sync_engine = getattr(engine, "sync_engine", engine)
+        if event.contains(sync_engine, "after_cursor_execute", self._after_cursor_execute):
+            return
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        stats = _current.get()
+        scope = ("background",) if stats is None else ("request",)
+        self.queries.inc(scope)
+        self.db_seconds.inc(scope, seconds)
+        if stats is not None:
+            stats.add(statement, seconds)
+
+    # Requests
+
+    def begin(self) -> Tuple[RequestStats, Any]:
+        stats = RequestStats()
+        self.in_progress += 1
+        return stats, _current.set(stats)
+
+    def end(self, scope: Dict[str, Any], status: int, seconds: float, stats: RequestStats, token,
+            streaming: bool = False) -> None:
+        _current.reset(token)
+        self.in_progress -= 1
+        route = route_template(scope)
+        method = scope.get("method", "")
+        self.latency.observe((method, route, str(status)), seconds)
+        self.request_queries.observe((method, route), stats.queries)
+        self.request_db_seconds.inc((method, route), stats.db_seconds)
+
+        duration_ms = seconds * 1000
+        # Event streams stay open for as long as the client watches
+        if duration_ms >= self.slow_request_ms and not streaming:
+            entry = {
+                "started_at": datetime.utcnow() - timedelta(seconds=seconds),
+                "method": method,
+                "path": scope.get("path", ""),
+                "route": route,
+                "status": status,
+                "duration_ms": round(duration_ms, 3),
+                "queries": stats.queries,
+                "db_ms": round(stats.db_seconds * 1000, 3),
+                "statements": stats.breakdown(),
+            }
+            self.slow_requests.append(entry)
+            logger.warning(
+                "Slow request %s %s -> %s in %.1f ms, %d queries in %.1f ms%s",
+                method, entry["path"], status, duration_ms, stats.queries, entry["db_ms"],
+                "".join(f"\n  {s['count']:>4} x {s['total_ms']:>9.3f} ms  {s['statement']}" for s in entry["statements"]),
+            )
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_progress HTTP requests being served.",
+            "# TYPE http_requests_in_progress gauge",
+            f"http_requests_in_progress {self.in_progress}",
+        ]
+        for metric in (self.latency, self.request_queries, self.request_db_seconds, self.queries, self.db_seconds):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed to their last chunk."""
+
+    def __init__(self, app, metrics: Optional[RequestMetrics] = None):
+        self.app = app
+        self.metrics = metrics or request_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        streaming = False
+        started = time.perf_counter()
+        stats, token = self.metrics.begin()
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.end(scope, status, time.perf_counter() - started, stats, token, streaming)
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,190 @@
+"""Reading history for one granary: keyset pages and streaming exports.
+
+Pages are ordered by (collected_at, id) and continue from an opaque cursor
+holding the last row's key, so every page costs the same regardless of depth.
+Exports read through a server-side cursor in partitions and yield encoded
+lines as they go, so memory stays flat however long the window is.
+
+Rows moved to archive segments are merged back in key order, so pages and
+exports cover archived months as well. A page reads at most one page of rows
+from the segments; an export holds at most about one segment of them at a
+time. A row present in both places (an archive run that wrote its file but
+did not commit) is returned once.
+"""
+import base64
+import csv
+import heapq
+import io
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from sqlalchemy import and_, or_
+from sqlalchemy.future import select
+
+from app.core import encoding
+from app.core.db import read_session_maker
+from app.core.temperature import decode_grid, grid_to_json
+from app.models import GranaryData
+from app.services.archive import archive_service
+
+EXPORT_PARTITION_SIZE = 1000
+CSV_COLUMNS = ("id", "collected_at", "sequence_number", "humidity_values", "temperature_values")
+
+_COLUMNS = (
+    GranaryData.id,
+    GranaryData.collected_at,
+    GranaryData.sequence_number,
+    GranaryData.temperature_values,
+    GranaryData.temperature_packed,
+    GranaryData.humidity_values,
+)
+
+
+def encode_cursor(collected_at: datetime, row_id: int) -> str:
+    raw = f"{collected_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a malformed cursor."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        ts, _, row_id = base64.urlsafe_b64decode(padded.encode()).decode().partition("|")
+        return datetime.fromisoformat(ts), int(row_id)
+    except (UnicodeDecodeError, ValueError, base64.binascii.Error) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def render_row(row: Mapping[str, Any]) -> Dict[str, Any]:
+    """Render a granary_data row (`Row._mapping`) or an archived row."""
+    values = row["temperature_values"]
+    if row["temperature_packed"] is not None:
+        values = grid_to_json(decode_grid(row["temperature_packed"]))
+    return {
+        "id": row["id"],
+        "collected_at": row["collected_at"],
+        "sequence_number": row["sequence_number"],
+        "temperature_values": values,
+        "humidity_values": row["humidity_values"],
+    }
+
+
+def _key(row: Mapping[str, Any]) -> Tuple[datetime, int]:
+    return row["collected_at"], row["id"]
+
+
+def _unique(rows: Iterable[Mapping[str, Any]], previous: Optional[tuple] = None) -> List[Mapping[str, Any]]:
+    """Drop rows repeating the key before them, as merged streams put duplicates side by side."""
+    unique = []
+    for row in rows:
+        key = _key(row)
+        if key != previous:
+            unique.append(row)
+        previous = key
+    return unique
+
+
+def _window(query, granary_id: int, start: Optional[datetime], end: Optional[datetime]):
+    query = query.where(GranaryData.granary_id == granary_id)
+    if start is not None:
+        query = query.where(GranaryData.collected_at >= start)
+    if end is not None:
+        query = query.where(GranaryData.collected_at < end)
+    return query
+
+
+async def read_page(session, granary_id: int, start: Optional[datetime], end: Optional[datetime],
+                    cursor: Optional[str], limit: int, descending: bool = False) -> Dict[str, Any]:
+    query = _window(select(*_COLUMNS), granary_id, start, end)
+    after = decode_cursor(cursor) if cursor else None
+    if after is not None:
+        after_ts, after_id = after
+        if descending:
+            query = query.where(or_(
+                GranaryData.collected_at < after_ts,
+                and_(GranaryData.collected_at == after_ts, GranaryData.id < after_id),
+            ))
+        else:
+            query = query.where(or_(
+                GranaryData.collected_at > after_ts,
+                and_(GranaryData.collected_at == after_ts, GranaryData.id > after_id),
+            ))
+    if descending:
+        query = query.order_by(GranaryData.collected_at.desc(), GranaryData.id.desc())
+    else:
+        query = query.order_by(GranaryData.collected_at, GranaryData.id)
+
+    # One extra row tells us whether another page exists
+    rows = [row._mapping for row in (await session.execute(query.limit(limit + 1))).all()]
+    archived = await archive_service.read_page(session, granary_id, start, end, after, limit + 1, descending)
+    if archived:
+        rows = _unique(heapq.merge(archived, rows, key=_key, reverse=descending))[:limit + 1]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{**render_row(row), "granary_id": granary_id} for row in rows]
+    next_cursor = encode_cursor(*_key(rows[-1])) if has_more else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def _merge(partitions, archived: Iterator[List[Dict[str, Any]]]) -> AsyncIterator[List[Mapping[str, Any]]]:
+    """Merge streamed partitions with archived batches, both in key order, one partition at a time."""
+    pending: List[Dict[str, Any]] = []
+    previous = None
+    async for partition in partitions:
+        rows = [row._mapping for row in partition]
+        last = _key(rows[-1])
+        # Read segments until the archived rows reach past this partition
+        while not pending or _key(pending[-1]) <= last:
+            batch = next(archived, None)
+            if batch is None:
+                break
+            pending.extend(batch)
+        split = bisect_right([_key(row) for row in pending], last)
+        merged = _unique(heapq.merge(pending[:split], rows, key=_key), previous)
+        del pending[:split]
+        if merged:
+            previous = _key(merged[-1])
+            yield merged
+    for batch in (pending, *archived):
+        merged = _unique(batch, previous)
+        if merged:
+            previous = _key(merged[-1])
+            yield merged
+
+
+async def export_rows(granary_id: int, start: Optional[datetime], end: Optional[datetime],
+                      fmt: str = "ndjson", session_maker=read_session_maker) -> AsyncIterator[Union[str, bytes]]:
+    """Yield the window as NDJSON lines or CSV text, one partition at a time.
+
+    The generator owns its session because a streaming response outlives the
+    request's dependencies.
+    """
+    query = _window(select(*_COLUMNS), granary_id, start, end).order_by(GranaryData.collected_at, GranaryData.id)
+    async with session_maker() as session:
+        # Segments are looked up before the stream holds the connection
+        paths = await archive_service.segments_in_range(session, granary_id, start, end)
+        result = await session.stream(query.execution_options(yield_per=EXPORT_PARTITION_SIZE))
+        batches = _merge(result.partitions(), archive_service.read_segments(paths, start, end))
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(CSV_COLUMNS)
+            async for batch in batches:
+                for row in batch:
+                    item = render_row(row)
+                    writer.writerow((
+                        item["id"],
+                        item["collected_at"].isoformat() if item["collected_at"] else "",
+                        item["sequence_number"],
+                        item["humidity_values"],
+                        encoding.dumps(item["temperature_values"]).decode(),
+                    ))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            async for batch in batches:
+                yield b"".join(encoding.dumps(render_row(row)) + b"\n" for row in batch)
@@ -0,0 +1,352 @@
+"""Daily and weekly inspection reports, computed on a process pool.
+
+A report job covers one depot, one period ("day" or "week", weeks starting on
+Monday) and one period start. It is split into one task per granary: the
+event loop reads the granary's packed readings of the period (from
+granary_data and any archived segments) and its previous report, a worker
+process computes the figures (app.services.inspection), and the loop stores
+them in `granary_reports`, replacing any earlier report of the same period.
+At most REPORT_WORKERS × 2 granaries of all running jobs are in flight at
+once, which keeps every worker busy while a job's readings are loaded, and
+bounds how many granaries' readings are held in memory.
+
+Jobs are started through POST /api/depots/{id}/reports or by the schedule:
+at startup and every day at REPORT_HOUR (UTC) each depot gets a job for the
+previous day and the previous week, which skips granaries already reported,
+so catching up after downtime is cheap. Stored reports are served as they
+are; a job's progress is polled at /api/depots/{id}/reports/jobs/{job_id}.
+Job status is kept in memory for the last REPORT_JOB_HISTORY jobs.
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.future import select
+
+from app.core import config
+from app.core.db import async_session_maker
+from app.models import Depot, Granary, GranaryData, GranaryReport
+from app.schemas import GranaryReportResponse
+from app.services import inspection
+from app.services.archive import archive_service
+from app.services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+PERIODS: Dict[str, timedelta] = {
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+REPORT_FIELDS = tuple(GranaryReportResponse.model_fields)
+
+
+def period_start(ts: datetime, period: str) -> datetime:
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "day":
+        return day
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f"Unknown period: {period}")
+
+
+@dataclass
+class ReportJob:
+    id: str
+    depot_id: int
+    period: str
+    period_start: datetime
+    trigger: str  # request / schedule
+    status: str = "queued"  # queued / running / done / failed
+    total: int = 0
+    completed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @property
+    def key(self) -> Tuple[int, str, datetime]:
+        return self.depot_id, self.period, self.period_start
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = asdict(self)
+        job["period_end"] = self.period_start + PERIODS[self.period]
+        done = self.completed + self.skipped + self.failed
+        job["progress"] = round(done / self.total, 4) if self.total else (1.0 if self.status == "done" else 0.0)
+        return job
+
+
+class ReportEngine:
+    def __init__(self, session_maker=async_session_maker, workers: int = config.REPORT_WORKERS,
+                 top_n: int = config.REPORT_TOP_POINTS, history: int = config.REPORT_JOB_HISTORY):
+        self.session_maker = session_maker
+        self.workers = workers
+        self.top_n = top_n
+        self.history = history
+        self.jobs: "OrderedDict[str, ReportJob]" = OrderedDict()
+        self._active: Dict[Tuple[int, str, datetime], ReportJob] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+        self.granaries_reported = 0
+        self.granaries_failed = 0
+        self.readings_processed = 0
+        self.compute_seconds = 0.0
+        self.last_job_seconds = 0.0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned rather than forked: the parent runs an event loop and
+            # database threads that a forked child would inherit mid-flight
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    # Jobs
+
+    def submit(self, depot_id: int, period: str, start: datetime, force: bool = True,
+               trigger: str = "request") -> ReportJob:
+        """Start a job, or return the one already running for the same depot and period.
+
+        Without `force`, granaries that already have the report are skipped.
+        """
+        start = period_start(start, period)
+        running = self._active.get((depot_id, period, start))
+        if running is not None:
+            return running
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers * 2)
+        job = ReportJob(uuid.uuid4().hex, depot_id, period, start, trigger)
+        self.jobs[job.id] = job
+        self._active[job.key] = job
+        while len(self.jobs) > self.history:
+            oldest = next(iter(self.jobs.values()))
+            if oldest.status in ("queued", "running"):
+                break
+            self.jobs.popitem(last=False)
+        task = asyncio.create_task(self._run_job(job, force))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def job(self, job_id: str) -> Optional[ReportJob]:
+        return self.jobs.get(job_id)
+
+    async def _run_job(self, job: ReportJob, force: bool) -> None:
+        started = time.perf_counter()
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            async with self.session_maker() as session:
+                granary_ids = (await session.execute(
+                    select(Granary.id).where(Granary.depot_id == job.depot_id).order_by(Granary.id)
+                )).scalars().all()
+                reported = set() if force else set((await session.execute(
+                    select(GranaryReport.granary_id)
+                    .where(GranaryReport.granary_id.in_(granary_ids))
+                    .where(GranaryReport.period == job.period)
+                    .where(GranaryReport.period_start == job.period_start)
+                )).scalars().all())
+            job.total = len(granary_ids)
+            job.skipped = len(reported)
+            await asyncio.gather(*(
+                self._report_granary(job, granary_id) for granary_id in granary_ids if granary_id not in reported
+            ))
+            job.status = "done"
+        except Exception as exc:
+            logger.exception("Report job %s for depot %s failed", job.id, job.depot_id)
+            job.status = "failed"
+            job.error = str(exc)
+        finally:
+            job.finished_at = datetime.utcnow()
+            self._active.pop(job.key, None)
+            self.last_job_seconds = time.perf_counter() - started
+
+    async def _report_granary(self, job: ReportJob, granary_id: int) -> None:
+        end = job.period_start + PERIODS[job.period]
+        async with self._slots:
+            try:
+                async with self.session_maker() as session:
+                    readings = await self._readings(session, granary_id, job.period_start, end)
+                    previous = await self._previous(session, granary_id, job.period, job.period_start)
+                if readings:
+                    computing = time.perf_counter()
+                    figures = await asyncio.get_running_loop().run_in_executor(
+                        self._executor(), inspection.compute,
+                        [packed for _, packed, _ in readings],
+                        [collected_at for collected_at, _, _ in readings],
+                        [humidity for _, _, humidity in readings],
+                        previous, self.top_n,
+                    )
+                    self.compute_seconds += time.perf_counter() - computing
+                else:
+                    figures = inspection.empty_report()
+                await self._store(granary_id, job.period, job.period_start, end, figures)
+            except Exception:
+                logger.exception("Report for granary %s (%s %s) failed", granary_id, job.period, job.period_start)
+                job.failed += 1
+                self.granaries_failed += 1
+                return
+        job.completed += 1
+        self.granaries_reported += 1
+        self.readings_processed += len(readings)
+
+    async def _readings(self, session, granary_id: int, start: datetime, end: datetime) -> List[tuple]:
+        """(collected_at, temperature_packed, humidity_values) of the period, oldest first."""
+        readings = [
+            (row["collected_at"], row["temperature_packed"], row["humidity_values"])
+            for row in await archive_service.read_range(session, granary_id, start, end)
+            if row["temperature_packed"] is not None
+        ]
+        result = await session.execute(
+            select(GranaryData.collected_at, GranaryData.temperature_packed, GranaryData.humidity_values)
+            .where(GranaryData.granary_id == granary_id)
+            .where(GranaryData.collected_at >= start)
+            .where(GranaryData.collected_at < end)
+            .where(GranaryData.temperature_packed.isnot(None))
+            .order_by(GranaryData.collected_at)
+        )
+        readings.extend(tuple(row) for row in result.all())
+        readings.sort(key=lambda reading: reading[0])
+        return readings
+
+    async def _previous(self, session, granary_id: int, period: str, start: datetime) -> Optional[Dict[str, Any]]:
+        row = (await session.execute(
+            select(
+                GranaryReport.period_start, GranaryReport.temperature_max, GranaryReport.temperature_min,
+                GranaryReport.temperature_avg, GranaryReport.layers, GranaryReport.point_avg,
+            )
+            .where(GranaryReport.granary_id == granary_id)
+            .where(GranaryReport.period == period)
+            .where(GranaryReport.period_start == start - PERIODS[period])
+            .where(GranaryReport.reading_count > 0)
+        )).first()
+        return dict(row._mapping) if row is not None else None
+
+    async def _store(self, granary_id: int, period: str, start: datetime, end: datetime,
+                     figures: Dict[str, Any]) -> None:
+        async with self.session_maker() as session:
+            report = (await session.execute(
+                select(GranaryReport)
+                .where(GranaryReport.granary_id == granary_id)
+                .where(GranaryReport.period == period)
+                .where(GranaryReport.period_start == start)
+            )).scalars().first()
+            if report is None:
+                report = GranaryReport(granary_id=granary_id, period=period, period_start=start)
+                session.add(report)
+            report.period_end = end
+            report.generated_at = datetime.utcnow()
+            for key, value in figures.items():
+                setattr(report, key, value)
+            await session.commit()
+        response_cache.bump("reports")
+
+    # Stored reports
+
+    async def read(self, session, depot_id: int, period: str, start: Optional[datetime] = None) -> Dict[str, Any]:
+        """A depot's stored reports of one period start, by default the latest one reported."""
+        in_depot = select(Granary.id).where(Granary.depot_id == depot_id)
+        if start is None:
+            start = (await session.execute(
+                select(GranaryReport.period_start)
+                .where(GranaryReport.granary_id.in_(in_depot))
+                .where(GranaryReport.period == period)
+                .order_by(GranaryReport.period_start.desc())
+                .limit(1)
+            )).scalar()
+        else:
+            start = period_start(start, period)
+        reports = []
+        if start is not None:
+            result = await session.execute(
+                select(*(getattr(GranaryReport, name) for name in REPORT_FIELDS))
+                .where(GranaryReport.granary_id.in_(in_depot))
+                .where(GranaryReport.period == period)
+                .where(GranaryReport.period_start == start)
+                .order_by(GranaryReport.granary_id)
+            )
+            reports = [dict(zip(REPORT_FIELDS, row)) for row in result.all()]
+        return {
+            "depot_id": depot_id,
+            "period": period,
+            "period_start": start,
+            "period_end": start + PERIODS[period] if start is not None else None,
+            "reports": reports,
+        }
+
+    # Schedule
+
+    async def schedule_due(self, now: Optional[datetime] = None) -> List[ReportJob]:
+        """Jobs for the previous day and week of every depot, skipping what is already reported."""
+        now = now or datetime.utcnow()
+        async with self.session_maker() as session:
+            depot_ids = (await session.execute(select(Depot.id).order_by(Depot.id))).scalars().all()
+        jobs = []
+        for depot_id in depot_ids:
+            for period, step in PERIODS.items():
+                jobs.append(self.submit(depot_id, period, period_start(now, period) - step, False, "schedule"))
+        return jobs
+
+    def seconds_until_next_run(self, now: Optional[datetime] = None) -> float:
+        now = now or datetime.utcnow()
+        run_at = now.replace(hour=config.REPORT_HOUR, minute=0, second=0, microsecond=0)
+        if run_at <= now:
+            run_at += timedelta(days=1)
+        return (run_at - now).total_seconds()
+
+    async def _run_loop(self) -> None:
+        while True:
+            try:
+                jobs = await self.schedule_due()
+                logger.info("Scheduled %d report jobs", len(jobs))
+            except Exception:
+                logger.exception("Scheduling reports failed")
+            await asyncio.sleep(self.seconds_until_next_run())
+
+    # Lifecycle
+
+    async def start(self) -> None:
+        self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks)
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+            self._loop_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        statuses = [job.status for job in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "pool_started": self._pool is not None,
+            "jobs": len(self.jobs),
+            "jobs_queued": statuses.count("queued"),
+            "jobs_running": statuses.count("running"),
+            "jobs_failed": statuses.count("failed"),
+            "granaries_reported": self.granaries_reported,
+            "granaries_failed": self.granaries_failed,
+            "readings_processed": self.readings_processed,
+            "compute_seconds": round(self.compute_seconds, 3),
+            "last_job_seconds": round(self.last_job_seconds, 3),
+        }
+
+
+report_engine = ReportEngine()
@@ -0,0 +1,107 @@
+"""Rendered responses for list endpoints, with strong ETags.
+
+Entries are keyed by scope (e.g. "depots"), query parameters and the
+negotiated format (JSON or MessagePack, see app.core.encoding) and are valid
+while the scope's version counter is unchanged. Every write that can change a
+scope's output calls `bump(scope)`; a cached body is then ignored and
+replaced on the next request. Clients sending a matching If-None-Match get
+304 Not Modified without a database query or serialisation.
+"""
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.core import config, encoding
+
+
+@dataclass
+class CachedResponse:
+    version: int
+    etag: str
+    body: bytes
+    media_type: str = encoding.JSON
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    # If-None-Match uses the weak comparison
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = config.RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.versions: Dict[str, int] = {}
+        self._entries: "OrderedDict[Tuple[str, Hashable, str], CachedResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+
+    def version(self, scope: str) -> int:
+        return self.versions.get(scope, 0)
+
+    def bump(self, *scopes: str) -> None:
+        for scope in scopes:
+            self.versions[scope] = self.versions.get(scope, 0) + 1
+
+    def _respond(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+        if etag_matches(request, entry.etag):
+            self.not_modified += 1
+            self.bytes_saved += len(entry.body)
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+    def lookup(self, request: Request, scope: str, key: Hashable) -> Optional[Response]:
+        """Response for a still-valid entry, or None if the caller has to render it."""
+        entry_key = (scope, key, encoding.media_type(request))
+        entry = self._entries.get(entry_key)
+        if entry is None or entry.version != self.version(scope):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(entry_key)
+        self.hits += 1
+        return self._respond(request, entry)
+
+    def store(self, request: Request, scope: str, key: Hashable, version: int, payload: Any) -> Response:
+        """Encode a payload read at `version` (taken before querying), cache it and respond with it."""
+        kind = encoding.media_type(request)
+        body = encoding.encode(payload, kind)
+        entry = CachedResponse(version, make_etag(body), body, kind)
+        if version == self.version(scope):
+            entry_key = (scope, key, kind)
+            self._entries[entry_key] = entry
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return self._respond(request, entry)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "versions": dict(self.versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+response_cache = ResponseCache()
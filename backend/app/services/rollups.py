@@ -0,0 +1,435 @@
+"""Hourly and daily min/max/mean rollups of granary temperature readings.
+
+Each rollup row covers one granary, one resolution and one time bucket, and
+keeps per cable point grids of min, max, sum and reading count, so merging new
+readings and computing the mean are both plain array operations.
+
+Backfill from existing history (from backend/):
+    python -m app.services.rollups [--granary-id ID]
+
+`rebuild_range` redoes the days of one granary that a bulk load of history
+(app.services.history_import) wrote to, instead of the whole table.
+"""
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, delete, func, or_
+from sqlalchemy.future import select
+
+from app.core.db import async_session_maker
+from app.core.temperature import decode_grid, encode_grid, grid_to_json, json_to_grid
+from app.models import GranaryConfig, GranaryData, GranaryDataRollup
+from app.services.archive import archive_service
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS: Dict[str, timedelta] = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def bucket_start(ts: datetime, resolution: str) -> datetime:
+    if resolution == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+@dataclass
+class Reading:
+    granary_id: int
+    collected_at: datetime
+    grid: np.ndarray
+    humidity: Optional[float] = None
+
+
+class RollupAccumulator:
+    """Running per-point min/max/sum/count for one bucket."""
+
+    def __init__(self, shape: Tuple[int, int]):
+        self.shape = shape
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.sum = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.uint32)
+        self.reading_count = 0
+        self.humidity_min: Optional[float] = None
+        self.humidity_max: Optional[float] = None
+        self.humidity_sum = 0.0
+        self.humidity_count = 0
+
+    def add(self, grid: np.ndarray, humidity: Optional[float] = None) -> None:
+        valid = ~np.isnan(grid)
+        np.fmin(self.min, grid, out=self.min)
+        np.fmax(self.max, grid, out=self.max)
+        self.sum += np.where(valid, grid, 0.0)
+        self.count += valid
+        self.reading_count += 1
+        if humidity is not None:
+            self._add_humidity(humidity, humidity, humidity, 1)
+
+    def merge(self, other: "RollupAccumulator") -> None:
+        np.fmin(self.min, other.min, out=self.min)
+        np.fmax(self.max, other.max, out=self.max)
+        self.sum += other.sum
+        self.count += other.count
+        self.reading_count += other.reading_count
+        if other.humidity_count:
+            self._add_humidity(other.humidity_min, other.humidity_max, other.humidity_sum, other.humidity_count)
+
+    def _add_humidity(self, low: float, high: float, total: float, count: int) -> None:
+        self.humidity_min = low if self.humidity_min is None else min(self.humidity_min, low)
+        self.humidity_max = high if self.humidity_max is None else max(self.humidity_max, high)
+        self.humidity_sum += total
+        self.humidity_count += count
+
+    @property
+    def mean(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 0, self.sum / np.maximum(self.count, 1), np.nan)
+
+    @classmethod
+    def from_row(cls, row: GranaryDataRollup) -> "RollupAccumulator":
+        low = decode_grid(row.temperature_min).astype(np.float64)
+        acc = cls(low.shape)
+        acc.count = np.frombuffer(row.point_counts, dtype="<u4").reshape(acc.shape).copy()
+        empty = acc.count == 0
+        acc.min = np.where(empty, np.inf, low)
+        acc.max = np.where(empty, -np.inf, decode_grid(row.temperature_max).astype(np.float64))
+        acc.sum = np.frombuffer(row.temperature_sum, dtype="<f8").reshape(acc.shape).copy()
+        acc.reading_count = row.reading_count
+        acc.humidity_min = row.humidity_min
+        acc.humidity_max = row.humidity_max
+        acc.humidity_sum = row.humidity_sum or 0.0
+        acc.humidity_count = row.humidity_count or 0
+        return acc
+
+    def write_to(self, row: GranaryDataRollup) -> None:
+        empty = self.count == 0
+        row.temperature_min = encode_grid(np.where(empty, np.nan, self.min).astype(np.float32))
+        row.temperature_max = encode_grid(np.where(empty, np.nan, self.max).astype(np.float32))
+        row.temperature_sum = self.sum.astype("<f8").tobytes()
+        row.point_counts = self.count.astype("<u4").tobytes()
+        row.reading_count = self.reading_count
+        row.humidity_min = self.humidity_min
+        row.humidity_max = self.humidity_max
+        row.humidity_sum = self.humidity_sum if self.humidity_count else None
+        row.humidity_count = self.humidity_count
+
+
+def accumulate(readings: Iterable[Reading], resolutions: Iterable[str] = tuple(RESOLUTIONS)) -> Dict[Tuple[int, str, datetime], RollupAccumulator]:
+    buckets: Dict[Tuple[int, str, datetime], RollupAccumulator] = {}
+    for reading in readings:
+        for resolution in resolutions:
+            key = (reading.granary_id, resolution, bucket_start(reading.collected_at, resolution))
+            acc = buckets.get(key)
+            if acc is None or acc.shape != reading.grid.shape:
+                acc = buckets[key] = RollupAccumulator(reading.grid.shape)
+            acc.add(reading.grid, reading.humidity)
+    return buckets
+
+
+async def apply_readings(session, readings: Iterable[Reading], resolutions: Iterable[str] = tuple(RESOLUTIONS)) -> int:
+    """Merge readings into their rollup rows. The caller commits."""
+    buckets = accumulate(readings, resolutions)
+    if not buckets:
+        return 0
+
+    granary_ids = {key[0] for key in buckets}
+    starts = {key[2] for key in buckets}
+    result = await session.execute(
+        select(GranaryDataRollup)
+        .where(GranaryDataRollup.granary_id.in_(granary_ids))
+        .where(GranaryDataRollup.bucket_start.in_(starts))
+    )
+    existing = {(r.granary_id, r.resolution, r.bucket_start): r for r in result.scalars().all()}
+
+    for key, acc in buckets.items():
+        row = existing.get(key)
+        if row is None:
+            row = GranaryDataRollup(granary_id=key[0], resolution=key[1], bucket_start=key[2])
+            session.add(row)
+        else:
+            stored = RollupAccumulator.from_row(row)
+            # A changed cable layout starts the bucket over with the new shape
+            if stored.shape == acc.shape:
+                stored.merge(acc)
+                acc = stored
+        acc.write_to(row)
+    return len(buckets)
+
+
+def readings_from_rows(rows: Iterable[Dict[str, Any]]) -> List[Reading]:
+    """Rollup input for freshly ingested granary_data rows that carry a packed grid."""
+    return [
+        Reading(row["granary_id"], row["collected_at"], decode_grid(row["temperature_packed"]), row.get("humidity_values"))
+        for row in rows
+        if row.get("temperature_packed") is not None
+    ]
+
+
+# History queries
+
+def choose_resolution(start: datetime, end: datetime, max_points: int, raw_count: Optional[int] = None) -> str:
+    """Finest resolution whose point count over [start, end) fits in max_points."""
+    if raw_count is not None and raw_count <= max_points:
+        return "raw"
+    span = end - start
+    for resolution, step in RESOLUTIONS.items():
+        if span / step <= max_points:
+            return resolution
+    return "day"
+
+
+def _series_point(ts: datetime, count: int, low: np.ndarray, high: np.ndarray, mean: np.ndarray,
+                  humidity: Optional[float], include_points: bool) -> Dict[str, Any]:
+    def scalar(fn, grid):
+        return None if np.all(np.isnan(grid)) else round(float(fn(grid)), 2)
+
+    point = {
+        "bucket_start": ts,
+        "reading_count": count,
+        "min": scalar(np.nanmin, low),
+        "max": scalar(np.nanmax, high),
+        "mean": scalar(np.nanmean, mean),
+        "humidity_mean": None if humidity is None else round(humidity, 2),
+    }
+    if include_points:
+        point["points"] = {"min": grid_to_json(low), "max": grid_to_json(high), "mean": grid_to_json(mean)}
+    return point
+
+
+async def query_history(session, granary_id: int, start: datetime, end: datetime,
+                        max_points: int = 500, include_points: bool = False) -> Dict[str, Any]:
+    raw_count = None
+    archived = []
+    if (end - start) / RESOLUTIONS["hour"] <= max_points:
+        # Only short windows are candidates for raw readings, which keeps this
+        # count and the read of any archived segments in the window cheap
+        archived = [
+            row for row in await archive_service.read_range(session, granary_id, start, end)
+            if row["temperature_packed"] is not None
+        ]
+        raw_count = len(archived) + (await session.execute(
+            select(func.count(GranaryData.id))
+            .where(GranaryData.granary_id == granary_id)
+            .where(GranaryData.collected_at >= start)
+            .where(GranaryData.collected_at < end)
+            .where(GranaryData.temperature_packed.isnot(None))
+        )).scalar_one()
+    resolution = choose_resolution(start, end, max_points, raw_count)
+
+    series = []
+    if resolution == "raw":
+        result = await session.execute(
+            select(GranaryData.collected_at, GranaryData.temperature_packed, GranaryData.humidity_values)
+            .where(GranaryData.granary_id == granary_id)
+            .where(GranaryData.collected_at >= start)
+            .where(GranaryData.collected_at < end)
+            .where(GranaryData.temperature_packed.isnot(None))
+            .order_by(GranaryData.collected_at)
+        )
+        readings = [(row["collected_at"], row["temperature_packed"], row["humidity_values"]) for row in archived]
+        readings.extend(result.all())
+        readings.sort(key=lambda reading: reading[0])
+        for collected_at, packed, humidity in readings:
+            grid = decode_grid(packed)
+            series.append(_series_point(collected_at, 1, grid, grid, grid, humidity, include_points))
+    else:
+        result = await session.execute(
+            select(GranaryDataRollup)
+            .where(GranaryDataRollup.granary_id == granary_id)
+            .where(GranaryDataRollup.resolution == resolution)
+            .where(GranaryDataRollup.bucket_start >= bucket_start(start, resolution))
+            .where(GranaryDataRollup.bucket_start < end)
+            .order_by(GranaryDataRollup.bucket_start)
+        )
+        buckets = {row.bucket_start: RollupAccumulator.from_row(row) for row in result.scalars().all()}
+        if archived:
+            # Hourly rollups of archived months are dropped with their readings;
+            # rebuild those buckets from the segment rows already loaded
+            for (_, _, start_of_bucket), acc in accumulate(
+                (Reading(granary_id, row["collected_at"], decode_grid(row["temperature_packed"]), row["humidity_values"])
+                 for row in archived),
+                (resolution,),
+            ).items():
+                stored = buckets.get(start_of_bucket)
+                if stored is not None and stored.shape == acc.shape:
+                    stored.merge(acc)
+                else:
+                    buckets[start_of_bucket] = acc
+        for start_of_bucket in sorted(buckets):
+            acc = buckets[start_of_bucket]
+            empty = acc.count == 0
+            humidity = acc.humidity_sum / acc.humidity_count if acc.humidity_count else None
+            series.append(_series_point(
+                start_of_bucket, acc.reading_count,
+                np.where(empty, np.nan, acc.min), np.where(empty, np.nan, acc.max), acc.mean,
+                humidity, include_points,
+            ))
+
+    return {"granary_id": granary_id, "resolution": resolution, "start": start, "end": end, "series": series}
+
+
+# Backfill
+
+async def backfill(session_maker=async_session_maker, granary_id: Optional[int] = None,
+                   chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """Rebuild rollups from archived segments and granary_data, optionally for a single granary.
+
+    Existing rollups are cleared and the high-water id captured in one
+    transaction, so readings ingested while the backfill runs are counted once.
+    """
+    async with session_maker() as session:
+        layouts = {
+            gid: (cables, points)
+            for gid, cables, points in (await session.execute(
+                select(GranaryConfig.granary_id, GranaryConfig.cable_count, GranaryConfig.cable_point_count)
+            )).all()
+        }
+        clear = delete(GranaryDataRollup)
+        high_water = select(func.max(GranaryData.id))
+        if granary_id is not None:
+            clear = clear.where(GranaryDataRollup.granary_id == granary_id)
+            high_water = high_water.where(GranaryData.granary_id == granary_id)
+        await session.execute(clear)
+        max_id = (await session.execute(high_water)).scalar_one() or 0
+        await session.commit()
+
+    processed = 0
+    async with session_maker() as session:
+        async for segment_granary, rows in archive_service.iter_segments(session, granary_id):
+            readings = [
+                Reading(segment_granary, row["collected_at"], decode_grid(row["temperature_packed"]), row["humidity_values"])
+                for row in rows if row["temperature_packed"] is not None
+            ]
+            # Archived months keep daily rollups only, see app.services.archive
+            await apply_readings(session, readings, ("day",))
+            await session.commit()
+            processed += len(readings)
+
+    last_id = 0
+    while last_id < max_id:
+        async with session_maker() as session:
+            query = (
+                select(
+                    GranaryData.id, GranaryData.granary_id, GranaryData.collected_at,
+                    GranaryData.temperature_packed, GranaryData.temperature_values, GranaryData.humidity_values,
+                )
+                .where(GranaryData.id > last_id)
+                .where(GranaryData.id <= max_id)
+                .order_by(GranaryData.id)
+                .limit(chunk_size)
+            )
+            if granary_id is not None:
+                query = query.where(GranaryData.granary_id == granary_id)
+            rows = (await session.execute(query)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            readings = []
+            for row in rows:
+                if row.temperature_packed is not None:
+                    grid = decode_grid(row.temperature_packed)
+                else:
+                    cables, points = layouts.get(row.granary_id, (None, None))
+                    if row.temperature_values is None or not cables or not points:
+                        continue
+                    try:
+                        grid = json_to_grid(row.temperature_values, cables, points)
+                    except (ValueError, TypeError):
+                        continue
+                readings.append(Reading(row.granary_id, row.collected_at, grid, row.humidity_values))
+
+            await apply_readings(session, readings)
+            await session.commit()
+            processed += len(readings)
+            logger.info("Rolled up %d readings (up to id %d of %d)", processed, last_id, max_id)
+    return processed
+
+
+async def rebuild_range(session_maker, granary_id: int, start: datetime, end: datetime,
+                        chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """Rebuild one granary's rollups for the whole days from start to end (inclusive).
+
+    Readings are read in (collected_at, id) order through the time-series
+    index, so the cost follows the window rather than the table.
+    """
+    first = bucket_start(start, "day")
+    last = bucket_start(end, "day") + RESOLUTIONS["day"]
+    async with session_maker() as session:
+        await session.execute(
+            delete(GranaryDataRollup)
+            .where(GranaryDataRollup.granary_id == granary_id)
+            .where(GranaryDataRollup.bucket_start >= first)
+            .where(GranaryDataRollup.bucket_start < last)
+        )
+        max_id = (await session.execute(
+            select(func.max(GranaryData.id)).where(GranaryData.granary_id == granary_id)
+        )).scalar_one() or 0
+        archived = [
+            Reading(granary_id, row["collected_at"], decode_grid(row["temperature_packed"]), row["humidity_values"])
+            for row in await archive_service.read_range(session, granary_id, first, last)
+            if row["temperature_packed"] is not None
+        ]
+        # Archived months keep daily rollups only, see app.services.archive
+        await apply_readings(session, archived, ("day",))
+        await session.commit()
+
+    processed = len(archived)
+    after: Optional[Tuple[datetime, int]] = None
+    while True:
+        async with session_maker() as session:
+            query = (
+                select(GranaryData.id, GranaryData.collected_at, GranaryData.temperature_packed, GranaryData.humidity_values)
+                .where(GranaryData.granary_id == granary_id)
+                .where(GranaryData.collected_at >= first)
+                .where(GranaryData.collected_at < last)
+                .where(GranaryData.id <= max_id)
+                .where(GranaryData.temperature_packed.isnot(None))
+                .order_by(GranaryData.collected_at, GranaryData.id)
+                .limit(chunk_size)
+            )
+            if after is not None:
+                query = query.where(or_(
+                    GranaryData.collected_at > after[0],
+                    and_(GranaryData.collected_at == after[0], GranaryData.id > after[1]),
+                ))
+            rows = (await session.execute(query)).all()
+            if not rows:
+                break
+            after = rows[-1].collected_at, rows[-1].id
+            await apply_readings(session, [
+                Reading(granary_id, row.collected_at, decode_grid(row.temperature_packed), row.humidity_values)
+                for row in rows
+            ])
+            await session.commit()
+            processed += len(rows)
+    return processed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild granary temperature rollups from history")
+    parser.add_argument("--granary-id", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app.core.db import engine
+    engine.echo = False
+    count = asyncio.run(backfill(granary_id=args.granary_id, chunk_size=args.chunk_size))
+    print(f"Rolled up {count} readings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Process-local store of the latest reading per granary.
+
+Granary membership (depot, name, status, last_collected_at) is kept for every
+granary so depot filters never need the database. Latest readings are kept as
+packed bytes in an LRU bounded by `max_entries`; a reading evicted from it is
+reloaded from the database on the next request and counted as a miss.
+The max, sum and point count of each granary's latest packed grid are kept
+outside the LRU so depot-level temperature figures never need the readings;
+the same figures feed the cross-granary temperature index.
+"""
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.future import select
+
+from app.core import config
+from app.core.db import read_session_maker
+from app.core.temperature import decode_grid, grid_to_json
+from app.models import Granary, GranaryData
+from app.services.temperature_index import temperature_index
+
+logger = logging.getLogger(__name__)
+
+_READING_FIELDS = ("id", "collected_at", "sequence_number", "temperature_values", "temperature_packed", "humidity_values")
+
+# Placeholder for a granary that has no readings yet, so it is not a miss on every request
+_NO_READING = {field: None for field in _READING_FIELDS}
+_NO_READING["collected_at"] = datetime.min
+
+
+class SnapshotStore:
+    def __init__(self, session_maker=read_session_maker, max_entries: int = config.SNAPSHOT_MAX_ENTRIES):
+        self.session_maker = session_maker
+        self.max_entries = max_entries
+        self.granaries: Dict[int, Dict[str, Any]] = {}
+        self.depots: Dict[int, set] = {}
+        self.readings: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # granary_id -> (collected_at, max, sum, points) of the latest packed reading
+        self.temperatures: Dict[int, Tuple[datetime, float, float, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reading_bytes = 0
+        self.warmed = False
+
+    # Granary membership
+
+    def upsert_granary(self, granary_id: int, depot_id: int, name: str,
+                       collection_status: Optional[int] = 0, last_collected_at: Optional[datetime] = None) -> None:
+        current = self.granaries.get(granary_id)
+        if current is not None and current["depot_id"] != depot_id:
+            self.depots.get(current["depot_id"], set()).discard(granary_id)
+        self.granaries[granary_id] = {
+            "granary_id": granary_id,
+            "depot_id": depot_id,
+            "name": name,
+            "collection_status": collection_status or 0,
+            "last_collected_at": last_collected_at,
+        }
+        self.depots.setdefault(depot_id, set()).add(granary_id)
+        temperature_index.set_granary(granary_id, depot_id, name)
+        if current is None and self.warmed:
+            self._put_reading(granary_id, _NO_READING.copy())
+
+    def remove_granary(self, granary_id: int) -> None:
+        current = self.granaries.pop(granary_id, None)
+        if current is not None:
+            self.depots.get(current["depot_id"], set()).discard(granary_id)
+        self._drop_reading(granary_id)
+        self.temperatures.pop(granary_id, None)
+        temperature_index.remove_granary(granary_id)
+
+    def remove_depot(self, depot_id: int) -> None:
+        for granary_id in list(self.depots.pop(depot_id, ())):
+            self.remove_granary(granary_id)
+        temperature_index.remove_depot(depot_id)
+
+    def set_status(self, granary_id: int, collection_status: int) -> None:
+        state = self.granaries.get(granary_id)
+        if state is not None:
+            state["collection_status"] = collection_status
+
+    # Readings
+
+    def _drop_reading(self, granary_id: int) -> None:
+        reading = self.readings.pop(granary_id, None)
+        if reading is not None:
+            self.reading_bytes -= reading["size"]
+
+    def _put_reading(self, granary_id: int, reading: Dict[str, Any]) -> None:
+        current = self.readings.get(granary_id)
+        if current is not None and reading["collected_at"] < current["collected_at"]:
+            # Late or backfilled readings never replace a newer snapshot
+            self.readings.move_to_end(granary_id)
+            return
+        self._drop_reading(granary_id)
+        packed = reading.get("temperature_packed")
+        reading["size"] = len(packed) if packed is not None else 0
+        if packed is not None:
+            self._put_temperature(granary_id, reading["collected_at"], packed)
+        self.readings[granary_id] = reading
+        self.reading_bytes += reading["size"]
+        while len(self.readings) > self.max_entries:
+            _, evicted = self.readings.popitem(last=False)
+            self.reading_bytes -= evicted["size"]
+            self.evictions += 1
+
+    def _put_temperature(self, granary_id: int, collected_at: datetime, packed: bytes) -> None:
+        current = self.temperatures.get(granary_id)
+        if current is not None and collected_at < current[0]:
+            return
+        values = decode_grid(packed)
+        values = values[~np.isnan(values)]
+        if values.size:
+            self.temperatures[granary_id] = (collected_at, float(values.max()), float(values.sum()), int(values.size))
+            temperature_index.record(granary_id, collected_at, float(values.max()), float(values.mean()))
+        else:
+            self.temperatures.pop(granary_id, None)
+            temperature_index.discard(granary_id)
+
+    def apply_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Record committed granary_data rows (dicts with the column names)."""
+        for row in rows:
+            granary_id = row["granary_id"]
+            self._put_reading(granary_id, {field: row.get(field) for field in _READING_FIELDS})
+            state = self.granaries.get(granary_id)
+            if state is not None and (state["last_collected_at"] is None or row["collected_at"] > state["last_collected_at"]):
+                state["last_collected_at"] = row["collected_at"]
+
+    def latest_reading(self, granary_id: int) -> Optional[Dict[str, Any]]:
+        """The cached latest reading (column name -> value), or None if absent or evicted."""
+        reading = self.readings.get(granary_id)
+        if reading is None or reading["id"] is None:
+            return None
+        return reading
+
+    def latest_grid(self, granary_id: int):
+        """(collected_at, grid) of the cached latest reading, or None."""
+        reading = self.readings.get(granary_id)
+        if reading is None or reading["temperature_packed"] is None:
+            return None
+        return reading["collected_at"], decode_grid(reading["temperature_packed"])
+
+    # Loading
+
+    async def warm(self) -> None:
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(Granary.id, Granary.depot_id, Granary.name, Granary.collection_status, Granary.last_collected_at)
+            )
+            self.granaries.clear()
+            self.depots.clear()
+            temperature_index.clear()
+            try:
+                for row in result.all():
+                    self.upsert_granary(*row)
+                self.readings.clear()
+                self.temperatures.clear()
+                self.reading_bytes = 0
+                for granary_id in self.granaries:
+                    self._put_reading(granary_id, _NO_READING.copy())
+                await self._load_readings(session, None)
+            except BaseException:
+                # Keep the index filing updates to what was loaded until the next warm
+                temperature_index.rebuild()
+                raise
+            await temperature_index.warm(session)
+        self.warmed = True
+
+    async def _load_readings(self, session, granary_ids: Optional[List[int]]) -> Dict[int, Dict[str, Any]]:
+        # One (granary_id, collected_at, id) index seek per granary rather than
+        # a GROUP BY over the whole history
+        latest_id = (
+            select(GranaryData.id)
+            .where(GranaryData.granary_id == Granary.id)
+            .order_by(GranaryData.collected_at.desc(), GranaryData.id.desc())
+            .limit(1)
+            .correlate(Granary)
+            .scalar_subquery()
+        )
+        query = select(GranaryData).select_from(Granary).join(GranaryData, GranaryData.id == latest_id)
+        if granary_ids is not None:
+            query = query.where(Granary.id.in_(granary_ids))
+        result = await session.execute(query.order_by(GranaryData.id))
+        loaded = {}
+        for data in result.scalars().all():
+            reading = {field: getattr(data, field) for field in _READING_FIELDS}
+            loaded[data.granary_id] = reading
+            self._put_reading(data.granary_id, reading)
+        return loaded
+
+    # Queries
+
+    @staticmethod
+    def render_reading(granary_id: int, reading: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """A stored reading as the latest-snapshot and live endpoints send it."""
+        if reading is None:
+            return None
+        values = reading["temperature_values"]
+        if reading["temperature_packed"] is not None:
+            values = grid_to_json(decode_grid(reading["temperature_packed"]))
+        return {
+            "id": reading["id"],
+            "granary_id": granary_id,
+            "collected_at": reading["collected_at"],
+            "sequence_number": reading["sequence_number"],
+            "temperature_values": values,
+            "humidity_values": reading["humidity_values"],
+        }
+
+    async def latest(self, depot_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not self.warmed:
+            await self.warm()
+        if depot_id is None:
+            granary_ids = sorted(self.granaries)
+        else:
+            granary_ids = sorted(self.depots.get(depot_id, ()))
+
+        # Only evicted or never-loaded entries reach the database
+        found = {gid: self.readings[gid] for gid in granary_ids if gid in self.readings}
+        missing = [gid for gid in granary_ids if gid not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            async with self.session_maker() as session:
+                found.update(await self._load_readings(session, missing))
+            for gid in missing:
+                if gid not in found:
+                    self._put_reading(gid, _NO_READING.copy())
+
+        snapshots = []
+        for gid in granary_ids:
+            reading = found.get(gid)
+            if gid in self.readings:
+                self.readings.move_to_end(gid)
+            state = self.granaries[gid]
+            snapshots.append({
+                **state,
+                "reading": self.render_reading(gid, reading) if reading is not None and reading["id"] is not None else None,
+            })
+        return snapshots
+
+    async def depot_temperatures(self) -> Dict[int, Tuple[float, float]]:
+        """(max, mean) over the latest packed readings of each depot's granaries."""
+        if not self.warmed:
+            await self.warm()
+        totals: Dict[int, List[float]] = {}
+        for granary_id, (_, maximum, total, points) in self.temperatures.items():
+            state = self.granaries.get(granary_id)
+            if state is None:
+                continue
+            depot = totals.setdefault(state["depot_id"], [float("-inf"), 0.0, 0])
+            depot[0] = max(depot[0], maximum)
+            depot[1] += total
+            depot[2] += points
+        return {depot_id: (maximum, total / points) for depot_id, (maximum, total, points) in totals.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "granaries": len(self.granaries),
+            "entries": len(self.readings),
+            "max_entries": self.max_entries,
+            "reading_bytes": self.reading_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+snapshot_store = SnapshotStore()
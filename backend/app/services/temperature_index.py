@@ -0,0 +1,276 @@
+"""In-memory index of every granary's latest temperatures, for cross-depot
+rankings and threshold queries.
+
+Per granary the index keeps the max and mean of its latest packed reading and
+the rise rate of the mean, in °C per day between its two latest readings. The
+snapshot store feeds it whenever it accepts a newer reading, so ingestion,
+warm-up and reloads after eviction all keep it current. It also follows
+granaries moving between depots and depots changing province.
+
+Each metric is kept as a sorted list of (value, granary_id) for every scope:
+all granaries, each province and each depot. A top-N query reads the end of
+the narrowest list its filters allow, and a threshold query bisects that list,
+so neither looks at granaries outside its answer. An update moves one granary
+in at most nine lists.
+"""
+import logging
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.future import select
+
+from app.core.temperature import decode_grid
+from app.models import Depot, Granary, GranaryData
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("max", "mean", "rise")
+
+_ALL = ("all",)
+
+
+class TemperatureIndex:
+    def __init__(self):
+        # granary_id -> {"collected_at", "max", "mean", "rise"} of the latest packed reading,
+        # plus its rendered form once queried
+        self.entries: Dict[int, Dict[str, Any]] = {}
+        # granary_id -> (depot_id, name), depot_id -> province and granary ids
+        self.granaries: Dict[int, Tuple[int, str]] = {}
+        self.provinces: Dict[int, Optional[str]] = {}
+        self.depots: Dict[int, set] = {}
+        # (scope, metric) -> [(value, granary_id)] in ascending order
+        self._sorted: Dict[Tuple[tuple, str], List[Tuple[float, int]]] = {}
+        # Entries recorded while warming are filed in one pass at the end
+        self.filing = True
+        self.updates = 0
+        self.queries = 0
+
+    # Membership
+
+    def _scopes(self, granary_id: int) -> List[tuple]:
+        scopes = [_ALL]
+        membership = self.granaries.get(granary_id)
+        if membership is not None:
+            scopes.append(("depot", membership[0]))
+            province = self.provinces.get(membership[0])
+            if province is not None:
+                scopes.append(("province", province))
+        return scopes
+
+    def _file(self, granary_id: int) -> None:
+        entry = self.entries.get(granary_id)
+        if entry is None:
+            return
+        entry.pop("rendered", None)
+        if not self.filing:
+            return
+        for scope in self._scopes(granary_id):
+            for metric in METRICS:
+                if entry[metric] is not None:
+                    insort(self._sorted.setdefault((scope, metric), []), (entry[metric], granary_id))
+
+    def _unfile(self, granary_id: int) -> None:
+        entry = self.entries.get(granary_id)
+        if entry is None or not self.filing:
+            return
+        for scope in self._scopes(granary_id):
+            for metric in METRICS:
+                if entry[metric] is None:
+                    continue
+                ordered = self._sorted.get((scope, metric))
+                key = (entry[metric], granary_id)
+                position = bisect_left(ordered, key) if ordered else 0
+                if ordered and position < len(ordered) and ordered[position] == key:
+                    del ordered[position]
+                    if not ordered:
+                        del self._sorted[(scope, metric)]
+
+    def set_granary(self, granary_id: int, depot_id: int, name: str) -> None:
+        current = self.granaries.get(granary_id)
+        if current == (depot_id, name):
+            return
+        moved = current is None or current[0] != depot_id
+        if moved:
+            self._unfile(granary_id)
+            if current is not None:
+                self.depots.get(current[0], set()).discard(granary_id)
+            self.depots.setdefault(depot_id, set()).add(granary_id)
+        self.granaries[granary_id] = (depot_id, name)
+        if moved:
+            self._file(granary_id)
+        elif granary_id in self.entries:
+            self.entries[granary_id].pop("rendered", None)
+
+    def remove_granary(self, granary_id: int) -> None:
+        self.discard(granary_id)
+        current = self.granaries.pop(granary_id, None)
+        if current is not None:
+            self.depots.get(current[0], set()).discard(granary_id)
+
+    def set_province(self, depot_id: int, province: Optional[str]) -> None:
+        if depot_id in self.provinces and self.provinces[depot_id] == province:
+            return
+        granary_ids = self.depots.get(depot_id, ())
+        for granary_id in granary_ids:
+            self._unfile(granary_id)
+        self.provinces[depot_id] = province
+        for granary_id in granary_ids:
+            self._file(granary_id)
+
+    def remove_depot(self, depot_id: int) -> None:
+        for granary_id in list(self.depots.pop(depot_id, ())):
+            self.remove_granary(granary_id)
+        self.provinces.pop(depot_id, None)
+
+    # Readings
+
+    def record(self, granary_id: int, collected_at: datetime, maximum: float, mean: float) -> None:
+        """Record the figures of a granary's latest packed reading; older readings are ignored."""
+        current = self.entries.get(granary_id)
+        if current is not None and collected_at < current["collected_at"]:
+            return
+        rise = None
+        if current is not None:
+            if collected_at == current["collected_at"]:
+                rise = current["rise"]
+            else:
+                rise = (mean - current["mean"]) / ((collected_at - current["collected_at"]).total_seconds() / 86400)
+        self._unfile(granary_id)
+        self.entries[granary_id] = {"collected_at": collected_at, "max": maximum, "mean": mean, "rise": rise}
+        self._file(granary_id)
+        self.updates += 1
+
+    def discard(self, granary_id: int) -> None:
+        self._unfile(granary_id)
+        self.entries.pop(granary_id, None)
+
+    # Loading
+
+    def clear(self) -> None:
+        """Forget everything and stop filing until `warm` (or `rebuild`) has run."""
+        self.entries.clear()
+        self.granaries.clear()
+        self.provinces.clear()
+        self.depots.clear()
+        self._sorted.clear()
+        self.filing = False
+
+    async def warm(self, session) -> None:
+        """Load provinces and rise rates once the snapshot store has recorded every latest reading.
+        The lists are rebuilt even if loading fails, so the index keeps filing updates."""
+        try:
+            result = await session.execute(select(Depot.id, Depot.province))
+            self.provinces.update((depot_id, province) for depot_id, province in result.all())
+
+            # The packed reading before each granary's latest one, one index seek per granary
+            previous_id = (
+                select(GranaryData.id)
+                .where(GranaryData.granary_id == Granary.id)
+                .where(GranaryData.temperature_packed.isnot(None))
+                .order_by(GranaryData.collected_at.desc(), GranaryData.id.desc())
+                .offset(1)
+                .limit(1)
+                .correlate(Granary)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                select(GranaryData.granary_id, GranaryData.collected_at, GranaryData.temperature_packed)
+                .select_from(Granary)
+                .join(GranaryData, GranaryData.id == previous_id)
+            )
+            for granary_id, collected_at, packed in result.all():
+                entry = self.entries.get(granary_id)
+                if entry is None or collected_at >= entry["collected_at"]:
+                    continue
+                values = decode_grid(packed)
+                values = values[~np.isnan(values)]
+                if values.size:
+                    days = (entry["collected_at"] - collected_at).total_seconds() / 86400
+                    entry["rise"] = (entry["mean"] - float(values.mean())) / days
+                    entry.pop("rendered", None)
+        finally:
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        """File every entry in one pass and resume filing updates."""
+        self._sorted.clear()
+        self.filing = True
+        for granary_id, entry in self.entries.items():
+            for scope in self._scopes(granary_id):
+                for metric in METRICS:
+                    if entry[metric] is not None:
+                        self._sorted.setdefault((scope, metric), []).append((entry[metric], granary_id))
+        for ordered in self._sorted.values():
+            ordered.sort()
+        logger.info("Temperature index holds %d granaries", len(self.entries))
+
+    # Queries
+
+    def _ordered(self, metric: str, province: Optional[str], depot_id: Optional[int]) -> List[Tuple[float, int]]:
+        self.queries += 1
+        if depot_id is not None:
+            if province is not None and self.provinces.get(depot_id) != province:
+                return []
+            scope = ("depot", depot_id)
+        elif province is not None:
+            scope = ("province", province)
+        else:
+            scope = _ALL
+        return self._sorted.get((scope, metric), [])
+
+    def _render(self, granary_id: int) -> Dict[str, Any]:
+        entry = self.entries[granary_id]
+        rendered = entry.get("rendered")
+        if rendered is None:
+            depot_id, name = self.granaries.get(granary_id, (None, None))
+            rendered = entry["rendered"] = {
+                "granary_id": granary_id,
+                "depot_id": depot_id,
+                "name": name,
+                "province": self.provinces.get(depot_id),
+                "collected_at": entry["collected_at"],
+                "temperature_max": round(entry["max"], 2),
+                "temperature_avg": round(entry["mean"], 2),
+                "rise_per_day": round(entry["rise"], 3) if entry["rise"] is not None else None,
+            }
+        return rendered
+
+    def top(self, metric: str = "max", limit: int = 20, province: Optional[str] = None,
+            depot_id: Optional[int] = None, ascending: bool = False) -> Dict[str, Any]:
+        """The `limit` granaries with the highest (or lowest) metric among those matching the filters."""
+        ordered = self._ordered(metric, province, depot_id)
+        picked = ordered[:limit] if ascending else ordered[:-limit - 1:-1]
+        return {
+            "metric": metric,
+            "total": len(ordered),
+            "granaries": [self._render(granary_id) for _, granary_id in picked],
+        }
+
+    def range(self, metric: str = "max", minimum: Optional[float] = None, maximum: Optional[float] = None,
+              province: Optional[str] = None, depot_id: Optional[int] = None, limit: int = 1000) -> Dict[str, Any]:
+        """Granaries whose metric lies within [minimum, maximum], highest first, at most `limit` of them."""
+        ordered = self._ordered(metric, province, depot_id)
+        low = bisect_left(ordered, (minimum,)) if minimum is not None else 0
+        high = bisect_right(ordered, (maximum, float("inf"))) if maximum is not None else len(ordered)
+        picked = ordered[max(low, high - limit):high][::-1] if high > low else []
+        return {
+            "metric": metric,
+            "total": max(high - low, 0),
+            "granaries": [self._render(granary_id) for _, granary_id in picked],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "granaries": len(self.entries),
+            "with_rise": sum(1 for entry in self.entries.values() if entry["rise"] is not None),
+            "depots": len(self.depots),
+            "provinces": len({province for province in self.provinces.values() if province is not None}),
+            "sorted_lists": len(self._sorted),
+            "updates": self.updates,
+            "queries": self.queries,
+        }
+
+
+temperature_index = TemperatureIndex()
@@ -0,0 +1,151 @@
+"""Interactive write latency while collectors and bulk uploads flood the writer.
+
+Runs against the sqlite-production profile (one writer connection), once with
+admission control and once without. Each run measures:
+
+  idle    PUT /api/depots/{id} issued back to back with nothing else running
+  storm   the same while the ingestion worker drains a reconnect storm of
+          --storm collector messages and --bulk-clients clients keep posting
+          --bulk-rows granaries to /api/granaries/bulk
+
+Reported per run: interactive p50/p99/max, how many bulk uploads were answered
+429, ingestion rows per second during the storm and the admission counters.
+Each run is a separate process, as the middleware is fixed at import.
+
+Usage (from backend/):
+    python -m benchmarks.admission --storm 20000 --bulk-clients 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+
+def summarise(timings) -> dict:
+    timings = sorted(timings)
+    if not timings:
+        return {}
+    return {
+        "requests": len(timings),
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p99_ms": round(timings[int(0.99 * (len(timings) - 1))], 2),
+        "max_ms": round(timings[-1], 2),
+    }
+
+
+async def interactive(client, depot_id: int, stop: asyncio.Event, think: float) -> list:
+    timings = []
+    n = 0
+    while not stop.is_set():
+        n += 1
+        started = time.perf_counter()
+        response = await client.put(f"/api/depots/{depot_id}", json={"name": f"粮库{n}", "province": "河南"})
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.text
+        await asyncio.sleep(think)
+    return timings
+
+
+async def bulk(client, number: int, rows: int, stop: asyncio.Event, statuses: dict) -> None:
+    n = 0
+    while not stop.is_set():
+        n += 1
+        body = [{"depot_id": 2, "name": f"B{number}-{n}-{row}"} for row in range(rows)]
+        response = await client.post("/api/granaries/bulk", json=body)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 429:
+            await asyncio.sleep(min(float(response.headers["Retry-After"]), 1.0))
+
+
+async def child(args) -> None:
+    import httpx
+    import numpy as np
+
+    from app import migrations
+    from app.core.db import engine
+    from app.main import app
+    from app.services.admission import admission_controller
+    from app.services.ingest import ingestion_service
+    from app.services.snapshots import snapshot_store
+    from benchmarks import synthetic
+
+    await migrations.upgrade(engine)
+    dataset = synthetic.generate(os.environ["BENCH_DB"], 4, 25, 1, seed=0)
+    await engine.dispose()
+    await snapshot_store.warm()
+    await ingestion_service.start()
+
+    rng = np.random.default_rng(0)
+    payloads = [(granary, synthetic.payload(granary, dataset.end + timedelta(minutes=n), n, rng))
+                for n in range(args.storm // len(dataset.granaries) + 1) for granary in dataset.granaries][:args.storm]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(interactive(client, 1, stop, args.think))
+        await asyncio.sleep(args.idle_seconds)
+        stop.set()
+        idle = await sampler
+
+        stop = asyncio.Event()
+        statuses = {}
+        written = ingestion_service.rows_written
+        started = time.perf_counter()
+        sampler = asyncio.create_task(interactive(client, 1, stop, args.think))
+        flood = [asyncio.create_task(bulk(client, n, args.bulk_rows, stop, statuses)) for n in range(args.bulk_clients)]
+        for n, (granary, payload) in enumerate(payloads):
+            await ingestion_service.handle_message(granary.topic, payload)
+            if n % 100 == 0:
+                # Let the flusher and the requests run, as between broker deliveries
+                await asyncio.sleep(0)
+        while ingestion_service._buffer:
+            await asyncio.sleep(0.05)
+        seconds = time.perf_counter() - started
+        stop.set()
+        storm = await sampler
+        await asyncio.gather(*flood)
+    await ingestion_service.stop()
+    await engine.dispose()
+
+    print(json.dumps({
+        "interactive_idle": summarise(idle),
+        "interactive_storm": summarise(storm),
+        "bulk_responses": {str(status): count for status, count in sorted(statuses.items())},
+        "ingest_rows_per_second": round((ingestion_service.rows_written - written) / seconds),
+        "storm_seconds": round(seconds, 2),
+        "admission": admission_controller.stats(),
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storm", type=int, default=20000, help="collector messages in the storm")
+    parser.add_argument("--bulk-clients", type=int, default=16)
+    parser.add_argument("--bulk-rows", type=int, default=200, help="granaries per bulk upload")
+    parser.add_argument("--think", type=float, default=0.02, help="seconds between interactive requests")
+    parser.add_argument("--idle-seconds", type=float, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child(args))
+        return
+
+    results = {}
+    for mode, enabled in (("without_admission", "0"), ("with_admission", "1")):
+        path = os.path.join(tempfile.mkdtemp(), "admission.db")
+        env = dict(os.environ, DB_PROFILE="sqlite-production", DATABASE_URL=f"sqlite+aiosqlite:///{path}",
+                   BENCH_DB=path, DB_ECHO="0", ADMISSION_ENABLED=enabled, MQTT_BROKER_HOST="",
+                   METRICS_SLOW_REQUEST_MS="1e9")
+        output = subprocess.run([sys.executable, "-m", "benchmarks.admission", "--child", *sys.argv[1:]],
+                                env=env, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
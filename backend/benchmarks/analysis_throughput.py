@@ -0,0 +1,90 @@
+"""Readings evaluated per second by the alarm analysis engine.
+
+Compares the stacked NumPy evaluation with a per-point Python loop applying
+the same threshold, layer and neighbour rules.
+
+Usage (from backend/):
+    python -m benchmarks.analysis_throughput --readings 5000 --cables 40 --points 12
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core.temperature import encode_grid
+from app.services.analysis import AlarmThresholds, AnalysisEngine
+
+
+def python_loop(grid: list, t: AlarmThresholds) -> int:
+    cables, points = len(grid), len(grid[0])
+    alarms = 0
+    layer_means = [sum(grid[c][p] for c in range(cables)) / cables for p in range(points)]
+    for c in range(cables):
+        for p in range(points):
+            v = grid[c][p]
+            if v > t.max_temperature:
+                alarms += 1
+            if v - layer_means[p] > t.layer_deviation:
+                alarms += 1
+            around = [grid[cc][pp] for cc, pp in ((c - 1, p), (c + 1, p), (c, p - 1), (c, p + 1))
+                      if 0 <= cc < cables and 0 <= pp < points]
+            if v - sum(around) / len(around) > t.gradient:
+                alarms += 1
+    return alarms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--granaries", type=int, default=300)
+    parser.add_argument("--cables", type=int, default=40)
+    parser.add_argument("--points", type=int, default=12)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # A fixed temperature field per granary plus small sensor noise per reading
+    field = rng.normal(18, 0.5, (args.granaries, args.cables, args.points))
+    noise = rng.normal(0, 0.1, (args.readings, args.cables, args.points))
+    grids = (field[np.arange(args.readings) % args.granaries] + noise).astype(np.float32)
+    # Sprinkle hot spots so the alarm path is exercised
+    hot = rng.random(grids.shape) < 0.002
+    grids[hot] += 15
+    start = datetime(2026, 1, 1)
+    rows = [
+        {
+            "id": i + 1,
+            "granary_id": i % args.granaries + 1,
+            "collected_at": start + timedelta(minutes=30 * (i // args.granaries)),
+            "temperature_packed": encode_grid(grid),
+        }
+        for i, grid in enumerate(grids)
+    ]
+
+    engine = AnalysisEngine()
+    started = time.perf_counter()
+    alarms = 0
+    for offset in range(0, len(rows), args.batch_size):
+        alarms += len(engine.evaluate_rows(rows[offset:offset + args.batch_size]))
+    vectorised = time.perf_counter() - started
+
+    sample = min(len(grids), 200)
+    nested = grids[:sample].tolist()
+    started = time.perf_counter()
+    for grid in nested:
+        python_loop(grid, engine.thresholds)
+    loop = (time.perf_counter() - started) / sample * len(grids)
+
+    print(json.dumps({
+        "readings": args.readings,
+        "grid": f"{args.cables}x{args.points}",
+        "alarms": alarms,
+        "engine_readings_per_second": round(args.readings / vectorised, 1),
+        "python_loop_readings_per_second": round(args.readings / loop, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Database size and raw history latency before and after archiving old
+readings to segment files.
+
+Usage (from backend/):
+    python -m benchmarks.archive_retention --granaries 50 --days 730
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = tempfile.mkdtemp()
+PATH = os.path.join(ROOT, "archive.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{PATH}")
+os.environ.setdefault("DB_ECHO", "0")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(ROOT, "segments"))
+
+import numpy as np
+
+from app import migrations
+from app.core.db import async_session_maker, engine
+from app.core.temperature import encode_grid
+from app.services import rollups
+from app.services.archive import archive_service
+
+START = datetime(2023, 1, 1)
+
+
+def seed(granaries: int, days: int, per_day: int) -> None:
+    conn = sqlite3.connect(PATH)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("INSERT INTO depots (id, name) VALUES (1, 'Depot')")
+    conn.executemany("INSERT INTO granaries (id, depot_id, name, collection_status) VALUES (?, 1, ?, 0)",
+                     ((g, f"G{g}") for g in range(1, granaries + 1)))
+    rng = np.random.default_rng(0)
+    blobs = [encode_grid(grid) for grid in rng.uniform(14, 26, size=(64, 10, 6)).astype(np.float32)]
+    step = timedelta(days=1) / per_day
+
+    def rows():
+        for i in range(days * per_day):
+            ts = (START + i * step).isoformat(sep=" ")
+            for g in range(1, granaries + 1):
+                yield g, ts, blobs[(i + g) % len(blobs)], 50.0
+
+    conn.executemany(
+        "INSERT INTO granary_data (granary_id, collected_at, temperature_packed, humidity_values) VALUES (?, ?, ?, ?)", rows()
+    )
+    conn.commit()
+    conn.close()
+
+
+async def time_history(granary_id: int, start: datetime, repeat: int) -> float:
+    timings = []
+    async with async_session_maker() as session:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await rollups.query_history(session, granary_id, start, start + timedelta(days=7), max_points=500)
+            timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(path) for name in names)
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    seed(args.granaries, args.days, args.per_day)
+    await rollups.backfill(async_session_maker)
+    await engine.dispose()
+
+    end = START + timedelta(days=args.days)
+    cutoff = end - timedelta(days=args.retention_days)
+    old_week = START + timedelta(days=40)
+    recent_week = end - timedelta(days=10)
+    before = {
+        "db_bytes": os.path.getsize(PATH),
+        "history_old_week_ms": await time_history(1, old_week, args.repeat),
+        "history_recent_week_ms": await time_history(1, recent_week, args.repeat),
+    }
+
+    summary = await archive_service.run_once(cutoff)
+    await archive_service.vacuum()
+    await engine.dispose()
+    after = {
+        "db_bytes": os.path.getsize(PATH),
+        "segment_bytes": directory_bytes(archive_service.root),
+        "history_old_week_ms": await time_history(1, old_week, args.repeat),
+        "history_recent_week_ms": await time_history(1, recent_week, args.repeat),
+    }
+    await engine.dispose()
+
+    print(json.dumps({
+        "readings": args.granaries * args.days * args.per_day,
+        "archived_rows": summary["rows"],
+        "segments": summary["segments"],
+        "archive_seconds": summary["seconds"],
+        "before": before,
+        "after": after,
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--granaries", type=int, default=50)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--per-day", type=int, default=4, help="readings per granary per day")
+    parser.add_argument("--retention-days", type=int, default=180)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""One full collection sweep against the fake collector responder.
+
+Usage (from backend/):
+    python -m benchmarks.collection_sweep --depots 20 --granaries-per-depot 25
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app import migrations
+from app.models import Depot, Granary, GranaryConfig, GranaryData
+from app.services.collection import CollectionScheduler, FakeCollector
+from app.services.ingest import IngestionService
+
+
+async def run(args) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "sweep.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    await migrations.upgrade(engine)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_maker() as session:
+        for d in range(args.depots):
+            depot = Depot(name=f"Depot {d}")
+            session.add(depot)
+            await session.flush()
+            for g in range(args.granaries_per_depot):
+                granary = Granary(depot_id=depot.id, name=f"D{d}G{g}")
+                session.add(granary)
+                await session.flush()
+                session.add(GranaryConfig(
+                    granary_id=granary.id, extension_number=g + 1, cable_count=4, cable_point_count=4,
+                    mqtt_topic_sub=f"granary/{granary.id}/data", mqtt_topic_pub=f"granary/{granary.id}/cmd",
+                ))
+        await session.commit()
+
+    ingestion = IngestionService(session_maker)
+    await ingestion.start()
+    collector = FakeCollector(latency=args.latency, jitter=args.latency / 2, failure_rate=args.failure_rate,
+                              drop_rate=args.drop_rate, ingestion=ingestion)
+    scheduler = CollectionScheduler(
+        collector, session_maker, interval=args.interval, depot_concurrency=args.depot_concurrency,
+        depot_stagger=args.stagger, timeout=args.timeout, retries=2, retry_backoff=0.1,
+    )
+    summary = await scheduler.sweep()
+    await ingestion.stop()
+
+    async with session_maker() as session:
+        stored = (await session.execute(select(func.count(GranaryData.id)))).scalar_one()
+        collecting = (await session.execute(
+            select(func.count(Granary.id)).where(Granary.collection_status != 0)
+        )).scalar_one()
+    await engine.dispose()
+
+    print(json.dumps({
+        **summary,
+        "interval_seconds": args.interval,
+        "within_cycle": summary["seconds"] <= args.interval,
+        "readings_stored": stored,
+        "left_collecting": collecting,
+        "max_in_flight_per_depot": max(collector.max_in_flight_by_depot.values()),
+        "scheduler": scheduler.stats(),
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depots", type=int, default=20)
+    parser.add_argument("--granaries-per-depot", type=int, default=25)
+    parser.add_argument("--interval", type=float, default=60)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--drop-rate", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--stagger", type=float, default=0.1)
+    parser.add_argument("--depot-concurrency", type=int, default=2)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
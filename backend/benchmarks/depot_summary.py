@@ -0,0 +1,117 @@
+"""Latency of /api/depots/summary: the grouped query on its own and the
+endpoint with and without its TTL cache, on a seeded database.
+
+Usage (from backend/):
+    python -m benchmarks.depot_summary --depots 100 --granaries-per-depot 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PATH = os.path.join(tempfile.mkdtemp(), "summary.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{PATH}")
+os.environ.setdefault("DB_ECHO", "0")
+
+import httpx
+import numpy as np
+
+from app import migrations
+from app.core.db import engine, read_session_maker
+from app.core.temperature import encode_grid
+from app.main import app
+from app.services.depot_summary import depot_summary, summary_query
+from app.services.snapshots import snapshot_store
+
+
+def seed(depots: int, per_depot: int, readings: int) -> None:
+    rng = random.Random(0)
+    conn = sqlite3.connect(PATH)
+    conn.executemany("INSERT INTO depots (id, name, province) VALUES (?, ?, ?)",
+                     ((d, f"Depot {d}", "Henan") for d in range(1, depots + 1)))
+    granaries = [(d * per_depot + g + 1, d + 1) for d in range(depots) for g in range(per_depot)]
+    start = datetime(2025, 1, 1)
+    conn.executemany(
+        "INSERT INTO granaries (id, depot_id, name, collection_status, last_collected_at) VALUES (?, ?, ?, ?, ?)",
+        ((gid, depot, f"G{gid}", int(rng.random() < 0.1), start + timedelta(minutes=rng.randint(0, 600)))
+         for gid, depot in granaries),
+    )
+    conn.executemany(
+        "INSERT INTO granary_infos (granary_id, design_capacity, actual_capacity, rough_rice_yield, moisture) "
+        "VALUES (?, ?, ?, 0, 0)",
+        ((gid, 5000.0, rng.uniform(1000, 5000)) for gid, _ in granaries),
+    )
+    grids = np.random.default_rng(0).uniform(14, 26, size=(len(granaries), 10, 6)).astype(np.float32)
+    conn.executemany(
+        "INSERT INTO granary_data (granary_id, collected_at, temperature_packed) VALUES (?, ?, ?)",
+        ((gid, (start + timedelta(hours=i)).isoformat(sep=" "), encode_grid(grids[n]))
+         for i in range(readings) for n, (gid, _) in enumerate(granaries)),
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def summarise(timings) -> dict:
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    seed(args.depots, args.granaries_per_depot, args.readings)
+    await snapshot_store.warm()
+
+    query_ms = []
+    async with read_session_maker() as session:
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            (await session.execute(summary_query())).all()
+            query_ms.append((time.perf_counter() - started) * 1000)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        uncached_ms, cached_ms = [], []
+        for _ in range(args.repeat):
+            depot_summary.invalidate()
+            started = time.perf_counter()
+            response = await client.get("/api/depots/summary")
+            uncached_ms.append((time.perf_counter() - started) * 1000)
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            await client.get("/api/depots/summary")
+            cached_ms.append((time.perf_counter() - started) * 1000)
+    await engine.dispose()
+
+    print(json.dumps({
+        "depots": args.depots,
+        "granaries": args.depots * args.granaries_per_depot,
+        "response_bytes": len(response.content),
+        "grouped_query": summarise(query_ms),
+        "endpoint_uncached": summarise(uncached_ms),
+        "endpoint_cached": summarise(cached_ms),
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depots", type=int, default=100)
+    parser.add_argument("--granaries-per-depot", type=int, default=50)
+    parser.add_argument("--readings", type=int, default=20, help="readings per granary")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
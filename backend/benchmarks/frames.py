@@ -0,0 +1,108 @@
+"""Collector frame decoding throughput, in frames and messages per second.
+
+Messages are encoded from synthetic readings for the layouts the dataset
+generator uses, wired as it wires them (cables at addresses 1..n and the
+temperature/humidity sensor at n + 1). Paths:
+
+  expected   frames in address order, checked and unpacked as one array
+  walk       the same frames shuffled: headers walked, then gathered
+  per_value  a reference decoder unpacking one value at a time in Python
+
+Usage (from backend/):
+    python -m benchmarks.frames --messages 2000
+"""
+import argparse
+import json
+import random
+import struct
+import time
+
+import numpy as np
+
+from app.core import frames
+from benchmarks import synthetic
+
+_VALUE = struct.Struct(">h")
+
+
+def per_value(layout: frames.FrameLayout, message: bytes) -> list:
+    """What a straightforward port of the collector protocol looks like."""
+    grid = [[None] * layout.points for _ in range(layout.cable_count)]
+    offset = 0
+    while offset < len(message):
+        _, _, kind, index, count = frames.HEAD.unpack_from(message, offset)
+        end = offset + frames.HEAD.size + 2 * count
+        if sum(message[offset + 2:end]) & 0xFF == message[end] and kind == frames.CABLE:
+            row = grid[index - layout.start_index]
+            for point in range(count):
+                (raw,) = _VALUE.unpack_from(message, offset + frames.HEAD.size + 2 * point)
+                missing = raw in (frames.ABSENT, frames.POWER_ON) or not frames.SENSOR_MIN <= raw <= frames.SENSOR_MAX
+                row[point] = None if missing else raw / frames.SCALE
+        offset = end + 1
+    return grid
+
+
+def shuffled(layout: frames.FrameLayout, message: bytes, rng: random.Random) -> bytes:
+    size = layout.cable_frame_size
+    parts = [message[i * size:(i + 1) * size] for i in range(layout.cable_count)]
+    parts.append(message[layout.cable_count * size:])
+    rng.shuffle(parts)
+    return b"".join(parts)
+
+
+def run_path(decode, messages) -> float:
+    started = time.perf_counter()
+    for layout, message in messages:
+        decode(layout, message)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per path; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    np_rng = np.random.default_rng(args.seed)
+    expected, walk = [], []
+    frame_count = 0
+    for n in range(args.messages):
+        _, cables, points = synthetic.pick_layout(rng)
+        layout = frames.compile_layout(n % 256, 1, cables, cables, points, cables + 1, 1)
+        grid = synthetic.reading_grids(np_rng, np.array([float(n % 365)]), cables, points)[0]
+        message = frames.encode(layout, grid, 18.5, 61.0)
+        expected.append((layout, message))
+        walk.append((layout, shuffled(layout, message, rng)))
+        frame_count += cables + 1
+
+    # Every path must agree before it is timed
+    for layout, message in expected[:50]:
+        grid = frames.decode(layout, message).grid
+        reference = np.array(per_value(layout, message), dtype=np.float32)
+        assert np.allclose(grid, reference, equal_nan=True)
+        assert np.array_equal(np.isnan(frames.decode(layout, shuffled(layout, message, rng)).grid), np.isnan(grid))
+
+    paths = {"expected": (frames.decode, expected), "walk": (frames.decode, walk), "per_value": (per_value, expected)}
+    results = {}
+    for name, (decode, messages) in paths.items():
+        seconds = min(run_path(decode, messages) for _ in range(args.repeat))
+        results[name] = {
+            "frames_per_second": round(frame_count / seconds),
+            "messages_per_second": round(len(messages) / seconds),
+            "us_per_message": round(seconds / len(messages) * 1e6, 2),
+        }
+    for result in results.values():
+        result["speedup_vs_per_value"] = round(results["per_value"]["us_per_message"] / result["us_per_message"], 2)
+
+    print(json.dumps({
+        "messages": args.messages,
+        "frames": frame_count,
+        "mean_frame_bytes": round(sum(len(m) for _, m in expected) / frame_count, 1),
+        "paths": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Provisioning throughput: POST /api/granaries once per granary versus one
+POST /api/granaries/bulk, both with config and info, through the ASGI app.
+
+Usage (from backend/):
+    python -m benchmarks.granary_import --granaries 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'import.db')}")
+os.environ.setdefault("DB_ECHO", "0")
+
+import httpx
+
+from app import migrations
+from app.core.db import engine
+from app.main import app
+
+
+def granary(depot_id: int, i: int) -> dict:
+    return {
+        "name": f"G{i:04d}",
+        "depot_id": depot_id,
+        "config": {
+            "extension_number": i % 32 + 1, "cable_count": 10, "cable_point_count": 6,
+            "mqtt_topic_sub": f"depot/{depot_id}/granary/{i}/data", "mqtt_topic_pub": f"depot/{depot_id}/granary/{i}/cmd",
+        },
+        "info": {"manager": "Zhang", "design_capacity": 5000.0, "variety": "wheat", "entry_time": "2025-06-01T00:00:00"},
+    }
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        per_item_depot = (await client.post("/api/depots", json={"name": "Per item"})).json()["id"]
+        bulk_depot = (await client.post("/api/depots", json={"name": "Bulk"})).json()["id"]
+
+        started = time.perf_counter()
+        for i in range(args.granaries):
+            (await client.post("/api/granaries", json=granary(per_item_depot, i))).raise_for_status()
+        per_item_seconds = time.perf_counter() - started
+
+        rows = [granary(bulk_depot, i) for i in range(args.granaries)]
+        started = time.perf_counter()
+        response = await client.post("/api/granaries/bulk", json=rows)
+        response.raise_for_status()
+        bulk_seconds = time.perf_counter() - started
+
+        # Re-sending the same rows updates them in place
+        started = time.perf_counter()
+        (await client.post("/api/granaries/bulk", json=rows)).raise_for_status()
+        bulk_update_seconds = time.perf_counter() - started
+    await engine.dispose()
+
+    print(json.dumps({
+        "granaries": args.granaries,
+        "per_item": {"seconds": round(per_item_seconds, 3), "rows_per_second": round(args.granaries / per_item_seconds, 1)},
+        "bulk_insert": {"seconds": round(bulk_seconds, 3), "rows_per_second": round(args.granaries / bulk_seconds, 1)},
+        "bulk_update": {"seconds": round(bulk_update_seconds, 3), "rows_per_second": round(args.granaries / bulk_update_seconds, 1)},
+        "speedup": round(per_item_seconds / bulk_seconds, 1),
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--granaries", type=int, default=300)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
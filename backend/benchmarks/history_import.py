@@ -0,0 +1,138 @@
+"""Rows per second loading a legacy dump of historical readings, three ways:
+
+  orm             one GranaryData per record, added and committed on its own,
+                  as a straightforward migration script would
+  keep_indexes    app.services.history_import with the indexes maintained
+  import          app.services.history_import as the CLI runs it: indexes
+                  rebuilt once at the end
+
+The dump is a CSV in the shape of the reading export (granary name,
+collected_at, humidity, temperature_values as JSON) with readings drawn
+like the synthetic dataset's, spread across its granaries. Every path starts
+from a copy of the same database. The ORM path only loads --orm-rows records
+as it is slow; the load figures exclude the rollup rebuild, which is timed
+separately.
+
+Usage (from backend/):
+    python -m benchmarks.history_import --rows 100000
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+DIRECTORY = tempfile.mkdtemp()
+PATH = os.path.join(DIRECTORY, "history_import.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{PATH}")
+os.environ.setdefault("DB_ECHO", "0")
+
+import numpy as np
+
+from app import migrations
+from app.core.db import async_session_maker, engine
+from app.core.temperature import grid_to_json, pack_values
+from app.models import GranaryData
+from app.services import history_import
+from benchmarks import synthetic
+
+BASE = os.path.join(DIRECTORY, "base.db")
+
+
+def write_dump(path: str, dataset: synthetic.Dataset, rows: int, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    per_granary = -(-rows // len(dataset.granaries))
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(("granary_name", "collected_at", "humidity_values", "temperature_values"))
+        written = 0
+        for granary in dataset.granaries:
+            count = min(per_granary, rows - written)
+            grids = synthetic.reading_grids(rng, np.arange(count) / 24.0, granary.cable_count, granary.cable_point_count)
+            start = synthetic.START - timedelta(hours=count)
+            for n, grid in enumerate(grids):
+                writer.writerow((granary.name, (start + timedelta(hours=n)).isoformat(), round(rng.uniform(50, 70), 1),
+                                 json.dumps(grid_to_json(grid), separators=(",", ":"))))
+            written += count
+
+
+async def load_orm(path: str, limit: int) -> int:
+    resolver = history_import.GranaryResolver()
+    async with async_session_maker() as session:
+        await resolver.load(session)
+    loaded = 0
+    for raw, _ in history_import.read_records(path):
+        if loaded == limit:
+            break
+        record = history_import.normalise(raw)
+        granary_id = resolver.resolve(record)
+        values = json.loads(record["temperature_values"])
+        async with async_session_maker() as session:
+            session.add(GranaryData(
+                granary_id=granary_id,
+                collected_at=history_import.parse_timestamp(record["collected_at"]),
+                humidity_values=float(record["humidity_values"]),
+                temperature_packed=pack_values(values, *resolver.layouts[granary_id]),
+            ))
+            await session.commit()
+        loaded += 1
+    return loaded
+
+
+async def measure(name: str, path: str, args) -> dict:
+    await engine.dispose()
+    shutil.copyfile(BASE, PATH)
+    if name == "orm":
+        started = time.perf_counter()
+        rows = await load_orm(path, args.orm_rows)
+        seconds = time.perf_counter() - started
+        return {"rows": rows, "seconds": round(seconds, 3), "rows_per_second": round(rows / seconds)}
+    importer = history_import.HistoryImporter(defer_indexes=name == "import")
+    summary = await importer.run([path])
+    # Load and index rebuild, without the rollups
+    seconds = summary["total_seconds"] - summary["finish_seconds"]
+    return {
+        "rows": summary["rows_inserted"],
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(summary["rows_inserted"] / seconds),
+        "rollup_seconds": summary["finish_seconds"],
+    }
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    dataset = synthetic.generate(PATH, args.depots, args.granaries_per_depot, 1, seed=args.seed)
+    await engine.dispose()
+    shutil.copyfile(PATH, BASE)
+    dump = os.path.join(DIRECTORY, "dump.csv")
+    write_dump(dump, dataset, args.rows, args.seed)
+
+    results = {name: await measure(name, dump, args) for name in ("orm", "keep_indexes", "import")}
+    await engine.dispose()
+    for result in results.values():
+        result["speedup_vs_orm"] = round(result["rows_per_second"] / results["orm"]["rows_per_second"], 1)
+    print(json.dumps({
+        "rows": args.rows,
+        "granaries": len(dataset.granaries),
+        "dump_bytes": os.path.getsize(dump),
+        "paths": results,
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depots", type=int, default=2)
+    parser.add_argument("--granaries-per-depot", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=50000, help="records in the dump")
+    parser.add_argument("--orm-rows", type=int, default=2000, help="records the ORM path loads")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
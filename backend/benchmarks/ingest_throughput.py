@@ -0,0 +1,90 @@
+"""Ingestion throughput with an in-process fake publisher.
+
+Usage (from backend/):
+    python -m benchmarks.ingest_throughput --granaries 300 --messages 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.db import Base
+from app.models import Depot, Granary, GranaryConfig, GranaryData
+from app.services.ingest import IngestionService
+
+
+async def seed(session_maker, granary_count: int) -> list:
+    topics = []
+    async with session_maker() as session:
+        depot = Depot(name="bench depot")
+        session.add(depot)
+        await session.flush()
+        for i in range(granary_count):
+            granary = Granary(depot_id=depot.id, name=f"G{i:04d}")
+            session.add(granary)
+            await session.flush()
+            topic = f"granary/{granary.id}/data"
+            session.add(GranaryConfig(granary_id=granary.id, cable_count=40, cable_point_count=12, mqtt_topic_sub=topic))
+            topics.append(topic)
+        await session.commit()
+    return topics
+
+
+def fake_payload(seq: int, cables: int = 40, points: int = 12) -> bytes:
+    values = {str(c): [round(random.uniform(10, 30), 1) for _ in range(points)] for c in range(1, cables + 1)}
+    return json.dumps({"sequence_number": seq, "temperature_values": values, "humidity_values": 55.0}).encode()
+
+
+async def run(args) -> None:
+    tmpdir = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'bench.db')}")
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    topics = await seed(session_maker, args.granaries)
+    payloads = [fake_payload(i) for i in range(min(args.messages, 256))]
+
+    service = IngestionService(session_maker, batch_size=args.batch_size, flush_interval=args.flush_interval)
+    await service.start()
+    started = time.perf_counter()
+    for i in range(args.messages):
+        await service.handle_message(topics[i % len(topics)], payloads[i % len(payloads)])
+        if i % args.batch_size == 0:
+            # Let the flusher run, as it would between broker deliveries
+            await asyncio.sleep(0)
+    await service.stop()
+    elapsed = time.perf_counter() - started
+
+    async with session_maker() as session:
+        stored = (await session.execute(select(func.count(GranaryData.id)))).scalar_one()
+    await engine.dispose()
+
+    print(json.dumps({
+        "messages": args.messages,
+        "stored": stored,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(args.messages / elapsed, 1),
+        "flushes": service.flush_count,
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--granaries", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Live push fan-out: cost of an ingestion flush with and without subscribers,
+and delivery latency to every subscriber's queue.
+
+Subscribers are in-process queues, as the WebSocket and SSE endpoints use
+them. Half watch a whole depot and half watch a few granaries. A handful never
+read, to show slow consumers being cut back without holding anyone else up.
+The database statements per flush are counted to show that fan-out adds none.
+
+Usage (from backend/):
+    python -m benchmarks.live_fanout --subscribers 1000 --rounds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+PATH = os.path.join(tempfile.mkdtemp(), "live.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{PATH}")
+os.environ.setdefault("DB_ECHO", "0")
+
+import numpy as np
+
+from app import migrations
+from app.core.db import engine
+from app.services.ingest import IngestionService
+from app.services.live import live_broker
+from app.services.metrics import request_metrics
+from app.services.snapshots import snapshot_store
+from benchmarks import synthetic
+
+
+def percentile(values, q: float) -> float:
+    return round(float(np.percentile(values, q)), 3)
+
+
+async def flush_rounds(ingestion: IngestionService, dataset: synthetic.Dataset, rounds: int, offset: int,
+                       rng: np.random.Generator) -> dict:
+    """One reading per granary per round; returns flush timings and statements per flush."""
+    flush_ms, statements = [], []
+    for r in range(rounds):
+        collected_at = dataset.end + dataset.interval * (offset + r)
+        for granary in dataset.granaries:
+            await ingestion.handle_message(granary.topic, synthetic.payload(granary, collected_at, r, rng))
+        before = request_metrics.queries.value(("background",))
+        started = time.perf_counter()
+        await ingestion.flush()
+        flush_ms.append((time.perf_counter() - started) * 1000)
+        statements.append(request_metrics.queries.value(("background",)) - before)
+        # Let subscribers drain, as the event loop would between batches
+        await asyncio.sleep(0.01)
+    return {"flush_ms": flush_ms, "statements": statements}
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    dataset = synthetic.generate(PATH, args.depots, args.granaries_per_depot, 1, seed=args.seed)
+    request_metrics.instrument(engine)
+    await snapshot_store.warm()
+    ingestion = IngestionService()
+    await ingestion.refresh_topics()
+    rng = np.random.default_rng(args.seed)
+
+    idle = await flush_rounds(ingestion, dataset, args.rounds, 0, rng)
+
+    picker = random.Random(args.seed)
+    received = []
+    stamp = {"flushed": 0.0}
+
+    async def consume(subscriber) -> None:
+        while True:
+            await subscriber.queue.get()
+            received.append(time.perf_counter() - stamp["flushed"])
+
+    consumers, subscribers = [], []
+    for i in range(args.subscribers + args.slow):
+        if i % 2:
+            subscriber = live_broker.subscribe(depot_ids=[picker.randint(1, dataset.depots)])
+        else:
+            subscriber = live_broker.subscribe(granary_ids=[g.id for g in picker.sample(dataset.granaries, 5)])
+        subscribers.append(subscriber)
+        if i < args.subscribers:
+            consumers.append(asyncio.create_task(consume(subscriber)))
+
+    # Timestamp taken when flush returns, i.e. after every queue has been filled
+    original_flush = ingestion.flush
+
+    async def timed_flush():
+        written = await original_flush()
+        stamp["flushed"] = time.perf_counter()
+        return written
+
+    ingestion.flush = timed_flush
+    busy = await flush_rounds(ingestion, dataset, args.rounds, args.rounds, rng)
+    await asyncio.sleep(0.1)
+    for task in consumers:
+        task.cancel()
+    stats = live_broker.stats()
+    for subscriber in subscribers:
+        live_broker.unsubscribe(subscriber)
+    await engine.dispose()
+
+    delivery_ms = [value * 1000 for value in received]
+    print(json.dumps({
+        "granaries": len(dataset.granaries),
+        "readings_per_flush": len(dataset.granaries),
+        "subscribers": args.subscribers,
+        "slow_subscribers": args.slow,
+        "no_subscribers": {
+            "flush_p50_ms": round(statistics.median(idle["flush_ms"]), 3),
+            "statements_per_flush": statistics.median(idle["statements"]),
+        },
+        "with_subscribers": {
+            "flush_p50_ms": round(statistics.median(busy["flush_ms"]), 3),
+            "statements_per_flush": statistics.median(busy["statements"]),
+            "events_published": stats["events_published"],
+            "deliveries": stats["deliveries"],
+            "overflows": stats["overflows"],
+            "delivery_p50_ms": percentile(delivery_ms, 50),
+            "delivery_p99_ms": percentile(delivery_ms, 99),
+        },
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depots", type=int, default=10)
+    parser.add_argument("--granaries-per-depot", type=int, default=20)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=10, help="extra subscribers that never read")
+    parser.add_argument("--rounds", type=int, default=20, help="flushes of one reading per granary")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
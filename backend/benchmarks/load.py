@@ -0,0 +1,292 @@
+"""In-process load suite: list, detail, write and ingest scenarios against a
+synthetic dataset.
+
+The app is driven through the ASGI transport, so nothing goes over the
+network. The dataset (see benchmarks.synthetic) and every scenario's request
+plan come from --seed, so two commits run the same requests against the same
+data. Each scenario reports throughput and p50/p95/p99 latency, overall and
+per route. The ingest scenario feeds collector messages to the ingestion
+service, as the MQTT subscriber does, because readings have no HTTP endpoint.
+
+Usage (from backend/):
+    python -m benchmarks.load --output after.json --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PATH = os.path.join(tempfile.mkdtemp(), "load.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{PATH}")
+os.environ.setdefault("DB_ECHO", "0")
+
+import httpx
+import numpy as np
+
+from app import migrations
+from app.core import config
+from app.core.db import async_session_maker, engine
+from app.main import app
+from app.services import rollups
+from app.services.ingest import ingestion_service
+from app.services.snapshots import snapshot_store
+from benchmarks import synthetic
+
+SCENARIOS = ("list", "detail", "write", "ingest")
+
+# (route label, method, url, json body)
+Request = Tuple[str, str, str, Optional[dict]]
+
+
+def latency_summary(timings: List[float]) -> dict:
+    values = np.asarray(timings)
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+# Request plans
+
+def list_plan(rng: random.Random, dataset: synthetic.Dataset, count: int) -> Iterator[Request]:
+    pages = max(1, len(dataset.granaries) // 100)
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4:
+            yield "GET /api/granaries", "GET", f"/api/granaries?skip={rng.randrange(pages) * 100}&limit=100", None
+        elif roll < 0.6:
+            yield "GET /api/depots", "GET", "/api/depots", None
+        elif roll < 0.8:
+            depot = rng.randint(1, dataset.depots)
+            yield "GET /api/granaries/latest", "GET", f"/api/granaries/latest?depot_id={depot}", None
+        else:
+            yield "GET /api/depots/summary", "GET", "/api/depots/summary", None
+
+
+def detail_plan(rng: random.Random, dataset: synthetic.Dataset, count: int) -> Iterator[Request]:
+    span = dataset.end - dataset.start
+    window = min(span, timedelta(days=7))
+    for _ in range(count):
+        granary = rng.choice(dataset.granaries)
+        roll = rng.random()
+        if roll < 0.35:
+            yield "GET /api/granaries/{id}", "GET", f"/api/granaries/{granary.id}", None
+        elif roll < 0.65:
+            start = dataset.start + (span - window) * rng.random()
+            url = (f"/api/granaries/{granary.id}/history?from={start.isoformat()}"
+                   f"&to={(start + window).isoformat()}")
+            yield "GET /api/granaries/{id}/history", "GET", url, None
+        elif roll < 0.9:
+            yield "GET /api/granaries/{id}/data", "GET", f"/api/granaries/{granary.id}/data?order=desc&limit=20", None
+        else:
+            yield "GET /api/depots/{id}", "GET", f"/api/depots/{granary.depot_id}", None
+
+
+def write_plan(rng: random.Random, dataset: synthetic.Dataset, count: int) -> Iterator[Request]:
+    for i in range(count):
+        if rng.random() < 0.8:
+            granary = rng.choice(dataset.granaries)
+            body = {
+                "name": granary.name,
+                "depot_id": granary.depot_id,
+                "info": {"actual_capacity": round(rng.uniform(1000, 5000), 1), "moisture": round(rng.uniform(11, 14), 1)},
+            }
+            yield "PUT /api/granaries/{id}", "PUT", f"/api/granaries/{granary.id}", body
+        else:
+            kind, cables, points = synthetic.pick_layout(rng)
+            body = {
+                "name": f"新建{i}号仓",
+                "depot_id": rng.randint(1, dataset.depots),
+                "config": {"cable_count": cables, "cable_point_count": points},
+                "info": {"storage_nature": kind, "design_capacity": 5000.0},
+            }
+            yield "POST /api/granaries", "POST", "/api/granaries", body
+
+
+PLANS = {"list": list_plan, "detail": detail_plan, "write": write_plan}
+
+
+# Scenarios
+
+async def run_http(client: httpx.AsyncClient, plan: Iterator[Request], concurrency: int) -> dict:
+    timings: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+
+    async def worker() -> None:
+        for route, method, url, body in plan:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            await response.aread()
+            timings[route].append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors[route] += 1
+
+    started = time.perf_counter()
+    # Workers share one iterator, so the plan runs once in total
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    every = [t for route_timings in timings.values() for t in route_timings]
+    return {
+        "requests": len(every),
+        "errors": sum(errors.values()),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(every) / elapsed, 1),
+        **latency_summary(every),
+        "routes": {
+            route: {"requests": len(route_timings), "errors": errors[route], **latency_summary(route_timings)}
+            for route, route_timings in sorted(timings.items())
+        },
+    }
+
+
+async def run_ingest(dataset: synthetic.Dataset, messages: int, concurrency: int, seed: int) -> dict:
+    """Publish messages from `concurrency` producers; latency is the time handle_message
+    holds a producer, which includes backpressure flushes."""
+    np_rng = np.random.default_rng(seed)
+    granaries = dataset.granaries
+    # Payloads are built before the clock starts; readings continue on from the seeded ones
+    plan = []
+    for i in range(messages):
+        granary = granaries[i % len(granaries)]
+        collected_at = dataset.end + dataset.interval * (i // len(granaries))
+        plan.append((granary.topic, synthetic.payload(granary, collected_at, i, np_rng)))
+    timings: List[float] = []
+    queue = iter(plan)
+    before = ingestion_service.rows_written
+
+    async def producer() -> None:
+        for n, (topic, body) in enumerate(queue):
+            started = time.perf_counter()
+            await ingestion_service.handle_message(topic, body)
+            timings.append((time.perf_counter() - started) * 1000)
+            if n % 50 == 0:
+                # Let the flusher run, as it would between broker deliveries
+                await asyncio.sleep(0)
+
+    await ingestion_service.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(producer() for _ in range(concurrency)))
+    await ingestion_service.stop()
+    elapsed = time.perf_counter() - started
+
+    stats = ingestion_service.stats()
+    return {
+        "messages": messages,
+        "rows_written": stats["rows_written"] - before,
+        "dropped": stats["messages_dropped"],
+        "flushes": stats["flush_count"],
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(messages / elapsed, 1),
+        **latency_summary(timings),
+    }
+
+
+# Reporting
+
+def environment() -> dict:
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(("git", *args), capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "db_profile": config.DB_PROFILE,
+    }
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Ratios of this run to the baseline per scenario: below 1 is faster for
+    latency, above 1 is faster for throughput."""
+    changes = {}
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        rate = "messages_per_second" if name == "ingest" else "requests_per_second"
+        changes[name] = {
+            key: round(current[key] / previous[key], 3)
+            for key in ("p50_ms", "p95_ms", "p99_ms", rate)
+            if previous.get(key)
+        }
+    if baseline.get("parameters") != report["parameters"]:
+        changes["warning"] = "baseline was run with different parameters"
+    return changes
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    dataset = synthetic.generate(PATH, args.depots, args.granaries_per_depot, args.readings,
+                                 timedelta(hours=args.interval_hours), args.seed)
+    await rollups.backfill(async_session_maker)
+    await snapshot_store.warm()
+
+    scenarios = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in args.scenarios:
+            if name == "ingest":
+                scenarios[name] = await run_ingest(dataset, args.messages, args.concurrency, args.seed)
+                continue
+            rng = random.Random(f"{args.seed}-{name}")
+            if args.warmup:
+                await run_http(client, PLANS[name](rng, dataset, args.warmup), args.concurrency)
+            scenarios[name] = await run_http(client, PLANS[name](rng, dataset, args.requests), args.concurrency)
+    await engine.dispose()
+
+    report = {
+        "environment": environment(),
+        "parameters": {key: getattr(args, key) for key in (
+            "depots", "granaries_per_depot", "readings", "interval_hours", "seed",
+            "requests", "warmup", "messages", "concurrency",
+        )},
+        "dataset": dataset.summary(),
+        "scenarios": scenarios,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            report["vs_baseline"] = compare(report, json.load(fh))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    print(text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depots", type=int, default=20)
+    parser.add_argument("--granaries-per-depot", type=int, default=25)
+    parser.add_argument("--readings", type=int, default=28, help="readings per granary")
+    parser.add_argument("--interval-hours", type=float, default=6.0, help="time between seeded readings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=2000, help="requests per HTTP scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests before each HTTP scenario")
+    parser.add_argument("--messages", type=int, default=10000, help="collector messages in the ingest scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests or producers in flight at once")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
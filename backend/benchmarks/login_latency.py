@@ -0,0 +1,128 @@
+"""Latency of unrelated requests while a burst of logins is in progress.
+
+"before" verifies bcrypt inline on the event loop and resolves the bearer
+token against the users table on every call, as the login endpoint used to;
+"after" uses the bcrypt worker pool and the token cache.
+
+Usage (from backend/):
+    python -m benchmarks.login_latency --logins 40 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'login.db')}")
+os.environ.setdefault("DB_ECHO", "0")
+
+import httpx
+
+from app import migrations
+from app.api.endpoints import auth
+from app.core import security
+from app.core.db import async_session_maker, engine
+from app.main import app
+from app.models import Depot, User
+
+PASSWORD = "benchmark-password"
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def inline_verify(plain_password, hashed_password) -> bool:
+    return security.verify_password(plain_password, hashed_password)
+
+
+async def scenario(client: httpx.AsyncClient, args) -> dict:
+    token = (await client.post("/api/auth/login", data={"username": "probe", "password": PASSWORD})).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    probes = {"/api/depots": [], "/api/auth/me": []}
+    done = asyncio.Event()
+
+    async def probe(path: str) -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            response.raise_for_status()
+            probes[path].append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(args.probe_interval)
+
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def login(i: int) -> float:
+        async with slots:
+            started = time.perf_counter()
+            response = await client.post("/api/auth/login", data={"username": f"user{i % args.users}", "password": PASSWORD})
+            response.raise_for_status()
+            return (time.perf_counter() - started) * 1000
+
+    probe_tasks = [asyncio.create_task(probe(path)) for path in probes]
+    started = time.perf_counter()
+    login_ms = await asyncio.gather(*(login(i) for i in range(args.logins)))
+    burst_seconds = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*probe_tasks)
+
+    report = {"burst_seconds": round(burst_seconds, 2), "login_p50_ms": round(statistics.median(login_ms), 1)}
+    for path, timings in probes.items():
+        report[path] = {
+            "requests": len(timings),
+            "p50_ms": round(statistics.median(timings), 2),
+            "p99_ms": round(percentile(timings, 0.99), 2),
+            "max_ms": round(max(timings), 2),
+        }
+    return report
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    hashed = security.get_password_hash(PASSWORD)
+    async with async_session_maker() as session:
+        session.add(Depot(name="Depot"))
+        session.add(User(username="probe", hashed_password=hashed))
+        for i in range(args.users):
+            session.add(User(username=f"user{i}", hashed_password=hashed))
+        await session.commit()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        pooled_verify = auth.verify_password_async
+        cache_size = security.token_cache.max_entries
+
+        auth.verify_password_async = inline_verify
+        security.token_cache.max_entries = 0
+        before = await scenario(client, args)
+
+        auth.verify_password_async = pooled_verify
+        security.token_cache.max_entries = cache_size
+        security.token_cache.clear()
+        after = await scenario(client, args)
+    await engine.dispose()
+
+    print(json.dumps({
+        "logins": args.logins,
+        "concurrency": args.concurrency,
+        "hash_workers": security._hash_executor._max_workers,
+        "before": before,
+        "after": after,
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8, help="logins in flight at once")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="pause between probe requests (s)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Query plans and timings of the hot read queries before and after the
+time-series indexes (migration 0004), on a seeded database.
+
+Usage (from backend/):
+    python -m benchmarks.query_plans --granaries 500 --readings 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import migrations
+from app.migrations.versions import v0004_time_series_indexes
+from app.core.temperature import encode_grid
+
+QUERIES = {
+    "latest_per_granary_grouped": (
+        "SELECT d.id, d.granary_id, d.collected_at, d.temperature_packed FROM granary_data d "
+        "JOIN (SELECT granary_id, max(collected_at) AS collected_at FROM granary_data GROUP BY granary_id) l "
+        "ON d.granary_id = l.granary_id AND d.collected_at = l.collected_at",
+        lambda p: (),
+    ),
+    # The form used by the snapshot store: one index seek per granary
+    "latest_per_granary": (
+        "SELECT d.id, d.granary_id, d.collected_at, d.temperature_packed FROM granaries g "
+        "JOIN granary_data d ON d.id = (SELECT id FROM granary_data WHERE granary_id = g.id "
+        "ORDER BY collected_at DESC, id DESC LIMIT 1)",
+        lambda p: (),
+    ),
+    "time_range_page": (
+        "SELECT id, collected_at, temperature_packed FROM granary_data "
+        "WHERE granary_id = ? AND collected_at >= ? AND collected_at < ? ORDER BY collected_at, id LIMIT 101",
+        lambda p: (p["granary_id"], p["mid"], p["end"]),
+    ),
+    "keyset_deep_page": (
+        "SELECT id, collected_at, temperature_packed FROM granary_data "
+        "WHERE granary_id = ? AND (collected_at > ? OR (collected_at = ? AND id > ?)) "
+        "ORDER BY collected_at, id LIMIT 101",
+        lambda p: (p["granary_id"], p["mid"], p["mid"], 0),
+    ),
+    "granaries_per_depot": (
+        "SELECT id, name FROM granaries WHERE depot_id = ?",
+        lambda p: (p["depot_id"],),
+    ),
+    "users_per_depot": (
+        "SELECT id, username FROM users WHERE depot_id = ?",
+        lambda p: (p["depot_id"],),
+    ),
+}
+
+
+def seed(path: str, depots: int, granaries: int, readings: int, cables: int, points: int) -> dict:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany("INSERT INTO depots (id, name) VALUES (?, ?)", ((d, f"Depot {d}") for d in range(1, depots + 1)))
+    conn.executemany(
+        "INSERT INTO users (username, hashed_password, depot_id, role, is_active) VALUES (?, 'x', ?, 0, 1)",
+        ((f"user{u}", u % depots + 1) for u in range(depots * 5)),
+    )
+    conn.executemany(
+        "INSERT INTO granaries (id, depot_id, name, collection_status) VALUES (?, ?, ?, 0)",
+        ((g, g % depots + 1, f"G{g}") for g in range(1, granaries + 1)),
+    )
+    blob = encode_grid(np.full((cables, points), 20.0, dtype=np.float32))
+    start = datetime(2025, 1, 1)
+    step = timedelta(minutes=30)
+
+    def rows():
+        # Interleaved like real ingest: every granary reports once per cycle
+        for i in range(readings):
+            ts = (start + i * step).isoformat(sep=" ")
+            for g in range(1, granaries + 1):
+                yield g, ts, blob
+
+    conn.executemany("INSERT INTO granary_data (granary_id, collected_at, temperature_packed) VALUES (?, ?, ?)", rows())
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return {
+        "granary_id": random.randint(1, granaries),
+        "depot_id": random.randint(1, depots),
+        "mid": (start + (readings // 2) * step).isoformat(sep=" "),
+        "end": (start + readings * step).isoformat(sep=" "),
+    }
+
+
+def measure(path: str, params: dict, repeat: int) -> dict:
+    conn = sqlite3.connect(path)
+    report = {}
+    for name, (sql, args) in QUERIES.items():
+        plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, args(params))]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, args(params)).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        report[name] = {"plan": plan, "median_ms": round(statistics.median(timings), 3)}
+    conn.close()
+    return report
+
+
+async def migrate(path: str, target: int = None) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    await migrations.upgrade(engine, target)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depots", type=int, default=20)
+    parser.add_argument("--granaries", type=int, default=500)
+    parser.add_argument("--readings", type=int, default=2000, help="readings per granary")
+    parser.add_argument("--cables", type=int, default=10)
+    parser.add_argument("--points", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    random.seed(0)
+
+    path = os.path.join(tempfile.mkdtemp(), "plans.db")
+    asyncio.run(migrate(path, target=3))
+    # A fresh database gets current table definitions, indexes included; drop
+    # them to reproduce a database created before migration 0004
+    conn = sqlite3.connect(path)
+    for name in v0004_time_series_indexes.INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.close()
+    started = time.perf_counter()
+    params = seed(path, args.depots, args.granaries, args.readings, args.cables, args.points)
+    seed_seconds = time.perf_counter() - started
+
+    before = measure(path, params, args.repeat)
+    asyncio.run(migrate(path))
+    sqlite3.connect(path).execute("ANALYZE").connection.close()
+    after = measure(path, params, args.repeat)
+
+    print(json.dumps({
+        "readings": args.granaries * args.readings,
+        "seed_seconds": round(seed_seconds, 1),
+        "db_bytes": os.path.getsize(path),
+        "before": before,
+        "after": after,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Weekly inspection reports for every granary of a synthetic dataset, computed
+in the event loop (as a request handler would) and on the report engine's
+process pool with each worker count given.
+
+Reported per run: wall time, granaries per second, and the event loop's
+worst stall, measured by a task that wakes every 10 ms. Workers are started
+before the clock does. Every run writes the
+same reports, so the figures of the inline run are checked against the pool's.
+
+Usage (from backend/):
+    python -m benchmarks.reports --readings 200 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+PATH = os.path.join(tempfile.mkdtemp(), "reports.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{PATH}")
+os.environ.setdefault("DB_ECHO", "0")
+
+from sqlalchemy.future import select
+
+from app import migrations
+from app.core.db import async_session_maker, engine
+from app.models import GranaryReport
+from app.services import inspection
+from app.services.reports import PERIODS, ReportEngine, period_start
+from benchmarks import synthetic
+
+
+class InlineEngine(ReportEngine):
+    """The same jobs with the figures computed on the event loop."""
+
+    async def _report_granary(self, job, granary_id: int) -> None:
+        end = job.period_start + PERIODS[job.period]
+        async with self.session_maker() as session:
+            readings = await self._readings(session, granary_id, job.period_start, end)
+            previous = await self._previous(session, granary_id, job.period, job.period_start)
+        figures = inspection.compute([r[1] for r in readings], [r[0] for r in readings], [r[2] for r in readings],
+                                     previous, self.top_n)
+        await self._store(granary_id, job.period, job.period_start, end, figures)
+        job.completed += 1
+
+
+async def stalls(stop: asyncio.Event) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - started - 0.01)
+    return worst
+
+
+async def measure(report_engine: ReportEngine, depots: int, start) -> dict:
+    if not isinstance(report_engine, InlineEngine):
+        # Start the workers first; spawning them is a one-off cost per process
+        await asyncio.get_running_loop().run_in_executor(report_engine._executor(), inspection.empty_report)
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(stalls(stop))
+    started = time.perf_counter()
+    jobs = [report_engine.submit(depot_id, "week", start) for depot_id in range(1, depots + 1)]
+    while any(job.status in ("queued", "running") for job in jobs):
+        await asyncio.sleep(0.01)
+    seconds = time.perf_counter() - started
+    stop.set()
+    worst = await watcher
+    await report_engine.stop()
+    assert all(job.status == "done" and not job.failed for job in jobs)
+    granaries = sum(job.completed for job in jobs)
+    return {
+        "seconds": round(seconds, 3),
+        "granaries_per_second": round(granaries / seconds, 1),
+        "worst_loop_stall_ms": round(worst * 1000, 1),
+    }
+
+
+async def figures() -> list:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(GranaryReport.granary_id, GranaryReport.temperature_avg, GranaryReport.layers)
+            .order_by(GranaryReport.granary_id)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    dataset = synthetic.generate(PATH, args.depots, args.granaries_per_depot, args.readings,
+                                 interval=timedelta(hours=1), seed=args.seed)
+    start = period_start(dataset.start, "week")
+
+    results = {"inline": await measure(InlineEngine(), args.depots, start)}
+    expected = await figures()
+    for workers in args.workers:
+        results[f"pool_{workers}"] = await measure(ReportEngine(workers=workers), args.depots, start)
+        assert await figures() == expected
+    await engine.dispose()
+
+    print(json.dumps({
+        "granaries": len(dataset.granaries),
+        "readings_per_granary": args.readings,
+        "cpus": os.cpu_count(),
+        "runs": results,
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depots", type=int, default=4)
+    parser.add_argument("--granaries-per-depot", type=int, default=10)
+    parser.add_argument("--readings", type=int, default=168, help="hourly readings per granary")
+    parser.add_argument("--workers", type=lambda value: [int(n) for n in value.split(",")],
+                        default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
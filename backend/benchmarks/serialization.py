@@ -0,0 +1,153 @@
+"""CPU time to read and encode readings pages, per 10k readings, for each
+serialisation path of /api/granaries/{id}/data:
+
+  orm             GranaryData instances, response_model validation, json
+  response_model  row tuples, response_model validation, json (the old path)
+  json            row tuples encoded directly (app.core.encoding.dumps)
+  msgpack         row tuples encoded as MessagePack
+
+CPU time is process time, so it includes the aiosqlite worker thread and
+excludes waiting. Every path reads the same pages. The gzip figures are for
+compressing the direct JSON pages at RESPONSE_GZIP_LEVEL.
+
+Usage (from backend/):
+    python -m benchmarks.serialization --readings 100 --repeat 3
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+
+PATH = os.path.join(tempfile.mkdtemp(), "serialization.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{PATH}")
+os.environ.setdefault("DB_ECHO", "0")
+
+from pydantic import TypeAdapter
+from sqlalchemy.future import select
+
+from app import migrations
+from app.core import config, encoding
+from app.core.db import async_session_maker, engine
+from app.models import GranaryData
+from app.schemas import GranaryDataPage
+from app.services import readings
+from benchmarks import synthetic
+
+_page = TypeAdapter(GranaryDataPage)
+
+
+def response_model(page: dict) -> bytes:
+    """What FastAPI does with a returned dict: validate, dump in JSON mode, json.dumps."""
+    content = _page.dump_python(_page.validate_python(page), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def orm_pages(session, granary_id: int, limit: int):
+    after = None
+    while True:
+        query = select(GranaryData).where(GranaryData.granary_id == granary_id)
+        if after is not None:
+            query = query.where(GranaryData.id > after)
+        rows = (await session.execute(query.order_by(GranaryData.id).limit(limit))).scalars().all()
+        if not rows:
+            return
+        after = rows[-1].id
+        yield {"items": [{**readings.render_row(vars(row)), "granary_id": granary_id} for row in rows], "next_cursor": None}
+
+
+async def tuple_pages(session, granary_id: int, limit: int):
+    cursor = None
+    while True:
+        page = await readings.read_page(session, granary_id, None, None, cursor, limit)
+        yield page
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
+
+
+PATHS = {
+    "orm": (orm_pages, response_model),
+    "response_model": (tuple_pages, response_model),
+    "json": (tuple_pages, encoding.dumps),
+    "msgpack": (tuple_pages, encoding.packb),
+}
+
+
+async def measure(dataset: synthetic.Dataset, name: str, limit: int) -> dict:
+    pages, encode = PATHS[name]
+    bodies = []
+    started = time.process_time()
+    async with async_session_maker() as session:
+        for granary in dataset.granaries:
+            async for page in pages(session, granary.id, limit):
+                bodies.append(encode(page))
+    cpu = time.process_time() - started
+    return {"cpu_seconds": cpu, "bytes": sum(len(body) for body in bodies), "bodies": bodies}
+
+
+def per_10k(seconds: float, count: int) -> float:
+    return round(seconds * 1000 * 10000 / count, 3)
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    dataset = synthetic.generate(PATH, args.depots, args.granaries_per_depot, args.readings, seed=args.seed)
+    count = dataset.readings
+
+    results, bodies = {}, {}
+    for _ in range(args.repeat):
+        for name in PATHS:
+            measured = await measure(dataset, name, args.page_size)
+            best = results.get(name)
+            if best is None or measured["cpu_seconds"] < best["cpu_seconds"]:
+                results[name] = measured
+            bodies[name] = measured.pop("bodies")
+    await engine.dispose()
+
+    started = time.process_time()
+    compressed = sum(len(gzip.compress(body, config.RESPONSE_GZIP_LEVEL)) for body in bodies["json"])
+    gzip_seconds = time.process_time() - started
+
+    baseline = results["response_model"]["cpu_seconds"]
+    print(json.dumps({
+        "readings": count,
+        "granaries": len(dataset.granaries),
+        "page_size": args.page_size,
+        "encoders": {
+            "json": "orjson" if encoding.orjson is not None else "json",
+            "msgpack": encoding.msgpack is not None,
+        },
+        "paths": {
+            name: {
+                "cpu_ms_per_10k": per_10k(result["cpu_seconds"], count),
+                "bytes_per_reading": round(result["bytes"] / count, 1),
+                "speedup": round(baseline / result["cpu_seconds"], 2),
+            }
+            for name, result in results.items()
+        },
+        "gzip": {
+            "level": config.RESPONSE_GZIP_LEVEL,
+            "cpu_ms_per_10k": per_10k(gzip_seconds, count),
+            "bytes_per_reading": round(compressed / count, 1),
+            "ratio": round(results["json"]["bytes"] / compressed, 2),
+        },
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depots", type=int, default=10)
+    parser.add_argument("--granaries-per-depot", type=int, default=10)
+    parser.add_argument("--readings", type=int, default=100, help="readings per granary")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per path; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
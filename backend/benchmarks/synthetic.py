@@ -0,0 +1,212 @@
+"""Synthetic depot generator for benchmarks.
+
+Writes N depots with M granaries each into a migrated SQLite database, every
+granary with a GranaryConfig cable layout drawn from the storage types below
+and K packed readings. The readings show a seasonal swing near the grain
+surface, a stable core, sensor noise, the odd hot spot and a few dead sensors.
+The same seed gives the same database, so results are comparable across
+commits.
+
+Usage (from backend/):
+    python -m benchmarks.synthetic out.db --depots 20 --granaries-per-depot 25 --readings 28
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+
+from app.core.temperature import encode_grid
+
+START = datetime(2025, 1, 1)
+
+# (storage type, cable count choices, points per cable range, weight)
+LAYOUTS = [
+    ("平房仓", (48, 60, 72, 96, 120), (4, 5), 0.7),
+    ("浅圆仓", (24, 30, 36), (8, 12), 0.2),
+    ("立筒仓", (6, 9, 12), (16, 24), 0.1),
+]
+CABLES_PER_COLLECTOR = 16
+PROVINCES = ("河南", "山东", "黑龙江", "安徽", "江苏", "湖北")
+VARIETIES = ("小麦", "玉米", "稻谷", "大豆")
+
+
+@dataclass
+class SyntheticGranary:
+    id: int
+    depot_id: int
+    name: str
+    storage_nature: str
+    cable_count: int
+    cable_point_count: int
+    topic: str
+
+
+@dataclass
+class Dataset:
+    depots: int
+    granaries: List[SyntheticGranary] = field(default_factory=list)
+    readings: int = 0
+    interval: timedelta = timedelta(hours=6)
+    start: datetime = START
+    end: datetime = START
+    seconds: float = 0.0
+
+    def summary(self) -> dict:
+        return {
+            "depots": self.depots,
+            "granaries": len(self.granaries),
+            "readings": self.readings,
+            "sensor_points": sum(g.cable_count * g.cable_point_count for g in self.granaries),
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "generate_seconds": round(self.seconds, 2),
+        }
+
+
+def pick_layout(rng: random.Random) -> Tuple[str, int, int]:
+    kind, cables, points, _ = rng.choices(LAYOUTS, weights=[w for *_, w in LAYOUTS])[0]
+    return kind, rng.choice(cables), rng.randint(*points)
+
+
+def season(ts: np.ndarray) -> np.ndarray:
+    """Grain surface temperature for a day of year, warmest in late July."""
+    return 15.0 + 9.0 * np.sin(2 * math.pi * (ts - 110) / 365.0)
+
+
+def reading_grids(rng: np.random.Generator, days: np.ndarray, cables: int, points: int) -> np.ndarray:
+    """readings × cables × points float32 grids for one granary."""
+    core = rng.uniform(11.0, 17.0)
+    # Point 1 is at the surface and follows the season, deeper points lag towards the core
+    depth = np.exp(-np.arange(points) / max(points / 3.0, 1.0))
+    surface = season(days % 365)[:, None, None]
+    grids = core + (surface - core) * depth[None, None, :]
+    grids = grids + rng.normal(0.0, 0.3, size=(len(days), cables, points))
+    if rng.random() < 0.05:
+        cable, point = rng.integers(cables), rng.integers(points)
+        grids[:, cable, point] += np.linspace(0.0, rng.uniform(4.0, 12.0), len(days))
+    dead = rng.random((cables, points)) < 0.002
+    grids[:, dead] = np.nan
+    return grids.astype(np.float32)
+
+
+def generate(path: str, depots: int, granaries_per_depot: int, readings: int,
+             interval: timedelta = timedelta(hours=6), seed: int = 0) -> Dataset:
+    """Fill a migrated SQLite database at path and describe what was written."""
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    dataset = Dataset(depots=depots, readings=readings * depots * granaries_per_depot, interval=interval, start=START,
+                      end=START + interval * readings)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany(
+        "INSERT INTO depots (id, name, address, contact_person, phone, province) VALUES (?, ?, ?, ?, ?, ?)",
+        ((d, f"粮库{d:03d}", f"工业路{d}号", f"联系人{d}", f"1380000{d:04d}", rng.choice(PROVINCES))
+         for d in range(1, depots + 1)),
+    )
+
+    granaries, configs, infos = [], [], []
+    gid = 0
+    for depot in range(1, depots + 1):
+        for n in range(1, granaries_per_depot + 1):
+            gid += 1
+            kind, cables, points = pick_layout(rng)
+            granary = SyntheticGranary(gid, depot, f"{n:02d}号仓", kind, cables, points, f"granary/{gid}/data")
+            dataset.granaries.append(granary)
+            temp_collectors = math.ceil(cables / CABLES_PER_COLLECTOR)
+            granaries.append((gid, depot, granary.name))
+            configs.append((gid, n, temp_collectors, 1, 1, cables, cables + 1, cables, points,
+                            temp_collectors + 1, granary.topic, f"granary/{gid}/cmd", 1))
+            design = rng.choice((2500.0, 5000.0, 8000.0, 10000.0))
+            infos.append((gid, f"仓管员{gid % 50}", design, round(design * rng.uniform(0.3, 1.0), 1), kind,
+                          rng.choice(VARIETIES), rng.choice(PROVINCES), rng.choice(("一等", "二等", "三等")),
+                          round(rng.uniform(74, 80), 1), round(rng.uniform(11, 14), 1)))
+
+    conn.executemany("INSERT INTO granaries (id, depot_id, name, collection_status) VALUES (?, ?, ?, 0)", granaries)
+    conn.executemany(
+        "INSERT INTO granary_configs (granary_id, extension_number, temp_collector_count, th_collector_count, "
+        "start_index, end_index, th_index, cable_count, cable_point_count, total_collector_count, "
+        "mqtt_topic_sub, mqtt_topic_pub, collection_device) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        configs,
+    )
+    conn.executemany(
+        "INSERT INTO granary_infos (granary_id, manager, design_capacity, actual_capacity, storage_nature, "
+        "variety, origin, grade, rough_rice_yield, moisture) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        infos,
+    )
+
+    stamps = [START + interval * i for i in range(readings)]
+    days = np.array([(ts - datetime(ts.year, 1, 1)).total_seconds() / 86400 for ts in stamps])
+    texts = [ts.isoformat(sep=" ", timespec="microseconds") for ts in stamps]
+    for granary in dataset.granaries:
+        grids = reading_grids(np_rng, days, granary.cable_count, granary.cable_point_count)
+        humidity = np_rng.uniform(45.0, 75.0, size=readings).round(1)
+        conn.executemany(
+            "INSERT INTO granary_data (granary_id, collected_at, sequence_number, temperature_packed, humidity_values) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((granary.id, texts[i], i, encode_grid(grids[i]), float(humidity[i])) for i in range(readings)),
+        )
+    if readings:
+        conn.execute("UPDATE granaries SET last_collected_at = ?", (texts[-1],))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    dataset.seconds = time.perf_counter() - started
+    return dataset
+
+
+def payload(granary: SyntheticGranary, collected_at: datetime, sequence: int, rng: np.random.Generator) -> bytes:
+    """A collector message for one granary in the shape the ingestion service accepts."""
+    day = np.array([(collected_at - datetime(collected_at.year, 1, 1)).total_seconds() / 86400])
+    grid = reading_grids(rng, day, granary.cable_count, granary.cable_point_count)[0]
+    values = {
+        str(cable + 1): [None if np.isnan(v) else round(float(v), 1) for v in grid[cable]]
+        for cable in range(granary.cable_count)
+    }
+    return json.dumps({
+        "collected_at": collected_at.isoformat(),
+        "sequence_number": sequence,
+        "temperature_values": values,
+        "humidity_values": round(float(rng.uniform(45.0, 75.0)), 1),
+    }).encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="SQLite file to create")
+    parser.add_argument("--depots", type=int, default=20)
+    parser.add_argument("--granaries-per-depot", type=int, default=25)
+    parser.add_argument("--readings", type=int, default=28, help="readings per granary")
+    parser.add_argument("--interval-hours", type=float, default=6.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app import migrations
+
+    async def migrate() -> None:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{args.path}")
+        await migrations.upgrade(engine)
+        await engine.dispose()
+
+    asyncio.run(migrate())
+    dataset = generate(args.path, args.depots, args.granaries_per_depot, args.readings,
+                       timedelta(hours=args.interval_hours), args.seed)
+    print(json.dumps(dataset.summary(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
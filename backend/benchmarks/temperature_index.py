@@ -0,0 +1,147 @@
+"""Cross-granary temperature queries on a synthetic dataset: the 20 hottest
+granaries overall and in one province, and every granary above a threshold.
+
+  scan       the latest reading of every granary rendered from the snapshot
+             store (as /api/granaries/latest serves it) and reduced in Python
+  index      the same answers from app.services.temperature_index
+  endpoint   /api/granaries/temperatures/top and /range, through the ASGI app
+
+Also reported: the cost of recording one new reading in the index. The
+threshold defaults to about the 95th percentile of the latest maxima, so
+about one granary in twenty matches.
+
+Usage (from backend/):
+    python -m benchmarks.temperature_index --depots 100 --granaries-per-depot 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+PATH = os.path.join(tempfile.mkdtemp(), "temperature_index.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{PATH}")
+os.environ.setdefault("DB_ECHO", "0")
+
+import httpx
+import numpy as np
+
+from app import migrations
+from app.core.db import engine
+from app.main import app
+from app.services.snapshots import snapshot_store
+from app.services.temperature_index import temperature_index
+from benchmarks import synthetic
+
+
+def summarise(timings) -> dict:
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 4),
+    }
+
+
+async def timed(repeat: int, call) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = call()
+        if asyncio.iscoroutine(result):
+            await result
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarise(timings)
+
+
+async def scan(province=None, threshold=None):
+    """What answering the queries took without the index."""
+    provinces = temperature_index.provinces
+    figures = []
+    for snapshot in await snapshot_store.latest():
+        if province is not None and provinces.get(snapshot["depot_id"]) != province:
+            continue
+        reading = snapshot["reading"]
+        if reading is None or not reading["temperature_values"]:
+            continue
+        values = [v for row in reading["temperature_values"].values() for v in row if v is not None]
+        figures.append((max(values), snapshot["granary_id"]))
+    if threshold is not None:
+        return sorted((f for f in figures if f[0] >= threshold), reverse=True)
+    return sorted(figures, reverse=True)[:20]
+
+
+async def run(args) -> None:
+    await migrations.upgrade(engine)
+    dataset = synthetic.generate(PATH, args.depots, args.granaries_per_depot, 2, seed=args.seed)
+    started = time.perf_counter()
+    await snapshot_store.warm()
+    warm_seconds = time.perf_counter() - started
+
+    maxima = [entry["max"] for entry in temperature_index.entries.values()]
+    # Readings hold hundredths of a degree; a threshold between two of them avoids float32 ties
+    threshold = args.threshold if args.threshold is not None else round(float(np.percentile(maxima, 95)), 1) + 0.005
+    province = synthetic.PROVINCES[0]
+
+    # The index and the scan agree
+    assert [g["granary_id"] for g in temperature_index.top("max", 20)["granaries"]] == [g for _, g in await scan()]
+    assert temperature_index.range("max", threshold)["total"] == len(await scan(threshold=threshold))
+
+    results = {
+        "scan": {
+            "top_20": await timed(args.scan_repeat, lambda: scan()),
+            "top_20_province": await timed(args.scan_repeat, lambda: scan(province)),
+            "threshold": await timed(args.scan_repeat, lambda: scan(threshold=threshold)),
+        },
+        "index": {
+            "top_20": await timed(args.repeat, lambda: temperature_index.top("max", 20)),
+            "top_20_province": await timed(args.repeat, lambda: temperature_index.top("max", 20, province)),
+            "threshold": await timed(args.repeat, lambda: temperature_index.range("max", threshold)),
+        },
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results["endpoint"] = {
+            "top_20": await timed(args.repeat, lambda: client.get("/api/granaries/temperatures/top")),
+            "top_20_province": await timed(args.repeat, lambda: client.get(
+                "/api/granaries/temperatures/top", params={"province": province})),
+            "threshold": await timed(args.repeat, lambda: client.get(
+                "/api/granaries/temperatures/range", params={"min": threshold})),
+        }
+
+    above_threshold = temperature_index.range("max", threshold)["total"]
+    granary_ids = list(temperature_index.entries)
+    collected_at = dataset.end + timedelta(hours=1)
+    started = time.perf_counter()
+    for n, granary_id in enumerate(granary_ids):
+        temperature_index.record(granary_id, collected_at, 20.0 + (n % 97) / 10, 15.0 + (n % 89) / 10)
+    record_us = (time.perf_counter() - started) / len(granary_ids) * 1e6
+    await engine.dispose()
+
+    print(json.dumps({
+        "granaries": len(dataset.granaries),
+        "threshold": round(threshold, 2),
+        "above_threshold": above_threshold,
+        "warm_seconds": round(warm_seconds, 3),
+        "record_us": round(record_us, 2),
+        "queries": results,
+        "index": temperature_index.stats(),
+    }, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depots", type=int, default=100)
+    parser.add_argument("--granaries-per-depot", type=int, default=100)
+    parser.add_argument("--threshold", type=float, default=None, help="°C; default about the 95th percentile")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--scan-repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Database size and decode time of JSON vs packed temperature readings.
+
+Usage (from backend/):
+    python -m benchmarks.temperature_storage --readings 10000 --cables 40 --points 12
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.temperature import decode_grid, decode_many, encode_grid, json_to_grid, grid_to_json
+
+
+def build_db(path: str, column_type: str, values) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TABLE granary_data (id INTEGER PRIMARY KEY, granary_id INTEGER, temperature {column_type})")
+    conn.executemany("INSERT INTO granary_data (granary_id, temperature) VALUES (1, ?)", ((v,) for v in values))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=10000)
+    parser.add_argument("--cables", type=int, default=40)
+    parser.add_argument("--points", type=int, default=12)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    grids = np.round(rng.uniform(10, 30, (args.readings, args.cables, args.points)), 1).astype(np.float32)
+    json_rows = [json.dumps(grid_to_json(g)) for g in grids]
+    packed_rows = [encode_grid(g) for g in grids]
+
+    tmpdir = tempfile.mkdtemp()
+    json_path = os.path.join(tmpdir, "json.db")
+    packed_path = os.path.join(tmpdir, "packed.db")
+    build_db(json_path, "JSON", json_rows)
+    build_db(packed_path, "BLOB", packed_rows)
+
+    def load(path):
+        conn = sqlite3.connect(path)
+        rows = [r[0] for r in conn.execute("SELECT temperature FROM granary_data ORDER BY id")]
+        conn.close()
+        return rows
+
+    stored_json = load(json_path)
+    stored_packed = load(packed_path)
+
+    result = {
+        "readings": args.readings,
+        "grid": f"{args.cables}x{args.points}",
+        "db_bytes": {"json": os.path.getsize(json_path), "packed": os.path.getsize(packed_path)},
+        "decode_seconds": {
+            "json": timed(lambda: [json_to_grid(json.loads(r), args.cables, args.points) for r in stored_json]),
+            "packed": timed(lambda: [decode_grid(r) for r in stored_packed]),
+            "packed_batch": timed(lambda: decode_many(stored_packed)),
+        },
+        "read_seconds": {
+            "json": timed(lambda: load(json_path)),
+            "packed": timed(lambda: load(packed_path)),
+        },
+    }
+    result["db_bytes"]["ratio"] = round(result["db_bytes"]["json"] / result["db_bytes"]["packed"], 2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
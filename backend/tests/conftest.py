@@ -0,0 +1,26 @@
+"""The app under the sqlite-production profile (one writer connection, a pool
+of readers) on a temporary database. Engines are created when app.core.db is
+imported, so the environment is set before anything from the app is.
+"""
+import os
+import tempfile
+
+_DIR = tempfile.mkdtemp()
+os.environ.update(
+    DB_PROFILE="sqlite-production",
+    DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(_DIR, 'test.db')}",
+    DB_AUTO_MIGRATE="1",
+    ARCHIVE_DIR=os.path.join(_DIR, "archive"),
+    MQTT_BROKER_HOST="",
+)
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
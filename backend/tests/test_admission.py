@@ -0,0 +1,7 @@
+from app.services.admission import AdmissionMiddleware
+
+
+def test_only_login_bypasses_write_slots():
+    middleware = AdmissionMiddleware(app=None)
+    assert middleware.classify({"method": "POST", "path": "/api/auth/login"}) is None
+    assert middleware.classify({"method": "POST", "path": "/api/auth/register"}) == "interactive"
@@ -0,0 +1,24 @@
+def _summary(client, depot_id):
+    response = client.get("/api/depots/summary")
+    assert response.status_code == 200, response.text
+    return next((depot for depot in response.json() if depot["depot_id"] == depot_id), None)
+
+
+def test_summary_follows_depot_and_granary_writes(client):
+    depot_id = client.post("/api/depots", json={"name": "粮库"}).json()["id"]
+    assert _summary(client, depot_id)["granary_count"] == 0
+
+    granary_id = client.post("/api/granaries", json={"name": "1号仓", "depot_id": depot_id}).json()["id"]
+    assert _summary(client, depot_id)["granary_count"] == 1
+
+    client.post("/api/granaries/bulk", json=[{"name": "2号仓", "depot_id": depot_id}])
+    assert _summary(client, depot_id)["granary_count"] == 2
+
+    client.put(f"/api/depots/{depot_id}", json={"name": "新粮库"})
+    assert _summary(client, depot_id)["name"] == "新粮库"
+
+    client.delete(f"/api/granaries/{granary_id}")
+    assert _summary(client, depot_id)["granary_count"] == 1
+
+    client.delete(f"/api/depots/{depot_id}")
+    assert _summary(client, depot_id) is None
@@ -0,0 +1,12 @@
+def test_history_accepts_bounds_with_an_offset(client):
+    depot_id = client.post("/api/depots", json={"name": "粮库"}).json()["id"]
+    granary_id = client.post("/api/granaries", json={"name": "1号仓", "depot_id": depot_id}).json()["id"]
+
+    response = client.get(f"/api/granaries/{granary_id}/history", params={"from": "2026-10-01T00:00:00Z"})
+    assert response.status_code == 200, response.text
+    assert response.json()["start"] == "2026-10-01T00:00:00"
+
+    response = client.get(f"/api/granaries/{granary_id}/history",
+                          params={"from": "2026-10-01T08:00:00+08:00", "to": "2026-10-02T00:00:00Z"})
+    assert response.status_code == 200, response.text
+    assert (response.json()["start"], response.json()["end"]) == ("2026-10-01T00:00:00", "2026-10-02T00:00:00")
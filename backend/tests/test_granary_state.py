@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from app.services.granary_state import granary_state
+from app.services.response_cache import response_cache
+
+
+def test_listing_cache_renewed_per_flush_not_per_record(client):
+    depot_id = client.post("/api/depots", json={"name": "粮库"}).json()["id"]
+    granary_id = client.post("/api/granaries", json={"name": "1号仓", "depot_id": depot_id}).json()["id"]
+
+    async def record_then_flush():
+        # On the app's loop, so the background flusher cannot run in between
+        version = response_cache.version("granaries")
+        for second in range(10):
+            granary_state.record_collected({granary_id: datetime(2024, 1, 1, 0, 0, second)})
+            granary_state.set_status(granary_id, second % 2)
+        assert response_cache.version("granaries") == version
+        await granary_state.flush()
+        assert response_cache.version("granaries") == version + 1
+
+    client.portal.call(record_then_flush)
+    granary = next(g for g in client.get("/api/granaries").json() if g["id"] == granary_id)
+    assert granary["last_collected_at"].startswith("2024-01-01T00:00:09")
+    assert granary["collection_status"] == 1
@@ -0,0 +1,28 @@
+from app.services.ingest import ingestion_service
+
+
+def test_granary_writes_refresh_topics_with_one_writer_connection(client):
+    # Each write refreshes the ingestion topics while its request still holds the only writer connection
+    depot_id = client.post("/api/depots", json={"name": "粮库"}).json()["id"]
+
+    response = client.post("/api/granaries", json={"name": "1号仓", "depot_id": depot_id,
+                                                    "config": {"mqtt_topic_sub": "granary/1"}})
+    assert response.status_code == 200, response.text
+    granary_id = response.json()["id"]
+    assert ingestion_service.topic_map.get("granary/1") == granary_id
+
+    response = client.put(f"/api/granaries/{granary_id}", json={"name": "1号仓", "depot_id": depot_id,
+                                                                 "config": {"mqtt_topic_sub": "granary/2"}})
+    assert response.status_code == 200, response.text
+    assert "granary/1" not in ingestion_service.topic_map
+    assert ingestion_service.topic_map.get("granary/2") == granary_id
+
+    response = client.post("/api/granaries/bulk", json=[{"name": "2号仓", "depot_id": depot_id,
+                                                         "config": {"mqtt_topic_sub": "granary/3"}}])
+    assert response.status_code == 200, response.text
+    assert "granary/3" in ingestion_service.topic_map
+
+    assert client.delete(f"/api/granaries/{granary_id}").status_code == 200
+    assert "granary/2" not in ingestion_service.topic_map
+    assert client.delete(f"/api/depots/{depot_id}").status_code == 200
+    assert "granary/3" not in ingestion_service.topic_map
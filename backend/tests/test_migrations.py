@@ -0,0 +1,39 @@
+import asyncio
+import sqlite3
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import migrations
+from app.core.db import Base
+
+
+def _schema(path):
+    conn = sqlite3.connect(path)
+    schema = {}
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'schema_version'"):
+        columns = sorted((row[1], row[2], row[3], row[5]) for row in conn.execute(f"PRAGMA table_info('{table}')"))
+        indexes = sorted(
+            (row[1], row[2], tuple(col[2] for col in conn.execute(f"PRAGMA index_info('{row[1]}')")))
+            for row in conn.execute(f"PRAGMA index_list('{table}')")
+        )
+        foreign_keys = sorted(row[2:5] for row in conn.execute(f"PRAGMA foreign_key_list('{table}')"))
+        schema[table] = (columns, indexes, foreign_keys)
+    conn.close()
+    return schema
+
+
+async def _build(migrated, models):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{migrated}")
+    await migrations.upgrade(engine)
+    await engine.dispose()
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{models}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    migrated, models = tmp_path / "migrated.db", tmp_path / "models.db"
+    asyncio.run(_build(migrated, models))
+    assert _schema(migrated) == _schema(models)
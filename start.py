@@ -89,11 +89,11 @@ def main():
 
     # 定义命令
     if system == 'Windows':
-        backend_cmd = "uv run uvicorn app.main:app --reload --port 8010"
+        backend_cmd = "uv run python -m app.migrations upgrade && uv run uvicorn app.main:app --reload --port 8010"
         frontend_cmd = "npm run dev"
     else:
         # Linux / macOS
-        backend_cmd = "uv run uvicorn app.main:app --reload --port 8010"
+        backend_cmd = "uv run python -m app.migrations upgrade && uv run uvicorn app.main:app --reload --port 8010"
         frontend_cmd = "npm run dev"
 
     processes = []